@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Temperature-Bin Method
+
+The ASHRAE bin analysis used to check the chiller and VFD ECMs:
+1. Every hour is assigned to an outdoor-temperature bin, optionally split
+   by occupancy schedule or time-of-day block
+2. Mean baseline and reporting loads are taken per bin
+3. Each bin's load difference is multiplied by the bin hours of a
+   typical (TMY or long-term) weather year
+
+Bin keys are computed once per dataset and shared by every end-use
+column: counts, sums and sums of squares for all columns come from a
+single bincount over (key, column) pairs. The weather file is streamed
+and only its bin hours are kept.
+
+Usage:
+    python bins.py
+    python bins.py --groups occupied --occupied-hours 7-19
+    python bins.py --groups hour-block --width 10 --weather tmy3_station.csv
+"""
+import argparse
+
+import numpy as np
+
+from calendar_features import calendar_features
+from interval_data import BASELINE_HOURLY, REPORTING_HOURLY, column, iter_interval_csv, read_interval_csv
+from interval_qc import interval_minutes
+from regression import t_quantile
+
+GROUPINGS = ('none', 'occupied', 'hour-block')
+HOURS_PER_YEAR = 8760
+
+
+def bin_edges(low=-10.0, high=110.0, width=5.0):
+    """Temperature bin edges; values outside fall into the first and last bins."""
+    return np.arange(low, high + width / 2, width)
+
+
+def bin_groups(timestamps, step, groups='none', occupied_hours=(7, 19), blocks=4):
+    """Group of each interval: 0 everywhere, occupied (1) / unoccupied (0) or time-of-day block.
+
+    Returns (group, n_groups). Occupied means weekdays within occupied_hours
+    (hour-beginning); hour-block splits the day into `blocks` equal blocks.
+    """
+    if groups == 'none':
+        return np.zeros(len(timestamps), dtype=np.int64), 1
+    cal = calendar_features(timestamps, step, occupied_hours=occupied_hours)
+    if groups == 'occupied':
+        return cal['occupied'].astype(np.int64), 2
+    if groups == 'hour-block':
+        return cal['hour'] * blocks // 24, blocks
+    raise ValueError(f"groups must be one of {', '.join(GROUPINGS)}")
+
+
+def bin_keys(oat, edges, group=None, n_groups=1):
+    """Flat bin key per interval: temperature bin + n_bins * group (-1 where oat is NaN)."""
+    oat = np.asarray(oat, dtype=float)
+    n_bins = len(edges) - 1
+    b = np.clip(np.searchsorted(edges, oat, side='right') - 1, 0, n_bins - 1)
+    key = b if group is None else b + n_bins * np.asarray(group)
+    return np.where(np.isnan(oat), -1, key), n_bins * n_groups
+
+
+def bin_stats(key, n_keys, values):
+    """Counts, means and variances of every column per bin key in one bincount each.
+
+    values: (n, k). NaN cells are left out of their column's statistics.
+    Returns {'count' (n_keys, k), 'mean', 'var'}.
+    """
+    v = np.asarray(values, dtype=float)
+    n, k = v.shape
+    ok = (key >= 0)[:, None] & ~np.isnan(v)
+    flat = (np.where(ok, key[:, None], 0) * k + np.arange(k)).ravel()
+    size = n_keys * k
+    count = np.bincount(flat, ok.ravel(), minlength=size).reshape(n_keys, k)
+    vz = np.where(ok, v, 0.0).ravel()
+    s = np.bincount(flat, vz, minlength=size).reshape(n_keys, k)
+    ss = np.bincount(flat, vz * vz, minlength=size).reshape(n_keys, k)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s / count
+        var = (ss - s * mean) / (count - 1)
+    return {'count': count, 'mean': mean, 'var': var}
+
+
+def weather_bin_hours(chunks, edges, groups='none', weather_column='oat_f', **group_options):
+    """Stream weather chunks into hours per bin key, scaled to one year."""
+    hours = None
+    total = 0.0
+    for chunk in chunks:
+        ts = chunk['timestamps']
+        step = interval_minutes(ts)
+        group, n_groups = bin_groups(ts, step, groups, **group_options)
+        key, n_keys = bin_keys(column(chunk, weather_column), edges, group, n_groups)
+        h = np.bincount(key[key >= 0], minlength=n_keys) * step / 60
+        hours = h if hours is None else hours + h
+        total += h.sum()
+    return hours * HOURS_PER_YEAR / total
+
+
+def bin_savings(base, rep, hours, confidence=0.90):
+    """Annual bin-method savings per column from baseline/reporting bin_stats.
+
+    Bins without data in either period are left out; 'coverage' is the
+    share of weather hours that could be used. The standard error treats
+    hours within a bin as independent.
+    """
+    both = (base['count'] > 0) & (rep['count'] > 0)
+    h = hours[:, None] * both
+    diff = np.where(both, base['mean'] - rep['mean'], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var_mean = np.where(both, np.nan_to_num(base['var'] / base['count'])
+                            + np.nan_to_num(rep['var'] / rep['count']), 0.0)
+    dof = max(int(min(base['count'].sum(axis=0).min(), rep['count'].sum(axis=0).min())) - 1, 1)
+    se = np.sqrt((h ** 2 * var_mean).sum(axis=0))
+    return {
+        'baseline': (h * np.where(both, base['mean'], 0.0)).sum(axis=0),
+        'reporting': (h * np.where(both, rep['mean'], 0.0)).sum(axis=0),
+        'savings': (h * diff).sum(axis=0),
+        'bin_savings': h * diff,
+        'se': se,
+        'uncertainty': t_quantile(confidence, dof) * se,
+        'coverage': h.sum(axis=0) / hours.sum(),
+        'confidence': confidence,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Temperature-bin method')
+    parser.add_argument('--baseline', type=str, default=BASELINE_HOURLY, help='Baseline hourly CSV')
+    parser.add_argument('--reporting', type=str, default=REPORTING_HOURLY, help='Reporting hourly CSV')
+    parser.add_argument('--weather', type=str, action='append', default=None,
+                        help='TMY or long-term hourly weather CSV (repeatable; default: the baseline'
+                             ' and reporting years)')
+    parser.add_argument('--weather-column', type=str, default='oat_f', help='Temperature column (default: oat_f)')
+    parser.add_argument('--y', type=str, default='cooling_kw,fan_kw,total_kw', help='Comma-separated load columns')
+    parser.add_argument('--width', type=float, default=5.0, help='Bin width in F (default: 5)')
+    parser.add_argument('--groups', choices=GROUPINGS, default='none', help='Split bins by schedule (default: none)')
+    parser.add_argument('--occupied-hours', type=str, default='7-19', help='Weekday occupied hours (default: 7-19)')
+    parser.add_argument('--blocks', type=int, default=4, help='Time-of-day blocks for hour-block (default: 4)')
+    parser.add_argument('--confidence', type=int, default=90, help='Confidence level %% (default: 90)')
+    args = parser.parse_args()
+
+    columns = args.y.split(',')
+    edges = bin_edges(width=args.width)
+    options = {'occupied_hours': tuple(int(h) for h in args.occupied_hours.split('-')), 'blocks': args.blocks}
+    stats = {}
+    for period, path in (('baseline', args.baseline), ('reporting', args.reporting)):
+        data = read_interval_csv(path, columns=columns + ['oat_f'])
+        ts = data['timestamps']
+        group, n_groups = bin_groups(ts, interval_minutes(ts), args.groups, **options)
+        key, n_keys = bin_keys(column(data, 'oat_f'), edges, group, n_groups)
+        stats[period] = bin_stats(key, n_keys, data['values'][:, :len(columns)])
+    weather = args.weather or [args.baseline, args.reporting]
+    chunks = (c for path in weather for c in iter_interval_csv(path, columns=[args.weather_column]))
+    hours = weather_bin_hours(chunks, edges, args.groups, args.weather_column, **options)
+    res = bin_savings(stats['baseline'], stats['reporting'], hours, args.confidence / 100)
+
+    n_bins = len(edges) - 1
+    print("=" * 74)
+    print(f"TEMPERATURE-BIN METHOD — {args.width:g} F bins, groups: {args.groups}")
+    print("=" * 74)
+    print(f"  {'Bin (F)':<12} {'TMY h':>7}" + ''.join(f" {c[:-3] + ' kWh':>14}" for c in columns))
+    print("  " + "-" * (20 + 15 * len(columns)))
+    per_bin = res['bin_savings'].reshape(-1, n_bins, len(columns)).sum(axis=0)
+    bin_hours = hours.reshape(-1, n_bins).sum(axis=0)
+    for b in np.flatnonzero(bin_hours > 0):
+        print(f"  {edges[b]:>5.0f}-{edges[b + 1]:<5.0f} {bin_hours[b]:>7.0f}"
+              + ''.join(f" {per_bin[b, j]:>14,.0f}" for j in range(len(columns))))
+    print()
+    print(f"  {'Column':<14} {'Baseline kWh':>13} {'Reporting':>11} {'Savings':>10} {'%':>6}"
+          f" {'+/- ' + str(args.confidence) + '%':>9} {'Coverage':>9}")
+    print("  " + "-" * 76)
+    for j, name in enumerate(columns):
+        pct = res['savings'][j] / res['baseline'][j] * 100 if res['baseline'][j] else 0.0
+        print(f"  {name:<14} {res['baseline'][j]:>13,.0f} {res['reporting'][j]:>11,.0f} {res['savings'][j]:>10,.0f}"
+              f" {pct:>6.1f} {res['uncertainty'][j]:>9,.0f} {res['coverage'][j] * 100:>8.1f}%")
+
+
+if __name__ == '__main__':
+    main()
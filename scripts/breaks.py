@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Structural-Break Detection (Non-Routine Events)
+
+Finds step changes in interval data, e.g. the plug load that jumps
+partway through the Greenfield reporting year:
+1. Remove the hour-of-week profile so occupancy schedules are not read as breaks
+2. Collapse to daily means (optionally weather-adjusted residuals)
+3. CUSUM scan: one cumulative sum per column prices every candidate split
+   in O(n); the split that removes the most squared error is tested
+   against the Brownian-bridge (Kolmogorov) limit of the CUSUM statistic
+4. Binary segmentation repeats the scan on each side until no
+   significant break remains
+
+Each break is reported with its date and the step size between the
+adjacent segment means. Model residuals can be scanned the same way with
+detect_breaks().
+
+Usage:
+    python breaks.py
+    python breaks.py --file ../public/data/greenfield_baseline_hourly.csv
+    python breaks.py --no-weather --min-days 28 --confidence 0.99
+"""
+import argparse
+import os
+
+import numpy as np
+
+from calendar_features import MINUTES_PER_WEEK, calendar_features
+from interval_data import REPORTING_HOURLY, read_interval_csv
+from interval_qc import interval_minutes
+from regression import fit_ols
+
+
+def kolmogorov_pvalue(x):
+    """P(sup |B(t)| > x) for a Brownian bridge B."""
+    x = np.asarray(x, dtype=float)
+    k = np.arange(1, 101)[:, None]
+    tail = 2 * ((-1.0) ** (k - 1) * np.exp(-2 * k ** 2 * np.atleast_1d(x) ** 2)).sum(axis=0)
+    p = np.clip(np.where(np.atleast_1d(x) < 0.3, 1.0, tail), 0.0, 1.0)
+    return p if x.ndim else float(p[0])
+
+
+def noise_scale(values):
+    """Robust per-column noise sigma from first differences (insensitive to steps)."""
+    d = np.diff(np.asarray(values, dtype=float), axis=0)
+    mad = np.nanmedian(np.abs(d - np.nanmedian(d, axis=0)), axis=0)
+    sigma = 1.4826 * mad / np.sqrt(2)
+    # Perfectly smooth series (MAD 0) fall back to the ordinary spread of the differences
+    fallback = np.nanstd(d, axis=0) / np.sqrt(2)
+    return np.where(sigma > 0, sigma, fallback)
+
+
+def remove_weekly_profile(timestamps, values, step=None):
+    """Subtract each column's hour-of-week mean (NaN readings stay NaN)."""
+    if step is None:
+        step = interval_minutes(timestamps)
+    tow = calendar_features(timestamps, step)['tow']
+    n_bins = MINUTES_PER_WEEK // step
+    valid = ~np.isnan(values)
+    out = np.empty_like(values)
+    for j in range(values.shape[1]):
+        sums = np.bincount(tow[valid[:, j]], values[valid[:, j], j], minlength=n_bins)
+        counts = np.bincount(tow[valid[:, j]], minlength=n_bins)
+        out[:, j] = values[:, j] - sums[tow] / np.maximum(counts[tow], 1)
+    return out
+
+
+def daily_means(timestamps, values, step=None):
+    """Calendar-day means of sorted interval data (24:00 belongs to the day before)."""
+    if step is None:
+        step = interval_minutes(timestamps)
+    day = (timestamps - np.timedelta64(step, 'm')).astype('datetime64[D]')
+    starts = np.concatenate([[0], np.flatnonzero(day[1:] != day[:-1]) + 1])
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+    counts = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, np.nan)
+    return day[starts], means
+
+
+def weather_residuals(series, oat, balance_point=65.0):
+    """Residuals of each column regressed on heating and cooling degrees."""
+    oat = np.asarray(oat, dtype=float)
+    X = np.column_stack([np.ones_like(oat), np.maximum(balance_point - oat, 0),
+                         np.maximum(oat - balance_point, 0)])
+    out = np.full_like(series, np.nan)
+    for j in range(series.shape[1]):
+        mask = ~np.isnan(series[:, j]) & ~np.isnan(oat)
+        y = np.where(mask, series[:, j], 0.0)
+        fit = fit_ols(X, y, mask=mask)
+        out[mask, j] = fit['residuals'][mask]
+    return out
+
+
+def _segment_autocorrelation(x, s, tau, e):
+    """Lag-1 autocorrelation of x[s:e] around its two segment means (NaN skipped)."""
+    r = x[s:e].copy()
+    r[:tau - s] -= np.nanmean(r[:tau - s])
+    r[tau - s:] -= np.nanmean(r[tau - s:])
+    lagged = r[1:] * r[:-1]
+    denom = np.nansum(r ** 2)
+    return float(np.nansum(lagged) / denom) if denom > 0 else 0.0
+
+
+def _best_split(S, C, s, e, min_size):
+    """Best split of segment [s, e) from cumulative sums S and valid counts C.
+
+    Returns (index, sse_reduction, n_left, n_total, sum_left, sum_total) or None.
+    """
+    n_tot = C[e] - C[s]
+    s_tot = S[e] - S[s]
+    n1 = C[s + 1:e] - C[s]
+    n2 = n_tot - n1
+    ok = (n1 >= min_size) & (n2 >= min_size)
+    if not ok.any():
+        return None
+    s1 = S[s + 1:e] - S[s]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dev = s1 - n1 * s_tot / n_tot
+        gain = np.where(ok, dev ** 2 * n_tot / (n1 * n2), -np.inf)
+    i = int(np.argmax(gain))
+    return s + 1 + i, gain[i], n1[i], n_tot, s1[i], s_tot
+
+
+def detect_breaks(series, dates=None, columns=None, min_size=14, confidence=0.99,
+                  max_breaks=5, sigma=None, min_step=0.0):
+    """Binary-segmentation CUSUM break detection on an (n, k) series matrix.
+
+    series: daily means, model residuals or any regularly spaced values
+    (NaN = missing). A split is kept when the CUSUM statistic
+    max|S_t - t/n S_n| / (sigma_lr sqrt(n)) of its segment exceeds the
+    Brownian-bridge quantile for `confidence`, with at least `min_size`
+    valid points on each side and a step of at least `min_step` (scalar or
+    per column). sigma_lr inflates the noise sigma by the AR(1) long-run
+    factor sqrt((1 + rho) / (1 - rho)) of the segment, so slow weather
+    drift in residuals is not mistaken for a step.
+    Returns {'breaks', 'sigma', 'columns'}.
+    """
+    x = np.asarray(series, dtype=float)
+    if x.ndim == 1:
+        x = x[:, None]
+    n, k = x.shape
+    if columns is None:
+        columns = [f'col{j}' for j in range(k)]
+    if dates is None:
+        dates = np.arange(n)
+    if sigma is None:
+        sigma = noise_scale(x)
+    sigma = np.broadcast_to(np.asarray(sigma, dtype=float), (k,))
+    # Noise-free series (e.g. simulated constant loads) get a floor instead of ~1e-15
+    sigma = np.maximum(sigma, 1e-3 * np.nan_to_num(np.nanstd(x, axis=0)))
+    min_step = np.broadcast_to(np.asarray(min_step, dtype=float), (k,))
+    alpha = 1 - confidence
+
+    # All columns at once: leading-zero cumulative sums and valid counts
+    valid = ~np.isnan(x)
+    S = np.vstack([np.zeros((1, k)), np.cumsum(np.where(valid, x, 0.0), axis=0)])
+    C = np.vstack([np.zeros((1, k), dtype=np.int64), np.cumsum(valid, axis=0)])
+
+    breaks = []
+    for j in range(k):
+        if not sigma[j] > 0:
+            continue
+        found = []
+        pending = [(0, n)]
+        while pending and len(found) < max_breaks:
+            s, e = pending.pop()
+            split = _best_split(S[:, j], C[:, j], s, e, min_size)
+            if split is None:
+                continue
+            tau, gain, n1, n_tot, s1, s_tot = split
+            if abs(s1 / n1 - (s_tot - s1) / (n_tot - n1)) < min_step[j]:
+                continue
+            rho = min(max(_segment_autocorrelation(x[:, j], s, tau, e), 0.0), 0.95)
+            sigma_lr = sigma[j] * np.sqrt((1 + rho) / (1 - rho))
+            stat = np.sqrt(gain * n1 * (n_tot - n1) / n_tot) / (sigma_lr * np.sqrt(n_tot))
+            p = kolmogorov_pvalue(stat)
+            if p >= alpha:
+                continue
+            found.append((tau, float(stat), p))
+            pending.extend([(s, tau), (tau, e)])
+        found.sort()
+
+        # Step sizes from the final segmentation, not the segment each split was found in
+        edges = [0] + [f[0] for f in found] + [n]
+        seg_mean = [(S[b, j] - S[a, j]) / max(C[b, j] - C[a, j], 1) for a, b in zip(edges[:-1], edges[1:])]
+        for i, (tau, stat, p) in enumerate(found):
+            breaks.append({
+                'column': columns[j],
+                'index': int(tau),
+                'date': dates[tau],
+                'before': float(seg_mean[i]),
+                'after': float(seg_mean[i + 1]),
+                'step': float(seg_mean[i + 1] - seg_mean[i]),
+                'statistic': stat,
+                'p_value': p,
+            })
+    return {'breaks': breaks, 'sigma': sigma, 'columns': list(columns)}
+
+
+def scan_interval(data, columns=None, weather_column='oat_f', weather=True, weekly=True,
+                  min_days=14, confidence=0.999, max_breaks=5, balance_point=65.0, min_step_fraction=0.05):
+    """Daily break scan of an interval dataset from interval_data.read_interval_csv.
+
+    weekly removes the hour-of-week profile first; with weather, the daily
+    means are regressed on heating/cooling degrees from weather_column and
+    the residuals are scanned (the weather column itself never is). Steps
+    smaller than min_step_fraction of a column's mean level are ignored.
+    Step sizes are in the column's units (e.g. mean kW).
+    """
+    names = data['columns']
+    if columns is None:
+        columns = [c for c in names if c != weather_column]
+    idx = [names.index(c) for c in columns]
+    ts = data['timestamps']
+    step = interval_minutes(ts)
+    values = data['values'][:, idx]
+    level = np.abs(np.nanmean(values, axis=0))
+    if weekly:
+        values = remove_weekly_profile(ts, values, step)
+    dates, series = daily_means(ts, values, step)
+    if weather and weather_column in names:
+        _, oat = daily_means(ts, data['values'][:, [names.index(weather_column)]], step)
+        series = weather_residuals(series, oat[:, 0], balance_point)
+    result = detect_breaks(series, dates, columns, min_size=min_days, confidence=confidence,
+                           max_breaks=max_breaks, min_step=min_step_fraction * level)
+    result['dates'] = dates
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Structural-break (non-routine event) detection')
+    parser.add_argument('--file', type=str, default=REPORTING_HOURLY, help='Interval CSV')
+    parser.add_argument('--columns', type=str, default=None, help='Comma-separated columns (default: all meters)')
+    parser.add_argument('--no-weather', action='store_true', help='Scan raw daily means, no weather adjustment')
+    parser.add_argument('--min-days', type=int, default=14, help='Minimum segment length in days (default: 14)')
+    parser.add_argument('--confidence', type=float, default=0.999, help='Detection confidence (default: 0.999)')
+    parser.add_argument('--max-breaks', type=int, default=5, help='Maximum breaks per column (default: 5)')
+    args = parser.parse_args()
+
+    data = read_interval_csv(args.file)
+    columns = args.columns.split(',') if args.columns else None
+    result = scan_interval(data, columns, weather=not args.no_weather, min_days=args.min_days,
+                           confidence=args.confidence, max_breaks=args.max_breaks)
+
+    print("=" * 70)
+    print("STRUCTURAL-BREAK DETECTION")
+    print("=" * 70)
+    print(f"  File:       {os.path.basename(args.file)}")
+    print(f"  Days:       {len(result['dates'])}   Weather-adjusted: {'no' if args.no_weather else 'yes'}")
+    print(f"  Confidence: {args.confidence:.3f}   Min segment: {args.min_days} days")
+    print()
+    if not result['breaks']:
+        print("  No significant breaks found.")
+        return
+    print(f"  {'Column':<16} {'Date':<12} {'Before':>9} {'After':>9} {'Step':>9} {'Stat':>7}")
+    print("  " + "-" * 66)
+    for b in result['breaks']:
+        print(f"  {b['column']:<16} {str(b['date']):<12} {b['before']:>9.2f} {b['after']:>9.2f}"
+              f" {b['step']:>+9.2f} {b['statistic']:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
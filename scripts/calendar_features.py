@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Calendar Features
+
+The per-interval calendar fields every model needs, derived once per
+period and shared by TOWT, the daily and bin models, demand windows,
+break detection, resampling and QC:
+
+    date, minute (of day), hour, dow (0 = Monday), hour_of_week, tow
+    (time-of-week bin at the data's interval), month, period (calendar
+    month), holiday, dst (minutes of daylight saving in effect) and
+    occupied (working day inside the occupied hours, not a holiday)
+
+- Timestamps are interval-ending; every field describes the interval's
+  start, so 24:00 belongs to the day before (as in interval_qc)
+- Everything is datetime64 arithmetic on whole arrays; the time zone is
+  consulted once per day (and per hour on transition days) to find the
+  DST switches, never per row
+- Tables are cached by (start, end, interval, time zone, holidays,
+  schedule); arrays on that grid are served from the cached table, and
+  off-grid timestamps are computed directly with the same formulas
+- Holidays: explicit dates, or 'us-federal' for the observed US federal
+  holidays of the years covered
+- The per-field helpers (grid_slots, tow_index, interval_starts,
+  calendar_periods) build no table, for chunked callers such as the
+  resampler and QC
+
+Usage:
+    python calendar_features.py
+    python calendar_features.py --tz America/New_York --holidays us-federal
+    python calendar_features.py --start 2025-01-01T00:15 --end 2026-01-01 --step 15
+"""
+import argparse
+import functools
+import time
+import zoneinfo
+from datetime import datetime, timedelta
+
+import numpy as np
+
+EPOCH = np.datetime64('1970-01-01T00:00', 'm')
+MINUTES_PER_WEEK = 7 * 24 * 60
+MONDAY_OFFSET = 4 * 24 * 60  # 1970-01-01 was a Thursday
+FIELDS = ('date', 'minute', 'hour', 'dow', 'hour_of_week', 'tow', 'month', 'period', 'holiday', 'dst',
+          'occupied')
+HOLIDAY_SETS = ('us-federal',)
+OCCUPIED_HOURS = (7, 19)
+WORKDAYS = (0, 1, 2, 3, 4)
+
+
+def grid_slots(timestamps, step):
+    """Interval-ending grid slot of each timestamp: slot k covers (k-1, k] steps after the epoch."""
+    minutes = (timestamps - EPOCH).astype('timedelta64[m]').astype(np.int64)
+    return -((-minutes) // step)
+
+
+def tow_index(slots, step):
+    """Time-of-week bin (0 = first interval after Monday 00:00) of each grid slot."""
+    start = slots * step - step - MONDAY_OFFSET
+    return (start % MINUTES_PER_WEEK) // step
+
+
+def interval_starts(timestamps, step):
+    """Start of each interval-ending timestamp, the instant every field describes."""
+    return timestamps - np.timedelta64(step, 'm')
+
+
+def calendar_periods(timestamps, step):
+    """Calendar month of each interval (the 'period' field), without building a table."""
+    return interval_starts(timestamps, step).astype('datetime64[M]')
+
+
+def day_of_week(dates):
+    """0 = Monday for datetime64[D] dates."""
+    return (dates.astype('datetime64[D]').astype(np.int64) + 3) % 7      # 1970-01-01 was a Thursday
+
+
+def _observed(dates):
+    """Fixed-date holidays moved off weekends: Saturday to Friday, Sunday to Monday."""
+    dow = day_of_week(dates)
+    return dates + np.where(dow == 5, -1, np.where(dow == 6, 1, 0)).astype('timedelta64[D]')
+
+
+def us_federal_holidays(years):
+    """Observed US federal holiday dates for the given years (datetime64[D], sorted)."""
+    years = np.asarray(sorted(set(int(y) for y in years)))
+    first = (years - 1970).astype('datetime64[Y]').astype('datetime64[M]')
+
+    def month(m):
+        return (first + np.timedelta64(m - 1, 'M')).astype('datetime64[D]')
+
+    def nth(m, n, weekday):
+        return np.busday_offset(month(m), n, roll='forward', weekmask=weekday)
+
+    fixed = [month(1), month(7) + np.timedelta64(3, 'D'), month(11) + np.timedelta64(10, 'D'),
+             month(12) + np.timedelta64(24, 'D'), (month(6) + np.timedelta64(18, 'D'))[years >= 2021]]
+    floating = [nth(1, 2, 'Mon'), nth(2, 2, 'Mon'), np.busday_offset(month(6), -1, roll='forward', weekmask='Mon'),
+                nth(9, 0, 'Mon'), nth(10, 1, 'Mon'), nth(11, 3, 'Thu')]
+    return np.unique(np.concatenate([_observed(d) for d in fixed] + floating))
+
+
+def holiday_dates(holidays, first_day, last_day):
+    """Holiday dates from a named set or an iterable of dates."""
+    if isinstance(holidays, str):
+        if holidays != 'us-federal':
+            raise ValueError(f"holidays must be dates or one of {', '.join(HOLIDAY_SETS)}")
+        years = np.arange(first_day.astype('datetime64[Y]').astype(int),
+                          last_day.astype('datetime64[Y]').astype(int) + 1) + 1970
+        return us_federal_holidays(years)
+    return np.unique(np.asarray(list(holidays), dtype='datetime64[D]'))
+
+
+def dst_transitions(tz, first_day, last_day):
+    """(local minutes since the epoch, DST minutes from then on) for a zone over a date range.
+
+    The zone is queried at each local midnight, and hour by hour only on
+    the days whose DST value changes.
+    """
+    zone = zoneinfo.ZoneInfo(tz)
+    start = datetime(1970, 1, 1) + timedelta(days=int(first_day.astype(np.int64)) - 1)
+    n_days = int((last_day - first_day).astype(np.int64)) + 3
+
+    def dst(t):
+        return int(t.replace(tzinfo=zone).dst().total_seconds() // 60)
+
+    daily = [dst(start + timedelta(days=d)) for d in range(n_days)]
+    base = int((np.datetime64(start, 'm') - EPOCH).astype(np.int64))
+    times, values = [base], [daily[0]]
+    for d in np.flatnonzero(np.diff(daily)):
+        day = start + timedelta(days=int(d))
+        hour = next(h for h in range(1, 25) if dst(day + timedelta(hours=h)) == daily[d + 1])
+        times.append(base + int(d) * 1440 + hour * 60)
+        values.append(daily[d + 1])
+    return np.array(times, dtype=np.int64), np.array(values, dtype=np.int64)
+
+
+def _compute(timestamps, step, tz, holidays, occupied_hours, workdays):
+    """Calendar fields for interval-ending timestamps (no caching)."""
+    begin = interval_starts(timestamps, step)
+    date = begin.astype('datetime64[D]')
+    minute = (begin - date).astype('timedelta64[m]').astype(np.int64)
+    hour = minute // 60
+    dow = day_of_week(date)
+    period = calendar_periods(timestamps, step)
+    if len(date):
+        hol = holiday_dates(holidays, date.min(), date.max())
+    else:
+        hol = np.array([], dtype='datetime64[D]')
+    holiday = np.isin(date, hol) if hol.size else np.zeros(len(date), dtype=bool)
+    if tz and len(date):
+        times, values = dst_transitions(tz, date.min(), date.max())
+        local = (begin - EPOCH).astype('timedelta64[m]').astype(np.int64)
+        dst = values[np.maximum(np.searchsorted(times, local, side='right') - 1, 0)]
+    else:
+        dst = np.zeros(len(date), dtype=np.int64)
+    return {
+        'date': date,
+        'minute': minute,
+        'hour': hour,
+        'dow': dow,
+        'hour_of_week': dow * 24 + hour,
+        'tow': tow_index(grid_slots(timestamps, step), step),
+        'month': period.astype(np.int64) % 12 + 1,
+        'period': period,
+        'holiday': holiday,
+        'dst': dst,
+        'occupied': (np.isin(dow, workdays) & (hour >= occupied_hours[0]) & (hour < occupied_hours[1])
+                     & ~holiday),
+    }
+
+
+@functools.lru_cache(maxsize=32)
+def calendar_table(first, n, step, tz=None, holidays=(), occupied_hours=OCCUPIED_HOURS, workdays=WORKDAYS):
+    """Cached fields for the regular grid of n intervals ending at `first` (epoch minutes), `first` + step, ...
+
+    All arguments are hashable: holidays is a set name or a tuple of
+    ISO dates. The arrays are read-only since they are shared.
+    """
+    timestamps = EPOCH + (first + step * np.arange(n, dtype=np.int64)).astype('timedelta64[m]')
+    table = _compute(timestamps, step, tz, holidays, occupied_hours, workdays)
+    table['timestamps'] = timestamps
+    for a in table.values():
+        a.flags.writeable = False
+    return table
+
+
+def calendar_features(timestamps, step=None, tz=None, holidays=(), occupied_hours=OCCUPIED_HOURS,
+                      workdays=WORKDAYS):
+    """Calendar fields (see FIELDS) for interval-ending timestamps.
+
+    Timestamps on the interval grid are served from the cached table for
+    their first-to-last range: the table itself when they are exactly that
+    grid, otherwise a gather. Off-grid timestamps are computed directly.
+    tz: IANA zone name for the DST field (timestamps are local wall time).
+    """
+    if step is None:
+        from interval_qc import interval_minutes
+        step = interval_minutes(timestamps)
+    timestamps = np.asarray(timestamps, dtype='datetime64[m]')
+    if not isinstance(holidays, str):
+        holidays = tuple(str(d) for d in np.unique(np.asarray(list(holidays), dtype='datetime64[D]')))
+    options = (tz, holidays, tuple(occupied_hours), tuple(workdays))
+    minutes = (timestamps - EPOCH).astype(np.int64)
+    if minutes.size == 0 or np.any(minutes % step):
+        return _compute(timestamps, step, *options)
+    first = int(minutes.min())
+    pos = (minutes - first) // step
+    n = int(pos.max()) + 1
+    table = calendar_table(first, n, step, *options)
+    if len(pos) == n and pos[0] == 0 and np.all(np.diff(pos) == 1):
+        return {name: table[name] for name in FIELDS}
+    return {name: table[name][pos] for name in FIELDS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calendar features')
+    parser.add_argument('--start', type=str, default='2025-01-01T01:00', help='First interval-ending timestamp')
+    parser.add_argument('--end', type=str, default='2026-01-01T00:00', help='Last interval-ending timestamp')
+    parser.add_argument('--step', type=int, default=60, help='Interval minutes (default: 60)')
+    parser.add_argument('--tz', type=str, default='America/New_York', help='Time zone for DST (default: America/New_York)')
+    parser.add_argument('--holidays', type=str, default='us-federal', help="Holiday set or comma-separated dates")
+    parser.add_argument('--occupied-hours', type=str, default='7-19', help='Occupied hours (default: 7-19)')
+    args = parser.parse_args()
+
+    step = np.timedelta64(args.step, 'm')
+    ts = np.arange(np.datetime64(args.start, 'm'), np.datetime64(args.end, 'm') + step, step)
+    holidays = args.holidays if args.holidays in HOLIDAY_SETS else args.holidays.split(',')
+    hours = tuple(int(h) for h in args.occupied_hours.split('-'))
+    t0 = time.perf_counter()
+    cal = calendar_features(ts, args.step, args.tz, holidays, hours)
+    t_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    calendar_features(ts, args.step, args.tz, holidays, hours)
+    calendar_features(ts[::7], args.step, args.tz, holidays, hours)
+    t_cached = (time.perf_counter() - t0) / 2
+
+    print("=" * 64)
+    print(f"CALENDAR FEATURES — {len(ts):,} intervals of {args.step} min, {args.tz}")
+    print("=" * 64)
+    print(f"  Built in {t_build * 1000:.1f} ms; cached lookups {t_cached * 1000:.2f} ms")
+    print(f"  Occupied intervals: {cal['occupied'].mean() * 100:.1f}%")
+    days = np.unique(cal['date'][cal['holiday']])
+    print(f"  Holidays ({len(days)}): " + ', '.join(str(d) for d in days))
+    change = np.flatnonzero(np.diff(cal['dst'])) + 1
+    for i in change:
+        print(f"  DST {cal['dst'][i - 1]:+d} -> {cal['dst'][i]:+d} min from the interval ending {ts[i]}")
+
+
+if __name__ == '__main__':
+    main()
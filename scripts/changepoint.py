@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Change-Point Regression Models
+
+Python counterparts of the web app's fit5P / fit3PH (src/utils/statistics.js):
+- 2P  E = B + beta * T
+- 3PH E = B + betaH * max(CP - T, 0)
+- 3PC E = B + betaC * max(T - CP, 0)
+- 5P  E = B + betaH * max(CPh - T, 0) + betaC * max(T - CPc, 0)
+
+The change-point grid search does not rebuild the design per candidate:
+temperatures are sorted once and weighted prefix sums give the normal
+equations of every candidate in one vectorized pass. The winning change
+points are then refit with regression.fit_ols for standard errors.
+
+Supports WLS weights (e.g. billing-period day counts), QC masks and
+per-day normalization (model kWh/day, report kWh per period).
+
+Usage:
+    python changepoint.py
+    python changepoint.py --model 3PH --y total_therms
+    python changepoint.py --weights days --per-day
+    python changepoint.py --band ../public/data/greenfield_reporting_monthly.csv
+"""
+import argparse
+
+import numpy as np
+
+from interval_data import BASELINE_MONTHLY, read_monthly_csv
+from regression import billing_weights, combine_weights, fit_ols, g14_metrics, predict
+
+MODEL_TYPES = ('2P', '3PH', '3PC', '5P')
+
+
+def changepoint_features(model_type, oat, change_points=()):
+    """Design matrix (intercept first) for a change-point model."""
+    t = np.asarray(oat, dtype=float)
+    ones = np.ones_like(t)
+    if model_type == '2P':
+        return np.column_stack([ones, t])
+    if model_type == '3PH':
+        return np.column_stack([ones, np.maximum(change_points[0] - t, 0)])
+    if model_type == '3PC':
+        return np.column_stack([ones, np.maximum(t - change_points[0], 0)])
+    if model_type == '5P':
+        cp_h, cp_c = change_points
+        return np.column_stack([ones, np.maximum(cp_h - t, 0), np.maximum(t - cp_c, 0)])
+    raise ValueError(f"model_type must be one of {', '.join(MODEL_TYPES)}")
+
+
+def _prefix_tables(t, y, w):
+    """Sorted temperatures plus cumulative weighted sums (leading zero row)."""
+    order = np.argsort(t, kind='stable')
+    ts, ys, ws = t[order], y[order], w[order]
+    terms = np.stack([ws, ws * ts, ws * ts ** 2, ws * ys, ws * ts * ys])
+    cum = np.concatenate([np.zeros((5, 1)), np.cumsum(terms, axis=1)], axis=1)
+    return ts, cum
+
+
+def _hinge_sums(ts, cum, cps, side):
+    """Sums of w*x, w*x^2 and w*x*y for x = max(cp - T, 0) ('heat') or max(T - cp, 0) ('cool')."""
+    if side == 'heat':
+        k = np.searchsorted(ts, cps, side='left')
+        sw, st, stt, sy, sty = cum[:, k]
+        return cps * sw - st, cps ** 2 * sw - 2 * cps * st + stt, cps * sy - sty
+    k = np.searchsorted(ts, cps, side='right')
+    sw, st, stt, sy, sty = cum[:, -1:] - cum[:, k]
+    return st - cps * sw, stt - 2 * cps * st + cps ** 2 * sw, sty - cps * sy
+
+
+def _candidate_grid(model_type, oat, step):
+    """Change-point candidates, mirroring the web app's search ranges."""
+    lo, hi = float(np.min(oat)), float(np.max(oat))
+    if model_type == '3PH':
+        return (np.arange(lo + 2, hi - 1 + 1e-9, step),)
+    if model_type == '3PC':
+        return (np.arange(lo + 1, hi - 2 + 1e-9, step),)
+    cp_h = np.arange(lo + 2, hi - 5 + 1e-9, step)
+    pairs = [(h, c) for h in cp_h for c in np.arange(h + 3, hi - 1 + 1e-9, step)]
+    if not pairs:
+        return np.empty(0), np.empty(0)
+    pairs = np.array(pairs)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def grid_search(oat, y, model_type, w, step):
+    """Best change points by weighted SSE over the whole candidate grid.
+
+    Zero-weight (e.g. QC-masked) rows are left out, so a NaN in them cannot
+    reach the sums, and the candidate range comes from the rows used.
+    """
+    used = w > 0
+    if not used.all():
+        oat, y, w = oat[used], y[used], w[used]
+    ts, cum = _prefix_tables(oat, y, w)
+    total = cum[:, -1]
+    grid = _candidate_grid(model_type, oat, step)
+    if grid[0].size == 0:
+        raise ValueError('temperature range too narrow for a change-point search')
+    c = grid[0].size
+
+    cols = []                       # per-candidate (s_x, s_xx, s_xy) for each hinge
+    if model_type in ('3PH', '5P'):
+        cols.append(_hinge_sums(ts, cum, grid[0], 'heat'))
+    if model_type == '3PC':
+        cols.append(_hinge_sums(ts, cum, grid[0], 'cool'))
+    if model_type == '5P':
+        cols.append(_hinge_sums(ts, cum, grid[1], 'cool'))
+    p = 1 + len(cols)
+
+    G = np.zeros((c, p, p))
+    rhs = np.zeros((c, p))
+    G[:, 0, 0] = total[0]
+    rhs[:, 0] = total[3]
+    for i, (s_x, s_xx, s_xy) in enumerate(cols, 1):
+        G[:, 0, i] = G[:, i, 0] = s_x
+        G[:, i, i] = s_xx
+        rhs[:, i] = s_xy
+    # Heating and cooling hinges never overlap (CPh < CPc), so their cross term is 0
+
+    ok = np.linalg.det(G) > 1e-10
+    beta = np.zeros((c, p))
+    beta[ok] = np.linalg.solve(G[ok], rhs[ok][..., None])[..., 0]
+    yy = (w * y ** 2).sum()
+    sse = yy - np.einsum('ci,ci->c', beta, rhs)
+    ok &= (beta[:, 1:] >= 0).all(axis=1)   # physical slopes only, as in the web app
+    if not ok.any():
+        raise ValueError('no change-point candidate with non-negative slopes')
+    best = int(np.argmin(np.where(ok, sse, np.inf)))
+    return tuple(float(g[best]) for g in grid)
+
+
+def fit_changepoint(oat, energy, model_type='5P', weights=None, mask=None, days=None,
+                    per_day=False, step=None, cov_type='classical'):
+    """Fit a change-point model; returns a model dict for predict_changepoint.
+
+    per_day: model energy/days (requires `days`); predictions are scaled
+    back to period totals. weights/mask flow into the grid search, the final
+    WLS fit and the G14 statistics.
+    """
+    if model_type not in MODEL_TYPES:
+        raise ValueError(f"model_type must be one of {', '.join(MODEL_TYPES)}")
+    t = np.asarray(oat, dtype=float)
+    energy = np.asarray(energy, dtype=float)
+    if per_day:
+        if days is None:
+            raise ValueError('per_day normalization needs the days of each period')
+        y = energy / np.asarray(days, dtype=float)
+    else:
+        y = energy
+    w = combine_weights(mask, weights)
+    w_search = np.ones_like(t) if w is None else w
+
+    if model_type == '2P':
+        change_points = ()
+    else:
+        if step is None:
+            step = 1.0 if model_type == '5P' else 0.5
+        change_points = grid_search(t, y, model_type, w_search, step)
+
+    X = changepoint_features(model_type, t, change_points)
+    fit = fit_ols(X, y, weights=w, cov_type=cov_type)
+    model = {
+        'model_type': model_type,
+        'change_points': list(change_points),
+        'params': _named_params(model_type, fit['beta'], change_points),
+        'per_day': per_day,
+        'fit': fit,
+    }
+    predicted = predict_changepoint(model, t, days)
+    model['g14'] = g14_metrics(energy, predicted, X.shape[1] + len(change_points), weights=w)
+    return model
+
+
+def _named_params(model_type, beta, change_points):
+    """Coefficient names used by the web app (B, betaH, cpH, betaC, cpC)."""
+    beta = [float(b) for b in beta]
+    if model_type == '2P':
+        return {'B': beta[0], 'beta': beta[1]}
+    if model_type == '3PH':
+        return {'B': beta[0], 'betaH': beta[1], 'cp': change_points[0]}
+    if model_type == '3PC':
+        return {'B': beta[0], 'betaC': beta[1], 'cp': change_points[0]}
+    return {'B': beta[0], 'betaH': beta[1], 'cpH': change_points[0],
+            'betaC': beta[2], 'cpC': change_points[1]}
+
+
+def predict_changepoint(model, oat, days=None):
+    """Model prediction for new temperatures (period totals when per_day)."""
+    X = changepoint_features(model['model_type'], oat, model['change_points'])
+    pred = X @ model['fit']['beta']
+    if model['per_day']:
+        if days is None:
+            raise ValueError('per-day model needs the days of each period to predict totals')
+        pred = pred * np.asarray(days, dtype=float)
+    return pred
+
+
+def predict_band(model, oat, days=None, confidence=0.90):
+    """Adjusted-baseline band: predictions with confidence and prediction intervals.
+
+    Same keys as regression.predict, scaled to period totals for per-day models.
+    """
+    X = changepoint_features(model['model_type'], oat, model['change_points'])
+    band = predict(model['fit'], X, confidence)
+    if model['per_day']:
+        if days is None:
+            raise ValueError('per-day model needs the days of each period to predict totals')
+        days = np.asarray(days, dtype=float)
+        for key in ('y_hat', 'se_mean', 'se_pred', 'ci_low', 'ci_high', 'pi_low', 'pi_high'):
+            band[key] = band[key] * days
+    return band
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Change-point regression (2P/3PH/3PC/5P)')
+    parser.add_argument('--file', type=str, default=BASELINE_MONTHLY, help='Monthly CSV')
+    parser.add_argument('--y', type=str, default='total_kwh', help='Energy column (default: total_kwh)')
+    parser.add_argument('--model', choices=MODEL_TYPES, default='5P', help='Model type (default: 5P)')
+    parser.add_argument('--weights', choices=['none', 'days'], default='none',
+                        help='WLS weights from billing-period day counts (default: none)')
+    parser.add_argument('--per-day', action='store_true', help='Fit energy per day instead of period totals')
+    parser.add_argument('--band', type=str, default=None, metavar='CSV',
+                        help='Print the 90%% adjusted-baseline band for this monthly CSV')
+    args = parser.parse_args()
+
+    data = read_monthly_csv(args.file)
+    days = data['days']
+    w = billing_weights(days, per_day=args.per_day) if args.weights == 'days' else None
+    model = fit_changepoint(data['avg_oat_f'], data[args.y], args.model, weights=w,
+                            days=days, per_day=args.per_day)
+
+    print("=" * 60)
+    print(f"CHANGE-POINT MODEL — {args.model} ({args.y})")
+    print("=" * 60)
+    print(f"  Weights: {args.weights}   Per-day: {'yes' if args.per_day else 'no'}")
+    print()
+    for name, value in model['params'].items():
+        print(f"  {name:<8} = {value:12.2f}")
+    print()
+    print("  Coefficient standard errors:")
+    for b, se in zip(model['fit']['beta'], model['fit']['se']):
+        print(f"    {b:12.2f}  +/- {se:10.2f}")
+    g = model['g14']
+    print()
+    print("  ASHRAE Guideline 14 (monthly):")
+    print(f"    NMBE      = {g['nmbe']:7.2f}%   (limit +/-5%)")
+    print(f"    CV(RMSE)  = {g['cvrmse']:7.2f}%   (limit 15%)")
+    print(f"    R^2       = {g['r_squared']:7.4f}")
+    print(f"    Result:     {'PASS' if g['passes'] else 'FAIL'}")
+
+    if args.band:
+        rep = read_monthly_csv(args.band)
+        band = predict_band(model, rep['avg_oat_f'], rep['days'])
+        print()
+        print(f"  {'Period':<7} {'OAT':>6} {'Predicted':>11} {'90% CI':>23} {'90% PI':>23} {'Actual':>10}")
+        print("  " + "-" * 84)
+        for i in range(len(rep['days'])):
+            print(f"  {i + 1:<7} {rep['avg_oat_f'][i]:>6.1f} {band['y_hat'][i]:>11,.0f}"
+                  f" {band['ci_low'][i]:>11,.0f}-{band['ci_high'][i]:<11,.0f}"
+                  f" {band['pi_low'][i]:>11,.0f}-{band['pi_high'][i]:<11,.0f} {rep[args.y][i]:>10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Daily Models with Day-Type Classification
+
+The daily middle ground between the monthly change-point path and the
+hourly TOWT model:
+1. Roll interval data up to days: 24-hour load profiles, daily energy
+   and mean outdoor temperature
+2. Cluster the daily load *shapes* (scaled 0-1 within each day) with k-means,
+   k-means++ seeding, so weekdays, weekends and holidays separate by how
+   the building runs rather than by weather
+3. Fit one change-point model per day type on daily energy vs mean OAT
+
+k-means works on the whole (days x intervals) matrix at once: distances
+come from one matrix product per iteration and centroids from a one-hot
+product, so multi-year portfolios of daily profiles cluster in seconds.
+Shapes are min-max scaled per day, and the shapes can come from a
+schedule-driven column (e.g. lighting_kw) while the models use another.
+
+Reporting days are typed by the calendar (the day-of-week majority of
+each cluster in the baseline, US federal holidays by default to the
+weekend-like type), never by their own load, so an ECM cannot change its own counterfactual.
+
+Usage:
+    python daily.py
+    python daily.py --k 2 --shape total_kw
+    python daily.py --y plug_kw --model 2P
+    python daily.py --holidays none
+"""
+import argparse
+
+import numpy as np
+
+from calendar_features import HOLIDAY_SETS, calendar_features, day_of_week, holiday_dates
+from changepoint import MODEL_TYPES, fit_changepoint, predict_changepoint
+from interval_data import BASELINE_HOURLY, REPORTING_HOURLY, column, read_interval_csv
+from interval_qc import interval_minutes
+
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+MODEL_PARAMS = {'2P': 2, '3PH': 3, '3PC': 3, '5P': 5}
+
+
+def daily_profiles(timestamps, values, step=None):
+    """Daily interval profiles of one column.
+
+    Returns {'dates', 'profiles' (days, intervals per day), 'energy'
+    (kWh per day for a kW column), 'complete'}. Days with missing
+    intervals are kept with NaN and complete=False.
+    """
+    if step is None:
+        step = interval_minutes(timestamps)
+    cal = calendar_features(timestamps, step)        # fields of the interval start
+    slot = cal['minute'] // step
+    dates, idx = np.unique(cal['date'], return_inverse=True)
+    per_day = 24 * 60 // step
+    profiles = np.full((dates.size, per_day), np.nan)
+    profiles[idx, slot] = values
+    complete = ~np.isnan(profiles).any(axis=1)
+    return {
+        'dates': dates,
+        'profiles': profiles,
+        'energy': np.where(complete, np.nansum(profiles, axis=1), np.nan) * step / 60,
+        'complete': complete,
+    }
+
+
+def daily_mean(timestamps, values, step=None):
+    """Calendar-day mean of a column (e.g. oat_f), aligned with daily_profiles dates."""
+    prof = daily_profiles(timestamps, values, step)
+    return np.nanmean(prof['profiles'], axis=1)
+
+
+def _sq_dist(X, x2, C):
+    """Squared Euclidean distances (n, k) from one matrix product."""
+    return np.maximum(x2[:, None] + _scores(X, C), 0.0)
+
+
+def _scores(X, C):
+    """||c||^2 - 2 x.c: the squared distance minus the per-row constant ||x||^2."""
+    return (C ** 2).sum(axis=1)[None, :] - 2 * (X @ C.T)
+
+
+def _kmeans_pp(X, x2, k, rng):
+    """k-means++ seeding: each new centre drawn with probability ~ D(x)^2."""
+    centers = np.empty((k, X.shape[1]))
+    centers[0] = X[rng.integers(X.shape[0])]
+    d2 = _sq_dist(X, x2, centers[:1])[:, 0]
+    for j in range(1, k):
+        cum = np.cumsum(d2)
+        i = int(np.searchsorted(cum, rng.random() * cum[-1], side='right')) if cum[-1] > 0 \
+            else int(rng.integers(X.shape[0]))
+        centers[j] = X[min(i, X.shape[0] - 1)]
+        d2 = np.minimum(d2, _sq_dist(X, x2, centers[j:j + 1])[:, 0])
+    return centers
+
+
+def kmeans(X, k, n_init=3, max_iter=100, tol=1e-4, seed=0):
+    """Vectorized Lloyd's k-means with k-means++ starts; best of n_init runs.
+
+    Each iteration is one (n, d) x (d, k) product for the assignments and
+    one one-hot product for the centroids. A run stops when no label
+    changes or the centroids move less than tol x the mean feature
+    variance. Returns {'labels', 'centroids', 'inertia', 'iterations'}.
+    """
+    X = np.asarray(X, dtype=float)
+    n = X.shape[0]
+    if k > n:
+        raise ValueError('more clusters than rows')
+    rng = np.random.default_rng(seed)
+    x2 = (X ** 2).sum(axis=1)
+    eye = np.eye(k)
+    threshold = tol * X.var(axis=0).mean()
+    best = None
+    for _ in range(n_init):
+        C = _kmeans_pp(X, x2, k, rng)
+        labels = np.full(n, -1)
+        for it in range(1, max_iter + 1):
+            new_labels = _scores(X, C).argmin(axis=1)
+            if np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            onehot = eye[labels]
+            counts = onehot.sum(axis=0)
+            new = (onehot.T @ X) / np.maximum(counts, 1)[:, None]
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty clusters at the points farthest from their centre
+                d = _sq_dist(X, x2, C)[np.arange(n), labels]
+                new[empty] = X[np.argsort(-d)[:int(empty.sum())]]
+            shift = ((new - C) ** 2).sum()
+            C = new
+            if shift <= threshold:
+                labels = _scores(X, C).argmin(axis=1)
+                break
+        inertia = float(_sq_dist(X, x2, C)[np.arange(n), labels].sum())
+        if best is None or inertia < best['inertia']:
+            best = {'labels': labels, 'centroids': C, 'inertia': inertia, 'iterations': it}
+    return best
+
+
+def load_shapes(profiles):
+    """Profiles rescaled to 0-1 between the day's minimum and maximum.
+
+    Clustering then sees the operating schedule (when the building turns
+    on and off), not the weather-driven level of the day.
+    """
+    lo = profiles.min(axis=1, keepdims=True)
+    span = profiles.max(axis=1, keepdims=True) - lo
+    return (profiles - lo) / np.where(span > 0, span, 1.0)
+
+
+def classify_days(dates, profiles, k=3, seed=0, min_days=1):
+    """Cluster complete daily profiles into k day types.
+
+    Clusters with fewer than min_days days are merged into the nearest
+    remaining type, so there may be fewer than k types. Types are
+    renumbered by decreasing count of Monday-Friday days, so type 0 is
+    the working-day type. Returns {'labels', 'centroids', 'dow_type'
+    (day-of-week -> majority type), 'off_type' (type of most weekend
+    days, used for holidays), 'inertia'}.
+    """
+    shapes = load_shapes(profiles)
+    km = kmeans(shapes, k, seed=seed)
+    keep = np.bincount(km['labels'], minlength=k) >= min_days
+    if not keep.any():
+        raise ValueError(f'no day type has {min_days} days')
+    if not keep.all():
+        centroids = km['centroids'][keep]
+        d = _sq_dist(shapes, (shapes ** 2).sum(axis=1), centroids)
+        labels = d.argmin(axis=1)
+        k = len(centroids)
+        km = {'labels': labels, 'centroids': centroids, 'inertia': float(d[np.arange(len(d)), labels].sum())}
+    dow = day_of_week(dates)
+    table = np.zeros((k, 7), dtype=np.int64)
+    np.add.at(table, (km['labels'], dow), 1)
+    order = np.argsort(-(table[:, :5].sum(axis=1) - table[:, 5:].sum(axis=1)), kind='stable')
+    relabel = np.empty(k, dtype=np.int64)
+    relabel[order] = np.arange(k)
+    labels = relabel[km['labels']]
+    table = table[order]
+    return {
+        'labels': labels,
+        'centroids': km['centroids'][order],
+        'table': table,
+        'dow_type': table.argmax(axis=0),
+        'off_type': int(table[:, 5:].sum(axis=1).argmax()),
+        'inertia': km['inertia'],
+    }
+
+
+def calendar_types(dates, day_types, holidays='us-federal'):
+    """Day type of new dates from the calendar alone.
+
+    holidays: a named set from calendar_features ('us-federal') or
+    explicit dates; holidays take the weekend-like type.
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    types = day_types['dow_type'][day_of_week(dates)]
+    if dates.size:
+        off = np.isin(dates, holiday_dates(holidays, dates.min(), dates.max()))
+        types = np.where(off, day_types['off_type'], types)
+    return types
+
+
+def fit_daily_models(timestamps, load, oat, k=3, model_type='5P', shape=None, seed=0):
+    """Day-type classification plus one change-point model per type.
+
+    shape: optional column whose daily profiles define the day types
+    (default: load itself). Day types with too few days to fit
+    `model_type` are merged into their nearest neighbour, and a day type
+    whose temperature range is too narrow for it falls back to a 2P model.
+    Returns {'day_types', 'models' (one per type), 'dates', 'energy', 'oat'}.
+    """
+    step = interval_minutes(timestamps)
+    prof = daily_profiles(timestamps, load, step)
+    shapes = prof if shape is None else daily_profiles(timestamps, shape, step)
+    temp = daily_mean(timestamps, oat, step)
+    ok = prof['complete'] & shapes['complete'] & ~np.isnan(temp)
+    day_types = classify_days(prof['dates'][ok], shapes['profiles'][ok], k, seed, MODEL_PARAMS[model_type] + 1)
+    models = []
+    for c in range(len(day_types['centroids'])):
+        sel = day_types['labels'] == c
+        try:
+            models.append(fit_changepoint(temp[ok][sel], prof['energy'][ok][sel], model_type))
+        except (ValueError, np.linalg.LinAlgError):
+            models.append(fit_changepoint(temp[ok][sel], prof['energy'][ok][sel], '2P'))
+    return {'day_types': day_types, 'models': models, 'dates': prof['dates'][ok],
+            'energy': prof['energy'][ok], 'oat': temp[ok]}
+
+
+def predict_daily(daily, dates, oat, holidays='us-federal'):
+    """Daily energy predictions for calendar dates and mean temperatures."""
+    types = calendar_types(dates, daily['day_types'], holidays)
+    pred = np.empty(len(dates))
+    for c, model in enumerate(daily['models']):
+        sel = types == c
+        pred[sel] = predict_changepoint(model, np.asarray(oat)[sel])
+    return pred, types
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Daily models with day-type clustering')
+    parser.add_argument('--baseline', type=str, default=BASELINE_HOURLY, help='Baseline hourly CSV')
+    parser.add_argument('--reporting', type=str, default=REPORTING_HOURLY, help='Reporting hourly CSV')
+    parser.add_argument('--y', type=str, default='total_kw', help='Load column (default: total_kw)')
+    parser.add_argument('--k', type=int, default=3, help='Number of day types (default: 3)')
+    parser.add_argument('--model', choices=MODEL_TYPES, default='5P', help='Change-point model (default: 5P)')
+    parser.add_argument('--shape', type=str, default='lighting_kw',
+                        help='Column whose daily shapes define day types (default: lighting_kw)')
+    parser.add_argument('--holidays', type=str, default='us-federal',
+                        help="Reporting holidays: a holiday set, comma-separated dates or 'none' (default: us-federal)")
+    args = parser.parse_args()
+    if args.holidays == 'none':
+        holidays = ()
+    else:
+        holidays = args.holidays if args.holidays in HOLIDAY_SETS else args.holidays.split(',')
+
+    columns = list(dict.fromkeys([args.y, args.shape, 'oat_f']))
+    base = read_interval_csv(args.baseline, columns=columns)
+    daily = fit_daily_models(base['timestamps'], column(base, args.y), column(base, 'oat_f'),
+                             args.k, args.model, shape=column(base, args.shape))
+    dt = daily['day_types']
+    n_types = len(daily['models'])
+
+    print("=" * 70)
+    print(f"DAILY MODELS — {args.y}, {n_types} day types from {args.shape} shapes"
+          + (f" ({args.k - n_types} too small to fit, merged)" if n_types < args.k else ""))
+    print("=" * 70)
+    print(f"  {'Type':<6} " + " ".join(f"{d:>4}" for d in DAY_NAMES) + f" {'Days':>6} {'kWh/day':>9}"
+          f" {'CV(RMSE)':>9} {'NMBE':>7}")
+    print("  " + "-" * 74)
+    for c, model in enumerate(daily['models']):
+        sel = dt['labels'] == c
+        g = model['g14']
+        print(f"  {c:<6} " + " ".join(f"{v:>4}" for v in dt['table'][c]) + f" {sel.sum():>6}"
+              f" {daily['energy'][sel].mean():>9,.0f} {g['cvrmse']:>8.2f}% {g['nmbe']:>6.2f}%")
+    print()
+    for c, model in enumerate(daily['models']):
+        params = ', '.join(f"{k}={v:,.2f}" for k, v in model['params'].items())
+        print(f"  Type {c} ({model['model_type']}): {params}")
+
+    rep = read_interval_csv(args.reporting, columns=[args.y, 'oat_f'])
+    prof = daily_profiles(rep['timestamps'], column(rep, args.y))
+    temp = daily_mean(rep['timestamps'], column(rep, 'oat_f'))
+    ok = prof['complete']
+    pred, types = predict_daily(daily, prof['dates'][ok], temp[ok], holidays)
+    actual = prof['energy'][ok]
+    print()
+    print(f"  {'Type':<6} {'Days':>6} {'Pred kWh':>12} {'Actual':>12} {'Savings':>10}")
+    print("  " + "-" * 50)
+    for c in range(n_types):
+        sel = types == c
+        print(f"  {c:<6} {sel.sum():>6} {pred[sel].sum():>12,.0f} {actual[sel].sum():>12,.0f}"
+              f" {pred[sel].sum() - actual[sel].sum():>10,.0f}")
+    print("  " + "-" * 50)
+    print(f"  {'TOTAL':<6} {ok.sum():>6} {pred.sum():>12,.0f} {actual.sum():>12,.0f}"
+          f" {pred.sum() - actual.sum():>10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Peak-Demand Analysis
+
+Billing demand for the "Peak Demand (kW)" row of the M&V results template:
+- Non-coincident peak (NCP): each column's own maximum per billing period,
+  with the interval it occurred in
+- Coincident peak (CP): the whole-building peak inside a utility peak
+  window (e.g. summer weekday afternoons), with every end use's load at
+  that same interval; or the load at explicit utility system-peak hours
+- Demand baseline: the baseline-year monthly peaks regressed on monthly
+  mean temperature (change-point model), projected onto the reporting
+  year for weather-adjusted demand savings
+
+Interval data is sorted by time, so billing periods are contiguous runs
+and every peak is a segmented reduction: np.maximum.reduceat for the
+maxima and np.minimum.reduceat over the positions that attain them for
+the argmax, across all columns at once. Multi-year 15-minute data for
+many meters is one pass. When the meter interval is shorter than the
+utility demand interval (e.g. 5-minute data, 15-minute demand), loads are
+first averaged over a trailing demand window.
+
+Usage:
+    python demand.py
+    python demand.py --window-months 6,7,8,9 --window-hours 14-19
+    python demand.py --demand-minutes 60 --model 3PC
+"""
+import argparse
+
+import numpy as np
+
+from calendar_features import calendar_features
+from changepoint import MODEL_TYPES, fit_changepoint, predict_changepoint
+from interval_data import BASELINE_HOURLY, REPORTING_HOURLY, read_interval_csv
+from interval_qc import interval_minutes, interval_months, rolling_sum
+from mv_plan_builder import results_row
+
+SUMMER_MONTHS = (6, 7, 8, 9)
+PEAK_HOURS = (14, 19)         # hour-beginning window [14:00, 19:00)
+
+
+def period_starts(labels):
+    """Start row of each run of equal labels (labels sorted by time)."""
+    labels = np.asarray(labels)
+    return np.concatenate([[0], np.flatnonzero(labels[1:] != labels[:-1]) + 1])
+
+
+def segment_max(values, starts):
+    """Per-segment maximum and the row where it first occurs, for every column.
+
+    values: (n,) or (n, k); NaN never wins. Returns (peaks, rows) shaped
+    (segments,) or (segments, k); a segment that is all NaN gets NaN and row -1.
+    """
+    v = np.asarray(values, dtype=float)
+    v = np.where(np.isnan(v), -np.inf, v)
+    peaks = np.maximum.reduceat(v, starts, axis=0)
+    lengths = np.diff(np.append(starts, len(v)))
+    hit = v == np.repeat(peaks, lengths, axis=0)
+    pos = np.arange(len(v)).reshape((-1,) + (1,) * (v.ndim - 1))
+    rows = np.minimum.reduceat(np.where(hit, pos, len(v)), starts, axis=0)
+    empty = np.isneginf(peaks)
+    return np.where(empty, np.nan, peaks), np.where(empty, -1, rows)
+
+
+def segment_mean(values, starts):
+    """Mean of the non-NaN values in each segment (NaN where a segment has none)."""
+    v = np.asarray(values, dtype=float)
+    valid = ~np.isnan(v)
+    sums = np.add.reduceat(np.where(valid, v, 0.0), starts, axis=0)
+    counts = np.add.reduceat(valid, starts, axis=0, dtype=np.int64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def demand_values(values, step, demand_minutes=None):
+    """Loads averaged over the utility demand interval (trailing window).
+
+    Windows that contain a missing reading are NaN; later windows are not
+    affected.
+    """
+    v = np.asarray(values, dtype=float)
+    if not demand_minutes or demand_minutes <= step:
+        return v
+    window = demand_minutes // step
+    valid = ~np.isnan(v)
+    full = rolling_sum(valid, window) == window
+    out = np.where(full, rolling_sum(np.where(valid, v, 0.0), window) / window, np.nan)
+    out[:window - 1] = np.nan
+    return out
+
+
+def peak_window(timestamps, step, months=SUMMER_MONTHS, hours=PEAK_HOURS, weekdays=True, holidays=()):
+    """True for intervals that begin inside the utility peak window."""
+    cal = calendar_features(timestamps, step, holidays=holidays)
+    mask = np.isin(cal['month'], months) & (cal['hour'] >= hours[0]) & (cal['hour'] < hours[1])
+    if weekdays:
+        mask &= cal['dow'] < 5        # Monday = 0
+    return mask & ~cal['holiday']
+
+
+def period_demand(timestamps, values, columns, total='total_kw', step=None, periods=None,
+                  window=None, demand_minutes=None):
+    """Non-coincident and coincident peaks per billing period in one pass.
+
+    periods: label per row (default: calendar month). window: boolean
+    peak-window mask (see peak_window); the coincident peak is the `total`
+    column's maximum inside it, with every column's load at that interval.
+    Returns {'periods', 'ncp' (p, k), 'ncp_time' (p, k), 'cp' (p, k),
+    'cp_time' (p,), 'mean_kw' (p, k), 'load_factor' (p, k), 'columns'};
+    means and load factors count only intervals with a reading.
+    """
+    if step is None:
+        step = interval_minutes(timestamps)
+    if periods is None:
+        periods = interval_months(timestamps, step)
+    v = demand_values(values, step, demand_minutes)
+    starts = period_starts(periods)
+    ncp, rows = segment_max(v, starts)
+    ncp_time = np.where(rows >= 0, timestamps[np.maximum(rows, 0)], np.datetime64('NaT'))
+
+    j = columns.index(total)
+    in_window = v[:, j] if window is None else np.where(window, v[:, j], np.nan)
+    _, cp_rows = segment_max(in_window, starts)
+    ok = cp_rows >= 0
+    cp = np.full((len(starts), v.shape[1]), np.nan)
+    cp[ok] = v[cp_rows[ok]]
+    mean_kw = segment_mean(v, starts)
+    return {
+        'periods': np.asarray(periods)[starts],
+        'columns': list(columns),
+        'ncp': ncp,
+        'ncp_time': ncp_time,
+        'cp': cp,
+        'cp_time': np.where(ok, timestamps[np.maximum(cp_rows, 0)], np.datetime64('NaT')),
+        'mean_kw': mean_kw,
+        'load_factor': mean_kw / ncp,
+    }
+
+
+def system_peak_demand(timestamps, values, peak_times):
+    """Load of every column at explicit utility system-peak intervals (e.g. 5CP hours).
+
+    Peak times absent from the data give NaN rows.
+    """
+    peak_times = np.asarray(peak_times, dtype=timestamps.dtype)
+    i = np.searchsorted(timestamps, peak_times)
+    found = (i < len(timestamps)) & (timestamps[np.minimum(i, len(timestamps) - 1)] == peak_times)
+    out = np.full((len(peak_times), values.shape[1]), np.nan)
+    out[found] = values[i[found]]
+    return out
+
+
+def period_mean(timestamps, values, step=None, periods=None):
+    """Mean of `values` per billing period (e.g. temperature for a demand baseline)."""
+    if step is None:
+        step = interval_minutes(timestamps)
+    if periods is None:
+        periods = interval_months(timestamps, step)
+    starts = period_starts(periods)
+    return segment_mean(values, starts)
+
+
+def fit_demand_baseline(oat, peaks, model_type='5P'):
+    """Change-point model of period peak demand on period mean temperature.
+
+    Falls back to 2P when the temperature range supports no change points.
+    """
+    try:
+        return fit_changepoint(oat, peaks, model_type)
+    except ValueError:
+        return fit_changepoint(oat, peaks, '2P')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak-demand analysis')
+    parser.add_argument('--baseline', type=str, default=BASELINE_HOURLY, help='Baseline interval CSV')
+    parser.add_argument('--reporting', type=str, default=REPORTING_HOURLY, help='Reporting interval CSV')
+    parser.add_argument('--total', type=str, default='total_kw', help='Whole-building column (default: total_kw)')
+    parser.add_argument('--window-months', type=str, default='6,7,8,9', help='Peak-window months (default: 6-9)')
+    parser.add_argument('--window-hours', type=str, default='14-19', help='Peak-window hours (default: 14-19)')
+    parser.add_argument('--demand-minutes', type=int, default=None, help='Utility demand interval (minutes)')
+    parser.add_argument('--model', choices=MODEL_TYPES, default='5P', help='Demand baseline model (default: 5P)')
+    args = parser.parse_args()
+
+    months = tuple(int(m) for m in args.window_months.split(','))
+    hours = tuple(int(h) for h in args.window_hours.split('-'))
+    out = {}
+    for period, path in (('baseline', args.baseline), ('reporting', args.reporting)):
+        data = read_interval_csv(path)
+        ts = data['timestamps']
+        step = interval_minutes(ts)
+        loads = [c for c in data['columns'] if c.endswith('_kw')]
+        values = data['values'][:, [data['columns'].index(c) for c in loads]]
+        window = peak_window(ts, step, months, hours)
+        out[period] = period_demand(ts, values, loads, args.total, step, window=window,
+                                    demand_minutes=args.demand_minutes)
+        out[period]['oat'] = period_mean(ts, data['values'][:, data['columns'].index('oat_f')], step)
+    base, rep = out['baseline'], out['reporting']
+    j = base['columns'].index(args.total)
+    model = fit_demand_baseline(base['oat'], base['ncp'][:, j], args.model)
+    adjusted = predict_changepoint(model, rep['oat'])
+    actual = rep['ncp'][:, j]
+
+    print("=" * 78)
+    print(f"PEAK DEMAND — {args.total}")
+    print("=" * 78)
+    print(f"  Peak window: months {args.window_months}, hours {hours[0]}:00-{hours[1]}:00 weekdays")
+    print(f"  Demand baseline: {model['model_type']} on monthly mean OAT,"
+          f" CV(RMSE) {model['g14']['cvrmse']:.2f}%, R^2 {model['g14']['r_squared']:.3f}")
+    print()
+    print(f"  {'Month':<8} {'OAT':>5} {'Adj. base':>10} {'NCP':>8} {'NCP time':<17} {'Savings':>8}"
+          f" {'CP':>8} {'LF':>5}")
+    print("  " + "-" * 76)
+    for i, label in enumerate(rep['periods']):
+        cp = rep['cp'][i, j]
+        print(f"  {str(label):<8} {rep['oat'][i]:>5.1f} {adjusted[i]:>10.1f} {actual[i]:>8.1f}"
+              f" {str(rep['ncp_time'][i, j]).replace('T', ' '):<17} {adjusted[i] - actual[i]:>8.1f}"
+              f" {'' if np.isnan(cp) else f'{cp:.1f}':>8} {rep['load_factor'][i, j]:>5.2f}")
+    print()
+
+    cp_rows = ~np.isnan(rep['cp'][:, j])
+    if cp_rows.any():
+        print("  End-use contribution to reporting coincident peaks (mean kW):")
+        for k, name in enumerate(rep['columns']):
+            if k != j:
+                b = np.nanmean(base['cp'][:, k])
+                r = np.nanmean(rep['cp'][cp_rows, k])
+                print(f"    {name:<16} {b:>8.1f} -> {r:>8.1f}")
+        print()
+    peak_base, peak_post = float(adjusted.max()), float(actual.max())
+    print(results_row('Peak Demand (kW)', peak_base, peak_post))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Concurrent Meter-Data Ingestion
+
+Converts a day's drop of interval CSVs into interval stores (or portfolio
+matrix rows) with a bounded worker pool:
+
+- Discovery: files, directories (optionally recursive) and glob patterns;
+  only interval CSVs (a 'datetime' first column) are picked up from
+  directories and patterns, and files whose store is already newer than
+  the CSV are skipped
+- A process pool (parsing is CPU-bound) or a thread pool (for slow or
+  network file systems) reads and parses files in parallel
+- Backpressure: at most `max_pending` files are submitted at once, and
+  each worker streams its file in `chunk_rows` pieces, so memory stays
+  near workers x chunk size however many files are queued
+- Stores are written by interval_store.import_csv, which renames them
+  into place only when complete; a file that fails is reported with its
+  error and the batch carries on
+- With --matrix, one column per file is aligned to the matrix time axis
+  in the workers and appended by the main process in batches
+
+Usage:
+    python ingest.py ../public/data
+    python ingest.py /data/drop/2025-06-01 --recursive --workers 8 --max-pending 16
+    python ingest.py "/data/drop/*.csv" --pool thread --out-dir /data/stores
+    python ingest.py /tmp/portfolio_csv --matrix /tmp/pm --column total_kw
+"""
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from interval_data import column, iter_interval_csv
+from interval_store import STORE_SUFFIX, import_csv, is_interval_csv, open_store
+from portfolio import ID_DTYPE, align, append_meters, open_matrix
+
+POOLS = ('process', 'thread')
+
+
+def discover(sources, pattern='*.csv', recursive=False):
+    """Sorted, de-duplicated files from file paths, directories and glob patterns.
+
+    Directory and pattern matches are limited to interval CSVs, so the
+    monthly billing files next to them are not imported; files named
+    explicitly are kept (and fail in ingest if they are not interval data).
+    """
+    found = set()
+    for source in sources:
+        if os.path.isdir(source):
+            spec = os.path.join(source, '**', pattern) if recursive else os.path.join(source, pattern)
+            found.update(p for p in glob.glob(spec, recursive=recursive) if is_interval_csv(p))
+        elif os.path.isfile(source):
+            found.add(source)
+        else:
+            found.update(p for p in glob.glob(source, recursive=recursive)
+                         if os.path.isfile(p) and is_interval_csv(p))
+    return sorted(os.path.abspath(p) for p in found)
+
+
+def _check_interval_csv(path):
+    if not is_interval_csv(path):
+        raise ValueError("not an interval CSV (first column must be 'datetime')")
+
+
+def target_path(csv_path, out_dir=None):
+    """Store written for a CSV: alongside it (read automatically by interval_data) or in out_dir."""
+    name = os.path.splitext(os.path.basename(csv_path))[0] + STORE_SUFFIX
+    return os.path.join(out_dir or os.path.dirname(csv_path), name)
+
+
+def _record(path, t0, rows=0, status='ok', error=None, target=None):
+    seconds = time.perf_counter() - t0
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    return {'path': path, 'target': target, 'status': status, 'error': error, 'rows': rows,
+            'bytes': size, 'seconds': seconds}
+
+
+def claim(files, key, target=None):
+    """(files to process, failed records): only the first file for each key(path) is kept.
+
+    Files sharing a stem would otherwise overwrite or skip against each
+    other's store, or collide on a meter id.
+    """
+    owner, keep, failed = {}, [], []
+    for path in files:
+        k = key(path)
+        if k in owner:
+            failed.append(_record(path, time.perf_counter(), status='failed', target=target or k,
+                                  error=f'ValueError: same target as {owner[k]}'))
+        else:
+            owner[k] = path
+            keep.append(path)
+    return keep, failed
+
+
+def ingest_file(path, out_dir=None, chunk_days=7, chunk_rows=50_000, force=False):
+    """Convert one CSV to an interval store; returns a per-file record (never raises)."""
+    t0 = time.perf_counter()
+    target = target_path(path, out_dir)
+    if not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return _record(path, t0, status='skipped', target=target)
+    try:
+        _check_interval_csv(path)
+        rows = open_store(import_csv(path, target, chunk_days, chunk_rows))['rows']
+    except Exception as e:
+        return _record(path, t0, status='failed', error=f'{type(e).__name__}: {e}', target=target)
+    return _record(path, t0, rows, target=target)
+
+
+def matrix_row(path, column_name, axis, chunk_rows=50_000):
+    """One column of a CSV aligned to a matrix time axis: (record, float32 row or None).
+
+    The file is streamed `chunk_rows` at a time into the row.
+    """
+    t0 = time.perf_counter()
+    row = np.full((1, axis['n_time']), np.nan, dtype=np.float32)
+    rows = 0
+    try:
+        _check_interval_csv(path)
+        for chunk in iter_interval_csv(path, chunk_rows, columns=[column_name]):
+            align(axis, chunk['timestamps'], column(chunk, column_name), out=row)
+            rows += len(chunk['timestamps'])
+    except Exception as e:
+        return _record(path, t0, status='failed', error=f'{type(e).__name__}: {e}'), None
+    return _record(path, t0, rows), row[0]
+
+
+def run_pool(tasks, pool='process', workers=None, max_pending=None):
+    """Run (fn, *args) tasks with at most max_pending submitted; yields results as they finish.
+
+    An exception escaping a task (e.g. a killed worker) is yielded as a
+    'failed' record for its file, so one bad file cannot stop the batch.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    executor = (ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor)(max_workers=workers)
+    tasks = iter(tasks)
+    pending = {}
+    with executor:
+        while True:
+            while len(pending) < max_pending:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                pending[executor.submit(*task)] = task
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield _record(task[1], time.perf_counter(), status='failed', error=f'{type(e).__name__}: {e}')
+
+
+def ingest(files, out_dir=None, pool='process', workers=None, max_pending=None, chunk_days=7,
+           chunk_rows=50_000, force=False):
+    """Convert files to interval stores concurrently; returns per-file records in completion order."""
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    files, records = claim(files, lambda p: target_path(p, out_dir))
+    tasks = ((ingest_file, path, out_dir, chunk_days, chunk_rows, force) for path in files)
+    return records + list(run_pool(tasks, pool, workers, max_pending))
+
+
+def ingest_matrix(files, matrix_path, column_name='total_kw', pool='process', workers=None,
+                  max_pending=None, batch=64, chunk_rows=50_000):
+    """Append one column per file to a portfolio matrix (meter id: file stem).
+
+    Workers parse and align; the main process is the only writer and
+    appends completed rows `batch` at a time. Files whose id is already
+    in the matrix are skipped; ids repeated within the files or too long
+    for the matrix, and batches the matrix rejects, are reported as failed.
+    """
+    matrix = open_matrix(matrix_path)
+    axis = {k: matrix[k] for k in ('start', 'step', 'n_time')}
+    known = set(matrix['index']['id'].tolist())
+    ids, rows, appending = [], [], []
+
+    def meter_id(path):
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def flush():
+        if ids:
+            try:
+                append_meters(matrix_path, ids, np.vstack(rows))
+            except Exception as e:
+                for record in appending:
+                    record.update(status='failed', error=f'{type(e).__name__}: {e}')
+            ids.clear()
+            rows.clear()
+            appending.clear()
+
+    files, records = claim(files, meter_id, matrix_path)
+    todo = []
+    for path in files:
+        encoded = meter_id(path).encode()
+        if encoded in known:
+            records.append(_record(path, time.perf_counter(), status='skipped', target=matrix_path))
+        elif len(encoded) > ID_DTYPE.itemsize:
+            records.append(_record(path, time.perf_counter(), status='failed', target=matrix_path,
+                                   error=f'ValueError: meter ids are limited to {ID_DTYPE.itemsize} bytes'))
+        else:
+            todo.append((matrix_row, path, column_name, axis, chunk_rows))
+    for result in run_pool(todo, pool, workers, max_pending):
+        record, row = result if isinstance(result, tuple) else (result, None)
+        record['target'] = matrix_path
+        records.append(record)
+        if row is not None:
+            ids.append(meter_id(record['path']))
+            rows.append(row)
+            appending.append(record)
+            if len(ids) >= batch:
+                flush()
+    flush()
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent meter-data ingestion')
+    parser.add_argument('sources', nargs='+', help='CSV files, directories or glob patterns')
+    parser.add_argument('--pattern', type=str, default='*.csv', help='File pattern in directories (default: *.csv)')
+    parser.add_argument('--recursive', action='store_true', help='Search directories recursively')
+    parser.add_argument('--pool', choices=POOLS, default='process', help='Worker pool (default: process)')
+    parser.add_argument('--workers', type=int, default=None, help='Workers (default: CPU count)')
+    parser.add_argument('--max-pending', type=int, default=None, help='Files in flight (default: 2 x workers)')
+    parser.add_argument('--out-dir', type=str, default=None, help='Store directory (default: next to each CSV)')
+    parser.add_argument('--chunk-days', type=float, default=7, help='Store time chunk in days (default: 7)')
+    parser.add_argument('--chunk-rows', type=int, default=50_000, help='CSV rows parsed at a time (default: 50000)')
+    parser.add_argument('--force', action='store_true', help='Re-import files with up-to-date stores')
+    parser.add_argument('--matrix', type=str, default=None, help='Append to this portfolio matrix instead')
+    parser.add_argument('--column', type=str, default='total_kw', help='Column appended with --matrix')
+    args = parser.parse_args()
+
+    files = discover(args.sources, args.pattern, args.recursive)
+    t0 = time.perf_counter()
+    if args.matrix:
+        records = ingest_matrix(files, args.matrix, args.column, args.pool, args.workers, args.max_pending,
+                                chunk_rows=args.chunk_rows)
+    else:
+        records = ingest(files, args.out_dir, args.pool, args.workers, args.max_pending, args.chunk_days,
+                         args.chunk_rows, args.force)
+    wall = time.perf_counter() - t0
+
+    by_status = {s: [r for r in records if r['status'] == s] for s in ('ok', 'skipped', 'failed')}
+    done = by_status['ok']
+    mb = sum(r['bytes'] for r in done) / 1e6
+    print("=" * 78)
+    print(f"INGESTION — {len(files):,} files, {args.pool} pool"
+          f" ({args.workers or os.cpu_count()} workers, {args.max_pending or 2 * (args.workers or os.cpu_count())}"
+          " in flight)")
+    print("=" * 78)
+    print(f"  Imported {len(done):,}, skipped {len(by_status['skipped']):,}, failed {len(by_status['failed']):,}"
+          f" in {wall:.2f} s")
+    if done:
+        rows = sum(r['rows'] for r in done)
+        print(f"  {mb:,.1f} MB, {rows:,} rows: {mb / wall:,.1f} MB/s, {rows / wall:,.0f} rows/s overall")
+        print()
+        print(f"  {'Slowest files':<44} {'Rows':>9} {'MB':>7} {'Seconds':>8} {'MB/s':>7}")
+        print("  " + "-" * 78)
+        for r in sorted(done, key=lambda r: -r['seconds'])[:10]:
+            print(f"  {os.path.basename(r['path'])[:44]:<44} {r['rows']:>9,} {r['bytes'] / 1e6:>7.2f}"
+                  f" {r['seconds']:>8.3f} {r['bytes'] / 1e6 / max(r['seconds'], 1e-9):>7.1f}")
+    if by_status['failed']:
+        print()
+        print("  Errors:")
+        for r in by_status['failed']:
+            print(f"    {os.path.basename(r['path'])}: {r['error'].splitlines()[0]}")
+
+
+if __name__ == '__main__':
+    main()
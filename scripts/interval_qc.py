@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Interval Data Quality Screening
+
+Screens every column of an hourly (or 15-minute) meter file before any
+model is fitted:
+- Timestamp checks: gaps, duplicates, out-of-order rows
+- Value checks: missing, negative, implausibly high
+- Rolling-window checks: flat-lined (stuck) meters, isolated spikes
+
+All tests run as whole-array numpy operations over the (rows x columns)
+matrix, so a year of 15-minute data for hundreds of points screens in
+seconds. The result is a per-cell quality mask (True = usable) that the
+fitters accept directly, plus per-column and per-month summaries.
+
+Usage:
+    python interval_qc.py
+    python interval_qc.py --file ../public/data/greenfield_reporting_hourly.csv
+    python interval_qc.py --flatline-hours 48 --spike-k 6 --exempt datacenter_kw
+"""
+import argparse
+import os
+
+import numpy as np
+
+from calendar_features import calendar_periods
+from interval_data import BASELINE_HOURLY, read_interval_csv
+
+# Bit flags stored per cell in result['flags']
+FLAG_MISSING = 1
+FLAG_NEGATIVE = 2
+FLAG_IMPLAUSIBLE = 4
+FLAG_FLATLINE = 8
+FLAG_SPIKE = 16
+FLAG_DUPLICATE = 32
+FLAG_NAMES = {
+    FLAG_MISSING: 'missing',
+    FLAG_NEGATIVE: 'negative',
+    FLAG_IMPLAUSIBLE: 'implausible',
+    FLAG_FLATLINE: 'flatline',
+    FLAG_SPIKE: 'spike',
+    FLAG_DUPLICATE: 'duplicate',
+}
+
+
+def interval_minutes(timestamps):
+    """Nominal recording interval: the most common positive timestamp step."""
+    steps = np.diff(timestamps).astype('timedelta64[m]').astype(np.int64)
+    steps = steps[steps > 0]
+    if steps.size == 0:
+        return 60
+    values, counts = np.unique(steps, return_counts=True)
+    return int(values[np.argmax(counts)])
+
+
+def interval_months(timestamps, step):
+    """Calendar month of each interval-ending timestamp (24:00 belongs to the day before)."""
+    return calendar_periods(timestamps, step)
+
+
+def rolling_sum(a, window):
+    """Trailing window sums along axis 0; rows before a full window get 0."""
+    c = np.cumsum(a, axis=0, dtype=np.int64 if a.dtype == bool else None)
+    out = np.zeros_like(c)
+    out[window - 1] = c[window - 1]
+    out[window:] = c[window:] - c[:-window]
+    return out
+
+
+def flatline_mask(values, window):
+    """Cells inside any run of >= `window` identical consecutive readings."""
+    n = values.shape[0]
+    out = np.zeros(values.shape, dtype=bool)
+    if window < 2 or n < window:
+        return out
+    same = np.zeros(values.shape, dtype=bool)
+    same[1:] = values[1:] == values[:-1]
+    # A window ending at row i is flat when its last window-1 steps are all repeats
+    ends = rolling_sum(same, window - 1) == window - 1
+    ends[:window - 1] = False
+    # Spread each flat window back over the rows it covers (difference array)
+    edges = np.zeros((n + 1,) + values.shape[1:], dtype=np.int64)
+    edges[:n - window + 1] += ends[window - 1:]
+    edges[window:] -= ends[window - 1:]
+    out[:] = np.cumsum(edges, axis=0)[:n] > 0
+    return out
+
+
+def spike_mask(values, k):
+    """Isolated one-interval spikes: a jump of > k sigma out and straight back again."""
+    out = np.zeros(values.shape, dtype=bool)
+    if values.shape[0] < 3:
+        return out
+    d = np.diff(values, axis=0)
+    sigma = np.nanstd(d, axis=0)
+    limit = k * np.where(sigma > 0, sigma, np.inf)
+    d_in, d_out = d[:-1], d[1:]
+    with np.errstate(invalid='ignore'):
+        out[1:-1] = ((np.sign(d_in) == -np.sign(d_out)) &
+                     (np.abs(d_in) > limit) & (np.abs(d_out) > limit) &
+                     (np.abs(d_in + d_out) < 0.5 * np.minimum(np.abs(d_in), np.abs(d_out))))
+    return out
+
+
+def screen(data, limits=None, flatline_hours=96, spike_k=6.0,
+           implausible_factor=5.0, exempt=()):
+    """Run every QC test over all columns of a loaded interval file.
+
+    limits: optional {column: (low, high)} physical bounds; columns without
+    an entry use low=0 and high=implausible_factor x their 99th percentile.
+    exempt: columns skipped by the flat-line test (e.g. stipulated constants).
+    """
+    ts = data['timestamps']
+    values = data['values']
+    columns = data['columns']
+    limits = limits or {}
+    n, k = values.shape
+    flags = np.zeros((n, k), dtype=np.uint8)
+
+    # Timestamp checks (row level)
+    step = interval_minutes(ts)
+    deltas = np.diff(ts).astype('timedelta64[m]').astype(np.int64)
+    out_of_order = int(np.count_nonzero(deltas < 0))
+    order = np.argsort(ts, kind='stable')
+    sorted_ts = ts[order]
+    dup_rows = np.zeros(n, dtype=bool)
+    dup_rows[order[1:]] = sorted_ts[1:] == sorted_ts[:-1]
+    flags[dup_rows] |= FLAG_DUPLICATE
+
+    sorted_steps = np.diff(sorted_ts).astype('timedelta64[m]').astype(np.int64)
+    gap_at = np.flatnonzero(sorted_steps > step)
+    gaps = [{
+        'after': sorted_ts[i],
+        'before': sorted_ts[i + 1],
+        'missing_intervals': int(sorted_steps[i] // step - 1),
+    } for i in gap_at]
+
+    # Value checks (cell level)
+    missing = np.isnan(values)
+    flags[missing] |= FLAG_MISSING
+
+    low = np.array([limits.get(c, (0.0, None))[0] for c in columns], dtype=float)
+    p99 = np.nanpercentile(values, 99, axis=0) if n else np.zeros(k)
+    high = np.array([
+        limits[c][1] if c in limits and limits[c][1] is not None
+        else implausible_factor * max(p99[j], 0.0) or np.inf
+        for j, c in enumerate(columns)
+    ])
+    with np.errstate(invalid='ignore'):
+        flags[values < low] |= FLAG_NEGATIVE
+        flags[values > high] |= FLAG_IMPLAUSIBLE
+
+    # Rolling-window checks
+    window = max(2, int(round(flatline_hours * 60 / step)))
+    checked = [j for j, c in enumerate(columns) if c not in exempt]
+    if checked:
+        flat = flatline_mask(values[:, checked], window)
+        flags[:, checked] |= np.where(flat, FLAG_FLATLINE, 0).astype(np.uint8)
+    flags[spike_mask(values, spike_k)] |= FLAG_SPIKE
+
+    mask = flags == 0
+
+    # Per-column summary
+    summary = {}
+    for j, name in enumerate(columns):
+        col = flags[:, j]
+        entry = {'n': n, 'n_good': int(mask[:, j].sum())}
+        entry['pct_good'] = 100.0 * entry['n_good'] / n if n else 0.0
+        for bit, label in FLAG_NAMES.items():
+            entry[label] = int(np.count_nonzero(col & bit))
+        summary[name] = entry
+
+    # Per-period (calendar month) summary; stamps are interval-ending
+    months = interval_months(ts, step)
+    periods, period_idx = np.unique(months, return_inverse=True)
+    period_good = np.zeros((len(periods), k), dtype=np.int64)
+    np.add.at(period_good, period_idx, mask)
+    period_minutes = ((periods + 1).astype('datetime64[m]') - periods.astype('datetime64[m]')).astype(np.int64)
+
+    return {
+        'timestamps': ts,
+        'columns': list(columns),
+        'mask': mask,
+        'flags': flags,
+        'interval_minutes': step,
+        'gaps': gaps,
+        'duplicates': int(dup_rows.sum()),
+        'out_of_order': out_of_order,
+        'summary': summary,
+        'periods': periods,
+        'period_good': period_good,
+        'period_expected': period_minutes // step,
+    }
+
+
+def row_mask(qc, columns):
+    """Rows usable for a fit over the given columns (all must pass)."""
+    idx = [qc['columns'].index(c) for c in columns]
+    return qc['mask'][:, idx].all(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Interval Data Quality Screening')
+    parser.add_argument('--file', type=str, default=BASELINE_HOURLY, help='Interval CSV to screen')
+    parser.add_argument('--flatline-hours', type=float, default=96,
+                        help='Identical-reading run length that counts as stuck (default: 96)')
+    parser.add_argument('--spike-k', type=float, default=6.0,
+                        help='Spike threshold in standard deviations of the step change (default: 6)')
+    parser.add_argument('--exempt', nargs='*', default=['datacenter_kw'],
+                        help='Columns skipped by the flat-line test (default: datacenter_kw, a stipulated constant)')
+    args = parser.parse_args()
+
+    data = read_interval_csv(args.file)
+    qc = screen(data, flatline_hours=args.flatline_hours, spike_k=args.spike_k, exempt=args.exempt)
+
+    print("=" * 60)
+    print("INTERVAL DATA QUALITY SCREEN")
+    print("=" * 60)
+    print(f"  File:              {os.path.basename(args.file)}")
+    print(f"  Rows:              {len(qc['timestamps']):,}")
+    print(f"  Interval:          {qc['interval_minutes']} min")
+    print(f"  Duplicate stamps:  {qc['duplicates']}")
+    print(f"  Out-of-order rows: {qc['out_of_order']}")
+    print(f"  Gaps:              {len(qc['gaps'])}")
+    for g in qc['gaps'][:10]:
+        print(f"    {g['after']} -> {g['before']}  ({g['missing_intervals']} intervals missing)")
+    print()
+
+    labels = list(FLAG_NAMES.values())
+    print(f"  {'Column':<16} {'Good %':>7} " + " ".join(f"{lab[:6]:>7}" for lab in labels))
+    print("  " + "-" * (25 + 8 * len(labels)))
+    for name, s in qc['summary'].items():
+        print(f"  {name:<16} {s['pct_good']:>7.1f} " + " ".join(f"{s[lab]:>7}" for lab in labels))
+
+    print()
+    print("  Usable rows by month (all columns passing):")
+    all_good = qc['mask'].all(axis=1)
+    months = interval_months(qc['timestamps'], qc['interval_minutes'])
+    for p, expected in zip(qc['periods'], qc['period_expected']):
+        got = int(all_good[months == p].sum())
+        print(f"    {p}  {got:>5} / {expected:<5} ({100.0 * got / expected:5.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Compressed Columnar Interval Store
+
+One file per meter export, laid out so a date range and a few columns can
+be read without touching the rest:
+
+    magic | compressed blocks ... | JSON header | chunk table | block table | footer
+
+- Rows are split into fixed time chunks (default 7 days, aligned to the
+  epoch); every column of every chunk is one zlib (level 1) block, and
+  the chunk's timestamps are one more block of delta-encoded minutes
+- The chunk table holds each chunk's first/last timestamp and row count;
+  the block table holds every block's offset, size, min, max and NaN
+  count, so range and value queries are answered from the index alone
+- The index sits at the end of the file, so a CSV is imported in one
+  streaming pass (iter_interval_csv chunks in, finished time chunks out)
+
+interval_data.read_interval_csv / iter_interval_csv accept store paths
+and use an up-to-date `<name>.cmvpi` next to a CSV automatically.
+
+Usage:
+    python interval_store.py --import-all
+    python interval_store.py --file ../public/data/greenfield_reporting_hourly.cmvpi --start 2025-06-01 --end 2025-09-01
+    python interval_store.py --import ../public/data/greenfield_baseline_hourly.csv --chunk-days 1
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+MAGIC = b'CMVPIVS1'
+VERSION = 1
+STORE_SUFFIX = '.cmvpi'
+LEVEL = 1
+FOOTER = np.dtype([('index_offset', '<u8'), ('header_len', '<u8')])
+CHUNK_DTYPE = np.dtype([('start', '<i8'), ('end', '<i8'), ('rows', '<u4'),
+                        ('ts_offset', '<u8'), ('ts_nbytes', '<u4')])
+BLOCK_DTYPE = np.dtype([('offset', '<u8'), ('nbytes', '<u4'), ('min', '<f8'), ('max', '<f8'), ('nan', '<u4')])
+EPOCH = np.datetime64('1970-01-01T00:00', 'm')
+
+
+def store_path(csv_path):
+    """Default store file for a CSV: same name, .cmvpi suffix."""
+    return os.path.splitext(csv_path)[0] + STORE_SUFFIX
+
+
+def is_store(path):
+    """True if `path` starts with the store magic."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _minutes(timestamps):
+    return (np.asarray(timestamps, dtype='datetime64[m]') - EPOCH).astype(np.int64)
+
+
+@contextlib.contextmanager
+def replace_when_done(path):
+    """Yield a temporary path beside `path`; it replaces `path` only if the block completes.
+
+    A failed write never leaves a partial store that looks newer than its CSV.
+    """
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(path) + '.',
+                               dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def write_store(path, chunks, chunk_days=7):
+    """Write interval chunks ({'timestamps', 'columns', 'values'}, time-ordered) to a store.
+
+    The store is built under a temporary name and renamed when complete.
+    Returns the number of rows written.
+    """
+    chunk_minutes = int(chunk_days * 24 * 60)
+    chunk_rows, block_rows = [], []
+    columns = None
+    pending_t, pending_v = [], []
+    rows = 0
+    last = np.iinfo(np.int64).min
+
+    with replace_when_done(path) as tmp, open(tmp, 'wb') as f:
+        f.write(MAGIC)
+
+        def flush(t, v):
+            ts_raw = np.diff(t, prepend=0).astype('<i8').tobytes()
+            ts_blob = zlib.compress(ts_raw, LEVEL)
+            chunk_rows.append((t[0], t[-1], len(t), f.tell(), len(ts_blob)))
+            f.write(ts_blob)
+            nan = np.isnan(v)
+            blocks = []
+            for j in range(v.shape[1]):
+                blob = zlib.compress(np.ascontiguousarray(v[:, j], dtype='<f8').tobytes(), LEVEL)
+                ok = ~nan[:, j]
+                lo, hi = (float(v[ok, j].min()), float(v[ok, j].max())) if ok.any() else (np.nan, np.nan)
+                blocks.append((f.tell(), len(blob), lo, hi, int(nan[:, j].sum())))
+                f.write(blob)
+            block_rows.append(blocks)
+
+        for chunk in chunks:
+            if columns is None:
+                columns = list(chunk['columns'])
+            elif list(chunk['columns']) != columns:
+                raise ValueError('all chunks must have the same columns')
+            t = _minutes(chunk['timestamps'])
+            if t.size == 0:
+                continue
+            if t[0] < last or np.any(np.diff(t) < 0):
+                raise ValueError('timestamps must be in time order')
+            last = int(t[-1])
+            pending_t.append(t)
+            pending_v.append(np.asarray(chunk['values'], dtype=float))
+            t_all, v_all = np.concatenate(pending_t), np.vstack(pending_v)
+            cid = t_all // chunk_minutes
+            cut = np.concatenate([[0], np.flatnonzero(np.diff(cid)) + 1])
+            # Every time chunk except the last one in the buffer is complete
+            for a, b in zip(cut[:-1], cut[1:]):
+                flush(t_all[a:b], v_all[a:b])
+                rows += b - a
+            pending_t, pending_v = [t_all[cut[-1]:]], [v_all[cut[-1]:]]
+        if pending_t and pending_t[0].size:
+            flush(pending_t[0], pending_v[0])
+            rows += pending_t[0].size
+        if columns is None:
+            raise ValueError('no data to store')
+        if rows == 0:
+            raise ValueError('no data rows')
+
+        index_offset = f.tell()
+        chunk_table = np.array(chunk_rows, dtype=CHUNK_DTYPE)
+        block_table = np.array(block_rows, dtype=BLOCK_DTYPE).reshape(len(chunk_rows), len(columns))
+        header = json.dumps({'version': VERSION, 'columns': columns, 'n_chunks': len(chunk_rows),
+                             'chunk_minutes': chunk_minutes, 'rows': int(rows), 'codec': f'zlib-{LEVEL}'}).encode()
+        f.write(header)
+        f.write(chunk_table.tobytes())
+        f.write(block_table.tobytes())
+        f.write(np.array([(index_offset, len(header))], dtype=FOOTER).tobytes())
+        f.write(MAGIC)
+    return rows
+
+
+def open_store(path):
+    """Read only the index: {'path', 'columns', 'chunks', 'blocks', 'rows', 'chunk_minutes'}."""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{os.path.basename(path)} is not an interval store')
+        f.seek(-(FOOTER.itemsize + len(MAGIC)), os.SEEK_END)
+        footer = np.frombuffer(f.read(FOOTER.itemsize), dtype=FOOTER)[0]
+        f.seek(int(footer['index_offset']))
+        header = json.loads(f.read(int(footer['header_len'])))
+        if header['version'] != VERSION:
+            raise ValueError(f"unsupported interval store version {header['version']}")
+        n, k = header['n_chunks'], len(header['columns'])
+        chunks = np.frombuffer(f.read(n * CHUNK_DTYPE.itemsize), dtype=CHUNK_DTYPE)
+        blocks = np.frombuffer(f.read(n * k * BLOCK_DTYPE.itemsize), dtype=BLOCK_DTYPE).reshape(n, k)
+    return {'path': path, 'columns': header['columns'], 'chunks': chunks, 'blocks': blocks,
+            'rows': header['rows'], 'chunk_minutes': header['chunk_minutes']}
+
+
+def chunk_range(store, start=None, end=None):
+    """Indices of the chunks overlapping [start, end) (datetime64 or ISO strings)."""
+    chunks = store['chunks']
+    lo = 0 if start is None else int(np.searchsorted(chunks['end'], _minutes(np.datetime64(start, 'm')), 'left'))
+    hi = len(chunks) if end is None else int(np.searchsorted(chunks['start'], _minutes(np.datetime64(end, 'm')), 'left'))
+    return np.arange(lo, max(lo, hi))
+
+
+def chunks_where(store, column, low=-np.inf, high=np.inf):
+    """Chunks whose [min, max] for `column` overlaps [low, high] (answered from the index)."""
+    b = store['blocks'][:, store['columns'].index(column)]
+    return np.flatnonzero((b['max'] >= low) & (b['min'] <= high))
+
+
+def _read_chunk(f, store, i, cols):
+    c = store['chunks'][i]
+    f.seek(int(c['ts_offset']))
+    t = np.cumsum(np.frombuffer(zlib.decompress(f.read(int(c['ts_nbytes']))), dtype='<i8'))
+    values = np.empty((int(c['rows']), len(cols)))
+    for out, j in enumerate(cols):
+        b = store['blocks'][i, j]
+        f.seek(int(b['offset']))
+        values[:, out] = np.frombuffer(zlib.decompress(f.read(int(b['nbytes']))), dtype='<f8')
+    return EPOCH + t.astype('timedelta64[m]'), values
+
+
+def iter_store(path, columns=None, start=None, end=None, chunks=None):
+    """Yield {'timestamps', 'columns', 'values'} per stored time chunk in [start, end).
+
+    chunks: optional explicit chunk indices (e.g. from chunks_where).
+    """
+    store = path if isinstance(path, dict) else open_store(path)
+    names = store['columns'] if columns is None else list(columns)
+    missing = [c for c in names if c not in store['columns']]
+    if missing:
+        raise ValueError(f"columns not in {os.path.basename(store['path'])}: {', '.join(missing)}")
+    cols = [store['columns'].index(c) for c in names]
+    selected = chunk_range(store, start, end) if chunks is None else np.intersect1d(chunk_range(store, start, end), chunks)
+    t_lo = None if start is None else np.datetime64(start, 'm')
+    t_hi = None if end is None else np.datetime64(end, 'm')
+    with open(store['path'], 'rb') as f:
+        for i in selected:
+            ts, values = _read_chunk(f, store, int(i), cols)
+            keep = np.ones(len(ts), dtype=bool)
+            if t_lo is not None:
+                keep &= ts >= t_lo
+            if t_hi is not None:
+                keep &= ts < t_hi
+            if not keep.all():
+                ts, values = ts[keep], values[keep]
+            yield {'timestamps': ts, 'columns': names, 'values': values}
+
+
+def read_store(path, columns=None, start=None, end=None):
+    """Whole selection as one {'timestamps', 'columns', 'values'} dict (read_interval_csv layout)."""
+    store = path if isinstance(path, dict) else open_store(path)
+    parts = list(iter_store(store, columns, start, end))
+    names = store['columns'] if columns is None else list(columns)
+    if not parts:
+        return {'timestamps': np.array([], dtype='datetime64[m]'), 'columns': names,
+                'values': np.zeros((0, len(names)))}
+    return {'timestamps': np.concatenate([p['timestamps'] for p in parts]), 'columns': names,
+            'values': np.vstack([p['values'] for p in parts])}
+
+
+def import_csv(csv_path, path=None, chunk_days=7, chunk_rows=100_000):
+    """Stream an interval CSV into a store (default: alongside it); returns the store path."""
+    from interval_data import iter_interval_csv
+    path = path or store_path(csv_path)
+    write_store(path, iter_interval_csv(csv_path, chunk_rows, prefer_store=False), chunk_days)
+    return path
+
+
+def is_interval_csv(path):
+    """True if the file's first header field is 'datetime' (monthly billing CSVs start with 'month')."""
+    try:
+        with open(path) as f:
+            return f.readline().startswith('datetime,')
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def interval_csvs(data_dir):
+    """Interval CSVs (first header field 'datetime') in a directory."""
+    return [p for p in sorted(glob.glob(os.path.join(data_dir, '*.csv'))) if is_interval_csv(p)]
+
+
+def main():
+    from interval_data import DATA_DIR, read_interval_csv
+
+    parser = argparse.ArgumentParser(description='Compressed columnar interval store')
+    parser.add_argument('--import-all', action='store_true', help='Import every interval CSV in public/data')
+    parser.add_argument('--import', dest='import_csv', type=str, action='append', default=None,
+                        help='Import one interval CSV (repeatable)')
+    parser.add_argument('--chunk-days', type=float, default=7, help='Time chunk length in days (default: 7)')
+    parser.add_argument('--file', type=str, default=None, help='Store to query')
+    parser.add_argument('--columns', type=str, default=None, help='Comma-separated columns to read')
+    parser.add_argument('--start', type=str, default=None, help='First timestamp (inclusive)')
+    parser.add_argument('--end', type=str, default=None, help='Last timestamp (exclusive)')
+    args = parser.parse_args()
+
+    sources = (interval_csvs(DATA_DIR) if args.import_all else []) + (args.import_csv or [])
+    if sources:
+        print(f"  {'CSV':<38} {'Rows':>7} {'CSV MB':>7} {'Store MB':>9} {'Import s':>9}")
+        print("  " + "-" * 74)
+    for csv_path in sources:
+        t0 = time.perf_counter()
+        path = import_csv(csv_path, chunk_days=args.chunk_days)
+        elapsed = time.perf_counter() - t0
+        print(f"  {os.path.basename(csv_path):<38} {open_store(path)['rows']:>7,}"
+              f" {os.path.getsize(csv_path) / 1e6:>7.2f} {os.path.getsize(path) / 1e6:>9.2f} {elapsed:>9.3f}")
+    if sources:
+        print()
+
+    target = args.file or (store_path(sources[0]) if sources else None)
+    if target is None:
+        parser.error('nothing to do: use --import-all, --import or --file')
+    store = open_store(target)
+    columns = args.columns.split(',') if args.columns else None
+    t0 = time.perf_counter()
+    data = read_store(store, columns, args.start, args.end)
+    t_store = time.perf_counter() - t0
+    touched = chunk_range(store, args.start, args.end)
+    print("=" * 60)
+    print("INTERVAL STORE")
+    print("=" * 60)
+    print(f"  File:     {os.path.basename(target)} ({store['rows']:,} rows, {len(store['chunks'])} chunks,"
+          f" {store['chunk_minutes'] / 1440:g}-day)")
+    print(f"  Query:    {args.start or 'start'} to {args.end or 'end'},"
+          f" {len(data['columns'])} of {len(store['columns'])} columns")
+    print(f"  Read:     {len(data['timestamps']):,} rows from {len(touched)} chunks in {t_store * 1000:.1f} ms")
+    csv_source = os.path.splitext(target)[0] + '.csv'
+    if os.path.exists(csv_source):
+        t0 = time.perf_counter()
+        read_interval_csv(csv_source, columns, prefer_store=False)
+        print(f"  CSV:      full parse {(time.perf_counter() - t0) * 1000:.1f} ms")
+    print()
+    print(f"  {'Column':<18} {'Min':>10} {'Max':>10}   (from the index)")
+    print("  " + "-" * 42)
+    for j, name in enumerate(store['columns']):
+        if columns is None or name in columns:
+            b = store['blocks'][touched, j]
+            print(f"  {name:<18} {np.nanmin(b['min']):>10.1f} {np.nanmax(b['max']):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
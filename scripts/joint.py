@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Joint Electric + Gas Regression
+
+One 5P change-point design shared by every fuel and end use, so the
+interactive effects of the ECMs (less electric lighting heat, more gas
+heating) show up as correlated residuals instead of being lost between
+two independent fits:
+- The shared change points are chosen by a single grid search that
+  scores every candidate on all outputs at once (scale-free: each
+  output's SSE relative to its total sum of squares)
+- All outputs are then solved with regression.fit_ols against the same
+  design, i.e. one Cholesky factor of X'WX for every column of Y
+- The cross-output residual covariance Sigma gives
+  Cov(beta_j, beta_k) = Sigma_jk (X'WX)^-1, so the uncertainty of any
+  weighted combination of savings (dollars, MMBtu, CO2) includes the
+  fuel-to-fuel correlation
+
+Usage:
+    python joint.py
+    python joint.py --end-uses --weights days
+    python joint.py --per-day --confidence 95
+"""
+import argparse
+
+import numpy as np
+
+from changepoint import _candidate_grid, changepoint_features
+from interval_data import BASELINE_MONTHLY, REPORTING_MONTHLY, read_monthly_csv
+from regression import billing_weights, combine_weights, fit_ols, g14_metrics, t_quantile
+from savings import CO2_ELEC, CO2_GAS, ELEC_RATE, GAS_RATE
+
+END_USES = ('lighting_kwh', 'cooling_kwh', 'fan_kwh', 'plug_kwh', 'datacenter_kwh',
+            'heating_therms', 'dhw_therms')
+MMBTU = {'kwh': 0.003412, 'therms': 0.1}     # site energy per kWh / per therm
+
+
+def joint_changepoints(oat, Y, w, step=1.0):
+    """Shared 5P change points minimizing sum_k SSE_k / SS_tot_k over all outputs.
+
+    Slopes of the first output must be non-negative (the physical model);
+    the other outputs may respond in either direction. Zero-weight (e.g.
+    QC-masked) rows are left out, so a NaN in them cannot reach the sums.
+    """
+    t = np.asarray(oat, dtype=float)
+    used = w > 0
+    if not used.all():
+        t, Y, w = t[used], Y[used], w[used]
+    cp_h, cp_c = _candidate_grid('5P', t, step)
+    if cp_h.size == 0:
+        raise ValueError('temperature range too narrow for a change-point search')
+    H = np.maximum(cp_h[None, :] - t[:, None], 0)               # (n, c)
+    C = np.maximum(t[:, None] - cp_c[None, :], 0)
+    wY = w[:, None] * Y
+    G = np.zeros((cp_h.size, 3, 3))
+    G[:, 0, 0] = w.sum()
+    G[:, 0, 1] = G[:, 1, 0] = w @ H
+    G[:, 0, 2] = G[:, 2, 0] = w @ C
+    G[:, 1, 1] = w @ H ** 2
+    G[:, 2, 2] = w @ C ** 2
+    # Heating and cooling hinges never overlap (CPh < CPc), so their cross term is 0
+    rhs = np.stack([np.broadcast_to(wY.sum(axis=0), (cp_h.size, Y.shape[1])),
+                    H.T @ wY, C.T @ wY], axis=1)                  # (c, 3, m)
+    ok = np.linalg.det(G) > 1e-10
+    beta = np.zeros_like(rhs)
+    beta[ok] = np.linalg.solve(G[ok], rhs[ok])
+    y_bar = wY.sum(axis=0) / w.sum()
+    ss_tot = (w[:, None] * (Y - y_bar) ** 2).sum(axis=0)
+    sse = (w[:, None] * Y ** 2).sum(axis=0) - np.einsum('cpm,cpm->cm', beta, rhs)
+    score = (sse / np.where(ss_tot > 0, ss_tot, 1.0)).sum(axis=1)
+    ok &= (beta[:, 1:, 0] >= 0).all(axis=1)
+    if not ok.any():
+        raise ValueError('no change-point candidate with non-negative slopes for the first output')
+    best = int(np.argmin(np.where(ok, score, np.inf)))
+    return float(cp_h[best]), float(cp_c[best])
+
+
+def fit_joint(oat, energy, names, weights=None, mask=None, days=None, per_day=False, step=1.0):
+    """Fit every column of `energy` (n, m) on one shared 5P design.
+
+    Returns {'names', 'change_points', 'per_day', 'fit' (multi-output
+    fit_ols result), 'resid_cov', 'resid_corr', 'g14'}.
+    """
+    t = np.asarray(oat, dtype=float)
+    E = np.asarray(energy, dtype=float)
+    if per_day:
+        if days is None:
+            raise ValueError('per_day normalization needs the days of each period')
+        Y = E / np.asarray(days, dtype=float)[:, None]
+    else:
+        Y = E
+    w = combine_weights(mask, weights)
+    w_search = np.ones_like(t) if w is None else w
+    change_points = joint_changepoints(t, Y, w_search, step)
+
+    X = changepoint_features('5P', t, change_points)
+    fit = fit_ols(X, Y, weights=w)
+    wr = np.where(w_search[:, None] > 0, fit['residuals'], 0.0) * np.sqrt(w_search)[:, None]
+    resid_cov = wr.T @ wr / fit['df_resid'][None, :]
+    sd = np.sqrt(np.diag(resid_cov))
+    sd_outer = np.outer(sd, sd)
+    model = {
+        'names': list(names),
+        'change_points': list(change_points),
+        'per_day': per_day,
+        'fit': fit,
+        'resid_cov': resid_cov,
+        'resid_corr': np.divide(resid_cov, sd_outer, out=np.zeros_like(resid_cov), where=sd_outer > 0),
+    }
+    predicted = predict_joint(model, t, days)
+    model['g14'] = g14_metrics(E, predicted, X.shape[1] + 2, weights=w)
+    return model
+
+
+def predict_joint(model, oat, days=None):
+    """(n, m) predictions for new temperatures (period totals when per_day)."""
+    X = changepoint_features('5P', oat, model['change_points'])
+    pred = X @ model['fit']['beta']
+    if model['per_day']:
+        if days is None:
+            raise ValueError('per-day model needs the days of each period to predict totals')
+        pred = pred * np.asarray(days, dtype=float)[:, None]
+    return pred
+
+
+def combined_savings(model, oat, actual, coef, days=None, weights=None, confidence=0.90):
+    """Savings of every output and of linear combinations of them, with correlated uncertainty.
+
+    coef: (m,) or (k, m) combination weights, e.g. $/unit or MMBtu/unit.
+    weights: WLS weights of the reporting periods on the fit's scale
+    (period noise variance is Sigma / weight).
+    Var(S) = c' Sigma c (s' (X'WX)^-1 s + sum_i d_i^2 / w_i), where s is
+    the sum of reporting-period design rows (scaled by days d_i when per_day).
+    Returns per-output totals and, per combination, the savings and its
+    uncertainty with and without the cross-output covariance.
+    """
+    actual = np.asarray(actual, dtype=float)
+    baseline = predict_joint(model, oat, days)
+    savings = (baseline - actual).sum(axis=0)
+    X = changepoint_features('5P', oat, model['change_points'])
+    d = np.asarray(days, dtype=float) if model['per_day'] else np.ones(len(X))
+    w = np.ones(len(X)) if weights is None else np.asarray(weights, dtype=float)
+    s = d @ X
+    factor = s @ model['fit']['xtx_inv'] @ s + (d ** 2 / w).sum()
+    cov = model['resid_cov'] * factor                             # Cov of per-output savings
+    c = np.atleast_2d(np.asarray(coef, dtype=float))
+    t = t_quantile(confidence, float(np.min(model['fit']['df_resid'])))
+    var = np.einsum('km,mn,kn->k', c, cov, c)
+    var_indep = (c ** 2 * np.diag(cov)).sum(axis=1)
+    return {
+        'baseline': baseline.sum(axis=0),
+        'actual': actual.sum(axis=0),
+        'savings': savings,
+        'uncertainty': t * np.sqrt(np.diag(cov)),
+        'combined': c @ savings,
+        'combined_uncertainty': t * np.sqrt(var),
+        'independent_uncertainty': t * np.sqrt(var_indep),
+        'savings_cov': cov,
+        'confidence': confidence,
+    }
+
+
+def _unit(name):
+    return 'therms' if name.endswith('therms') else 'kwh'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Joint electric + gas regression')
+    parser.add_argument('--baseline', type=str, default=BASELINE_MONTHLY, help='Baseline monthly CSV')
+    parser.add_argument('--reporting', type=str, default=REPORTING_MONTHLY, help='Reporting monthly CSV')
+    parser.add_argument('--end-uses', action='store_true', help='Also fit the end-use columns')
+    parser.add_argument('--weights', choices=['none', 'days'], default='none',
+                        help='WLS weights from billing-period day counts (default: none)')
+    parser.add_argument('--per-day', action='store_true', help='Model energy per day')
+    parser.add_argument('--confidence', type=int, default=90, help='Confidence level %% (default: 90)')
+    args = parser.parse_args()
+
+    base = read_monthly_csv(args.baseline)
+    rep = read_monthly_csv(args.reporting)
+    names = ['total_kwh', 'total_therms'] + (list(END_USES) if args.end_uses else [])
+    w = billing_weights(base['days'], per_day=args.per_day) if args.weights == 'days' else None
+    w_rep = billing_weights(rep['days'], per_day=args.per_day) if args.weights == 'days' else None
+    model = fit_joint(base['avg_oat_f'], np.column_stack([base[n] for n in names]), names,
+                      weights=w, days=base['days'], per_day=args.per_day)
+    rates = {'kwh': ELEC_RATE, 'therms': GAS_RATE}
+    co2 = {'kwh': CO2_ELEC, 'therms': CO2_GAS}
+    # Combinations over the two whole-building meters only (end uses are inside them)
+    coef = np.zeros((3, len(names)))
+    for j, name in enumerate(names[:2]):
+        coef[:, j] = rates[_unit(name)], MMBTU[_unit(name)], co2[_unit(name)]
+    res = combined_savings(model, rep['avg_oat_f'], np.column_stack([rep[n] for n in names]), coef,
+                           rep['days'], w_rep, args.confidence / 100)
+
+    cp_h, cp_c = model['change_points']
+    print("=" * 74)
+    print("JOINT ELECTRIC + GAS MODEL")
+    print("=" * 74)
+    print(f"  Shared design: 5P, CPh = {cp_h:.1f} F, CPc = {cp_c:.1f} F  ({len(names)} outputs, one factorization)")
+    print()
+    print(f"  {'Output':<16} {'B':>10} {'betaH':>9} {'betaC':>9} {'CV(RMSE)':>9} {'Savings':>10}"
+          f" {'+/-':>8}")
+    print("  " + "-" * 75)
+    beta = model['fit']['beta']
+    for j, name in enumerate(names):
+        print(f"  {name:<16} {beta[0, j]:>10,.1f} {beta[1, j]:>9,.2f} {beta[2, j]:>9,.2f}"
+              f" {model['g14']['cvrmse'][j]:>8.2f}% {res['savings'][j]:>10,.0f} {res['uncertainty'][j]:>8,.0f}")
+    print()
+    r = model['resid_corr'][0, 1]
+    print(f"  Residual correlation, total_kwh vs total_therms: {r:+.3f}")
+    print()
+    print(f"  {'Combined savings':<20} {'Value':>12} {'+/- joint':>11} {'+/- indep.':>11}"
+          f"  ({args.confidence}%)")
+    print("  " + "-" * 60)
+    for label, k in (('Cost ($)', 0), ('Site energy (MMBtu)', 1), ('CO2 (t)', 2)):
+        print(f"  {label:<20} {res['combined'][k]:>12,.1f} {res['combined_uncertainty'][k]:>11,.1f}"
+              f" {res['independent_uncertainty'][k]:>11,.1f}")
+
+
+if __name__ == '__main__':
+    main()
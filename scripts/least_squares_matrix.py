@@ -6,27 +6,91 @@ Replicates the 'Least Squares Matrix Formula' spreadsheet:
 - Builds X'X and X'Y matrices step by step
 - Solves beta = (X'X)^-1 X'Y
 - Computes R^2, standard errors, t-statistics
+- Optional robust standard errors (HC0-HC3, Newey-West HAC)
 - Cross-validates against numpy's lstsq
 
 Usage:
     python least_squares_matrix.py
     python least_squares_matrix.py --x 0.5 4 6 8 10 --y 6 7 7 8 7
+    python least_squares_matrix.py --cov-type HC3
 """
 import argparse
 import math
-
-
-def ols_matrix(x, y):
-    """Solve y = b0 + b1*x via matrix algebra (no numpy)."""
-    n = len(x)
-
-    # Build X'X (2x2) and X'Y (2x1)
-    sum_x = sum(x)
-    sum_x2 = sum(xi ** 2 for xi in x)
-    sum_y = sum(y)
-    sum_xy = sum(xi * yi for xi, yi in zip(x, y))
-
-    xtx = [[n, sum_x], [sum_x, sum_x2]]
+from itertools import compress
+
+
+COV_TYPES = ('classical', 'HC0', 'HC1', 'HC2', 'HC3', 'HAC')
+
+
+def robust_cov(x, residuals, xtx_inv, cov_type, maxlags=None, mask=None, weights=None):
+    """Sandwich covariance (X'X)^-1 M (X'X)^-1 for the 2-parameter model.
+
+    M sums the outer products of the row scores [r, x*r]; HC2/HC3 rescale
+    each residual by its leverage, HAC adds Bartlett-weighted lag products.
+    Masked rows keep their place in time with a zero score; WLS weights
+    scale each residual (and its leverage).
+    """
+    if mask is None:
+        mask = [True] * len(x)
+    if weights is None:
+        weights = [1.0] * len(x)
+    n = sum(1 for m in mask if m)
+    (a00, a01), (_, a11) = xtx_inv
+    scores = []
+    for xi, ri, keep, wi in zip(x, residuals, mask, weights):
+        if not keep:
+            scores.append((0.0, 0.0))
+            continue
+        ri = wi * ri
+        if cov_type in ('HC2', 'HC3'):
+            h = wi * (a00 + 2 * a01 * xi + a11 * xi ** 2)
+            ri = ri / (1 - h) ** (0.5 if cov_type == 'HC2' else 1.0)
+        scores.append((ri, xi * ri))
+
+    if cov_type == 'HAC':
+        lags = int(4 * (n / 100) ** (2 / 9)) if maxlags is None else maxlags
+    else:
+        lags = 0
+    meat = [[0.0, 0.0], [0.0, 0.0]]
+    for lag in range(lags + 1):
+        w = 1.0 if lag == 0 else 2 * (1 - lag / (lags + 1))
+        for g, h in zip(scores[lag:], scores):
+            for i in range(2):
+                for j in range(2):
+                    # Symmetrized lag product: (g h' + h g') / 2 per side
+                    meat[i][j] += w * (g[i] * h[j] + h[i] * g[j]) / 2
+
+    cov = [[sum(xtx_inv[i][k] * meat[k][l] * xtx_inv[l][j] for k in range(2) for l in range(2))
+            for j in range(2)] for i in range(2)]
+    if cov_type == 'HC1':
+        cov = [[c * n / (n - 2) for c in row] for row in cov]
+    return cov, lags
+
+
+def ols_matrix(x, y, mask=None, cov_type='classical', maxlags=None, weights=None):
+    """Solve y = b0 + b1*x via matrix algebra (no numpy).
+
+    mask: optional per-row usable flags (e.g. from interval_qc.row_mask);
+    rows flagged False are skipped in the sums rather than copied out.
+    y_hat and residuals are still returned for every row.
+    weights: optional WLS weights (e.g. billing-period day counts); the
+    sums below become weighted sums, so X'X is really X'WX.
+    cov_type: 'classical' or one of the robust estimators in COV_TYPES.
+    """
+    def used(values):
+        return values if mask is None else compress(values, mask)
+
+    n = len(x) if mask is None else sum(1 for m in mask if m)
+    w = [1.0] * len(x) if weights is None else weights
+
+    # Build X'WX (2x2) and X'WY (2x1)
+    sum_w = sum(used(w))
+    sum_x = sum(wi * xi for wi, xi in zip(used(w), used(x)))
+    sum_x2 = sum(wi * xi ** 2 for wi, xi in zip(used(w), used(x)))
+    sum_y = sum(wi * yi for wi, yi in zip(used(w), used(y)))
+    sum_xy = sum(wi * xi * yi for wi, xi, yi in zip(used(w), used(x), used(y)))
+
+    xtx = [[sum_w, sum_x], [sum_x, sum_x2]]
     xty = [sum_y, sum_xy]
 
     # Invert 2x2: [[a,b],[c,d]]^-1 = (1/det) * [[d,-b],[-c,a]]
@@ -43,11 +107,11 @@ def ols_matrix(x, y):
     # Predictions and residuals
     y_hat = [b0 + b1 * xi for xi in x]
     residuals = [yi - yhi for yi, yhi in zip(y, y_hat)]
-    y_mean = sum_y / n
+    y_mean = sum_y / sum_w
 
     # Sum of squares
-    ss_res = sum(r ** 2 for r in residuals)
-    ss_tot = sum((yi - y_mean) ** 2 for yi in y)
+    ss_res = sum(wi * r ** 2 for wi, r in zip(used(w), used(residuals)))
+    ss_tot = sum(wi * (yi - y_mean) ** 2 for wi, yi in zip(used(w), used(y)))
     ss_reg = ss_tot - ss_res
 
     r_squared = 1 - ss_res / ss_tot if ss_tot > 0 else 0
@@ -55,8 +119,13 @@ def ols_matrix(x, y):
     # Standard errors
     p = 2  # number of parameters
     mse = ss_res / (n - p)
-    se_b0 = math.sqrt(mse * xtx_inv[0][0])
-    se_b1 = math.sqrt(mse * xtx_inv[1][1])
+    if cov_type == 'classical':
+        cov = [[mse * v for v in row] for row in xtx_inv]
+        lags = None
+    else:
+        cov, lags = robust_cov(x, residuals, xtx_inv, cov_type, maxlags, mask, w)
+    se_b0 = math.sqrt(cov[0][0])
+    se_b1 = math.sqrt(cov[1][1])
 
     # t-statistics
     t_b0 = b0 / se_b0 if se_b0 > 0 else float('inf')
@@ -68,7 +137,8 @@ def ols_matrix(x, y):
         't_b0': t_b0, 't_b1': t_b1,
         'r_squared': r_squared,
         'ss_reg': ss_reg, 'ss_res': ss_res, 'ss_tot': ss_tot,
-        'mse': mse,
+        'mse': mse, 'n': n,
+        'cov': cov, 'cov_type': cov_type, 'maxlags': lags,
         'y_hat': y_hat, 'residuals': residuals,
         'xtx': xtx, 'xty': xty, 'xtx_inv': xtx_inv, 'det': det,
     }
@@ -88,12 +158,15 @@ def main():
     parser = argparse.ArgumentParser(description='OLS Regression via Matrix Algebra')
     parser.add_argument('--x', nargs='+', type=float, default=[0.5, 4, 6, 8, 10])
     parser.add_argument('--y', nargs='+', type=float, default=[6, 7, 7, 8, 7])
+    parser.add_argument('--cov-type', choices=COV_TYPES, default='classical',
+                        help='Standard error type (default: classical)')
+    parser.add_argument('--maxlags', type=int, default=None, help='HAC bandwidth (default: Newey-West rule)')
     args = parser.parse_args()
 
     x, y = args.x, args.y
     assert len(x) == len(y), "x and y must have the same length"
 
-    result = ols_matrix(x, y)
+    result = ols_matrix(x, y, cov_type=args.cov_type, maxlags=args.maxlags)
 
     print("=" * 60)
     print("OLS REGRESSION VIA MATRIX ALGEBRA")
@@ -141,7 +214,8 @@ def main():
     print()
 
     # Standard errors
-    print("STANDARD ERRORS & T-STATISTICS")
+    label = result['cov_type'] if result['maxlags'] is None else f"HAC, {result['maxlags']} lags"
+    print(f"STANDARD ERRORS & T-STATISTICS ({label})")
     print(f"  SE(b0) = {result['se_b0']:.4f}    t(b0) = {result['t_b0']:.4f}")
     print(f"  SE(b1) = {result['se_b1']:.4f}    t(b1) = {result['t_b1']:.4f}")
 
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Compact Model Store
+
+Fitted models (OLS, change-point, TOWT) saved to one binary file so a
+10-15 year ESPC term can be predicted without refitting:
+
+    magic 'CMVPMOD1' | header length | JSON header | record table | float64 pool
+
+- Record table: one fixed-width structured row per model (id, type,
+  sizes, pool offset, G14 statistics, residual autocorrelation and a
+  blake2b fingerprint of the training data)
+- Pool: every model's coefficients, covariance, change points, TOWT knots
+  and occupancy flags, back to back
+
+open_store() maps the whole file with a single np.memmap, so opening
+100k models is one mapping plus two array views, with no per-model
+parsing. Records are sorted by id for binary-search lookup, and
+stacked_beta() gathers the coefficients of many models with one fancy
+index for batch prediction.
+
+Usage:
+    python model_store.py
+    python model_store.py --bench 100000
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from interval_store import replace_when_done
+from regression import COV_TYPES
+from savings import lag1_autocorrelation
+
+MAGIC = b'CMVPMOD1'
+VERSION = 1
+MODEL_CODES = ('OLS', '2P', '3PH', '3PC', '5P', 'TOWT')
+RESOLUTIONS = ('monthly', 'hourly')
+
+RECORD_DTYPE = np.dtype([
+    ('id', 'S32'),
+    ('model_type', 'u1'), ('cov_type', 'u1'), ('per_day', 'u1'), ('resolution', 'u1'),
+    ('p', 'u2'), ('n_cp', 'u1'), ('n_knots', 'u1'), ('step', 'u2'), ('n_bins', 'u2'),
+    ('offset', 'u8'),
+    ('n', 'f8'), ('df_resid', 'f8'), ('mse', 'f8'), ('rho', 'f8'),
+    ('nmbe', 'f8'), ('cvrmse', 'f8'), ('r_squared', 'f8'), ('passes', 'u1'),
+    ('fingerprint', 'S16'),
+])
+
+
+def fingerprint(*arrays):
+    """16-byte blake2b digest of the training arrays (values and shapes)."""
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a, dtype=float)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.digest()
+
+
+def _pool_parts(model):
+    """Float arrays stored in the pool for one model, in record order."""
+    fit = model['fit']
+    parts = [np.ravel(fit['beta']), np.ravel(fit['cov']),
+             np.asarray(model.get('change_points', ()), dtype=float)]
+    if model['model_type'] == 'TOWT':
+        parts += [np.asarray(model['knots'], dtype=float), np.asarray(model['occupied'], dtype=float)]
+    return parts
+
+
+def save_models(path, models, ids):
+    """Write single-meter model dicts (see ols_model, fit_changepoint, fit_towt) to `path`.
+
+    ids: one unique string per model (up to 32 bytes). A model's
+    'fingerprint' entry (see fingerprint()) is stored when present. The
+    file is written under a temporary name and renamed when complete.
+    """
+    if len(models) != len(ids):
+        raise ValueError('need one id per model')
+    encoded = [str(i).encode() for i in ids]
+    if any(len(i) > RECORD_DTYPE['id'].itemsize for i in encoded):
+        raise ValueError(f"model ids are limited to {RECORD_DTYPE['id'].itemsize} bytes")
+    if len(set(encoded)) != len(encoded):
+        raise ValueError('duplicate model id')
+    records = np.zeros(len(models), dtype=RECORD_DTYPE)
+    pool = []
+    offset = 0
+    for i, (model, model_id) in enumerate(zip(models, encoded)):
+        fit = model['fit']
+        if np.ndim(fit['beta']) != 1:
+            raise ValueError('save one model per meter (fit_ols result with 1-D y)')
+        parts = _pool_parts(model)
+        rec = records[i]
+        rec['id'] = model_id
+        rec['model_type'] = MODEL_CODES.index(model['model_type'])
+        rec['cov_type'] = COV_TYPES.index(fit.get('cov_type', 'classical'))
+        rec['per_day'] = bool(model.get('per_day', False))
+        rec['resolution'] = RESOLUTIONS.index('hourly' if model['model_type'] == 'TOWT' else 'monthly')
+        rec['p'] = len(fit['beta'])
+        rec['n_cp'] = len(model.get('change_points', ()))
+        if model['model_type'] == 'TOWT':
+            rec['n_knots'] = len(model['knots'])
+            rec['step'] = model['step']
+            rec['n_bins'] = len(model['occupied'])
+        rec['offset'] = offset
+        rec['n'] = fit['n']
+        rec['df_resid'] = fit['df_resid']
+        rec['mse'] = fit['mse']
+        rec['rho'] = model['rho'] if 'rho' in model else lag1_autocorrelation(fit['residuals'])
+        g14 = model['g14']
+        rec['nmbe'], rec['cvrmse'], rec['r_squared'] = g14['nmbe'], g14['cvrmse'], g14['r_squared']
+        rec['passes'] = g14['passes']
+        rec['fingerprint'] = model.get('fingerprint', b'')
+        pool.extend(parts)
+        offset += sum(part.size for part in parts)
+
+    order = np.argsort(records['id'], kind='stable')
+    records = records[order]
+    pool = np.concatenate(pool) if pool else np.zeros(0)
+
+    header = {'version': VERSION, 'n_models': len(records), 'pool_size': int(pool.size),
+              'record_dtype': RECORD_DTYPE.descr}
+    blob = json.dumps(header).encode()
+    start = len(MAGIC) + 8 + len(blob)
+    pad = -start % 8                       # keep the record table and pool 8-byte aligned
+    with replace_when_done(path) as tmp, open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(blob) + pad).tobytes())
+        f.write(blob + b' ' * pad)
+        f.write(records.tobytes())
+        f.write(pool.tobytes())
+
+
+def open_store(path):
+    """Map a model file: {'records', 'pool', 'ids', 'n_models'} (read-only views, no copies)."""
+    raw = np.memmap(path, dtype=np.uint8, mode='r')
+    if raw[:len(MAGIC)].tobytes() != MAGIC:
+        raise ValueError(f'{os.path.basename(path)} is not a model store')
+    header_len = int(raw[len(MAGIC):len(MAGIC) + 8].view(np.uint64)[0])
+    start = len(MAGIC) + 8
+    header = json.loads(raw[start:start + header_len].tobytes())
+    if header['version'] != VERSION:
+        raise ValueError(f"unsupported model store version {header['version']}")
+    dtype = np.dtype([tuple(field) for field in header['record_dtype']])
+    rec_start = start + header_len
+    rec_end = rec_start + header['n_models'] * dtype.itemsize
+    records = raw[rec_start:rec_end].view(dtype)
+    pool = raw[rec_end:rec_end + header['pool_size'] * 8].view(np.float64)
+    return {'records': records, 'pool': pool, 'ids': records['id'], 'n_models': header['n_models']}
+
+
+def find(store, model_id):
+    """Record index of a model id (binary search over the sorted ids)."""
+    key = str(model_id).encode()
+    i = int(np.searchsorted(store['ids'], key))
+    if i == store['n_models'] or store['ids'][i] != key:
+        raise KeyError(model_id)
+    return i
+
+
+def get_model(store, i):
+    """Rebuild the model dict of record i for predict_changepoint / predict_towt / regression.predict."""
+    rec = store['records'][i]
+    pool = store['pool']
+    p, n_cp = int(rec['p']), int(rec['n_cp'])
+    at = int(rec['offset'])
+    beta = np.array(pool[at:at + p])
+    at += p
+    cov = np.array(pool[at:at + p * p]).reshape(p, p)
+    at += p * p
+    change_points = [float(c) for c in pool[at:at + n_cp]]
+    at += n_cp
+    model_type = MODEL_CODES[rec['model_type']]
+    model = {
+        'id': rec['id'].decode(),
+        'model_type': model_type,
+        'change_points': change_points,
+        'per_day': bool(rec['per_day']),
+        'rho': float(rec['rho']),
+        'fit': {
+            'beta': beta, 'cov': cov, 'se': np.sqrt(np.diag(cov)),
+            'cov_type': COV_TYPES[rec['cov_type']],
+            'mse': float(rec['mse']), 'n': float(rec['n']), 'df_resid': float(rec['df_resid']), 'p': p,
+        },
+        'g14': {'nmbe': float(rec['nmbe']), 'cvrmse': float(rec['cvrmse']),
+                'r_squared': float(rec['r_squared']), 'n': float(rec['n']), 'passes': bool(rec['passes'])},
+        'fingerprint': rec['fingerprint'].tobytes().ljust(16, b'\0'),
+    }
+    if model_type == 'TOWT':
+        k, b = int(rec['n_knots']), int(rec['n_bins'])
+        model['step'] = int(rec['step'])
+        model['knots'] = [float(v) for v in pool[at:at + k]]
+        model['occupied'] = np.asarray(pool[at + k:at + k + b]) > 0.5
+    return model
+
+
+def stacked_beta(store, rows):
+    """(len(rows), p) coefficients of models that share a parameter count, in one gather."""
+    rec = store['records'][np.asarray(rows)]
+    p = np.unique(rec['p'])
+    if p.size != 1:
+        raise ValueError('models differ in parameter count')
+    idx = rec['offset'].astype(np.int64)[:, None] + np.arange(int(p[0]))
+    return store['pool'][idx]
+
+
+def ols_model(fit, g14):
+    """Wrap a single-meter fit_ols result as a storable 'OLS' model."""
+    return {'model_type': 'OLS', 'fit': fit, 'g14': g14}
+
+
+def main():
+    from changepoint import fit_changepoint, predict_changepoint
+    from interval_data import BASELINE_HOURLY, BASELINE_MONTHLY, column, read_interval_csv, read_monthly_csv
+    from regression import design_matrix, fit_ols, g14_metrics
+    from towt import fit_towt, predict_towt
+
+    parser = argparse.ArgumentParser(description='Compact model store')
+    parser.add_argument('--output', type=str, default=None, help='Model file (default: temporary)')
+    parser.add_argument('--bench', type=int, default=0, metavar='N',
+                        help='Also write and open a store of N change-point models')
+    args = parser.parse_args()
+
+    base = read_monthly_csv(BASELINE_MONTHLY)
+    oat, kwh, therms = base['avg_oat_f'], base['total_kwh'], base['total_therms']
+    elec = fit_changepoint(oat, kwh, '5P')
+    elec['fingerprint'] = fingerprint(oat, kwh)
+    gas = fit_changepoint(oat, therms, '3PH')
+    gas['fingerprint'] = fingerprint(oat, therms)
+    X = design_matrix(oat)
+    fit = fit_ols(X, kwh)
+    ols = ols_model(fit, g14_metrics(kwh, fit['y_hat'], 2))
+    ols['fingerprint'] = fingerprint(X, kwh)
+    hourly = read_interval_csv(BASELINE_HOURLY, columns=['total_kw', 'oat_f'])
+    towt = fit_towt(hourly['timestamps'], column(hourly, 'total_kw'), column(hourly, 'oat_f'))
+    towt['fingerprint'] = fingerprint(column(hourly, 'total_kw'), column(hourly, 'oat_f'))
+
+    path = args.output or os.path.join(tempfile.mkdtemp(), 'models.cmvp')
+    save_models(path, [elec, gas, ols, towt],
+                ['greenfield/elec', 'greenfield/gas', 'greenfield/ols', 'greenfield/towt'])
+    store = open_store(path)
+
+    print("=" * 70)
+    print("MODEL STORE")
+    print("=" * 70)
+    print(f"  File: {path}  ({os.path.getsize(path):,} bytes, {store['n_models']} models)")
+    print()
+    print(f"  {'Id':<18} {'Type':<5} {'p':>4} {'CV(RMSE)':>9} {'NMBE':>7}  {'Fingerprint':<32} Reload")
+    print("  " + "-" * 92)
+    hours = hourly['timestamps'][:168]
+    checks = {
+        'greenfield/elec': lambda m: np.allclose(predict_changepoint(m, oat), predict_changepoint(elec, oat)),
+        'greenfield/gas': lambda m: np.allclose(predict_changepoint(m, oat), predict_changepoint(gas, oat)),
+        'greenfield/ols': lambda m: np.allclose(X @ m['fit']['beta'], fit['y_hat']),
+        'greenfield/towt': lambda m: np.allclose(predict_towt(m, hours, column(hourly, 'oat_f')[:168]),
+                                                 predict_towt(towt, hours, column(hourly, 'oat_f')[:168])),
+    }
+    for i in range(store['n_models']):
+        m = get_model(store, i)
+        print(f"  {m['id']:<18} {m['model_type']:<5} {m['fit']['p']:>4} {m['g14']['cvrmse']:>8.2f}%"
+              f" {m['g14']['nmbe']:>6.2f}%  {m['fingerprint'].hex():<32} {'ok' if checks[m['id']](m) else 'MISMATCH'}")
+
+    if args.bench:
+        models = [elec] * args.bench
+        ids = [f'site{i:07d}/elec' for i in range(args.bench)]
+        bench = os.path.join(os.path.dirname(path), 'bench.cmvp')
+        t0 = time.perf_counter()
+        save_models(bench, models, ids)
+        t1 = time.perf_counter()
+        big = open_store(bench)
+        beta = stacked_beta(big, np.arange(big['n_models']))
+        t2 = time.perf_counter()
+        j = find(big, ids[args.bench // 2])
+        print()
+        print(f"  {args.bench:,} models: write {t1 - t0:.2f} s, open + gather all coefficients"
+              f" {(t2 - t1) * 1000:.1f} ms ({os.path.getsize(bench) / 1e6:.1f} MB), beta {beta.shape},"
+              f" lookup -> record {j}")
+
+
+if __name__ == '__main__':
+    main()
@@ -23,6 +23,9 @@ import json
 import os
 from datetime import datetime
 
+RESULT_METRICS = ('Total Energy (kWh)', 'Total Energy (therms)', 'Peak Demand (kW)', 'Annual Cost ($)',
+                  'GHG (tCO2e)')
+
 
 def prompt(label, default=None):
     """Prompt user for input with optional default."""
@@ -129,8 +132,21 @@ def collect_tasks(defaults=None):
     return {'tasks': tasks}
 
 
-def generate_report(bg, team_info, design, task_info):
-    """Generate formatted M&V plan report."""
+def results_row(metric, baseline=None, post=None):
+    """One line of the M&V results template; blanks when the values are not known yet."""
+    if baseline is None or post is None:
+        return f"  {metric:<35} {'___':<12} {'___':<12} {'___':<12} {'___':<8}"
+    savings = baseline - post
+    pct = f"{savings / baseline * 100:.1f}" if baseline else '___'
+    return f"  {metric:<35} {baseline:<12,.1f} {post:<12,.1f} {savings:<12,.1f} {pct:<8}"
+
+
+def generate_report(bg, team_info, design, task_info, results=None):
+    """Generate formatted M&V plan report.
+
+    results: optional {metric: (baseline, post)} for the results template
+    (see RESULT_METRICS); missing metrics are left blank.
+    """
     lines = []
     lines.append("=" * 70)
     lines.append(f"  M&V PLAN — {bg['site_name']}")
@@ -178,8 +194,9 @@ def generate_report(bg, team_info, design, task_info):
     lines.append("-" * 40)
     lines.append(f"  {'Metric':<35} {'Baseline':<12} {'Post':<12} {'Savings':<12} {'%':<8}")
     lines.append("  " + "-" * 67)
-    for metric in ['Total Energy (kWh)', 'Total Energy (therms)', 'Peak Demand (kW)', 'Annual Cost ($)', 'GHG (tCO2e)']:
-        lines.append(f"  {metric:<35} {'___':<12} {'___':<12} {'___':<12} {'___':<8}")
+    results = results or {}
+    for metric in RESULT_METRICS:
+        lines.append(results_row(metric, *results.get(metric, (None, None))))
     lines.append(f"\n  Precision: ___% at ___% confidence")
 
     return '\n'.join(lines)
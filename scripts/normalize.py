@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Weather-Normalized Savings (Option C, normalized conditions)
+
+Baseline and reporting TOWT models are both driven by the same long-term
+or TMY hourly weather file, so savings are stated for a typical year
+rather than for the weather that happened to occur:
+- The weather file is streamed once; each chunk only adds to per
+  time-of-week sums of the temperature basis (one set per knot layout)
+- A TOWT prediction is linear in those sums, so every model's normalized
+  total is s @ beta, with s built from the bin sums and the model's
+  occupancy flags by one matrix product: all sites on the station share
+  the weather pass, whatever their number
+- Uncertainty of the normalized totals is the exact parameter variance
+  s' Cov s, inflated for lag-1 residual autocorrelation; baseline and
+  reporting models are independent, so the two combine in quadrature
+- Fitted models are cached in a model store file (see model_store.py)
+  and reused while the training data fingerprints still match
+
+Usage:
+    python normalize.py
+    python normalize.py --weather tmy3_station.csv --weather-column oat_f
+    python normalize.py --y total_kw,cooling_kw,fan_kw --refit
+"""
+import argparse
+import os
+
+import numpy as np
+
+from calendar_features import MINUTES_PER_WEEK
+from interval_data import BASELINE_HOURLY, REPORTING_HOURLY, column, iter_interval_csv, read_interval_csv
+from interval_qc import interval_minutes
+from model_store import find, fingerprint, get_model, open_store, save_models
+from regression import t_quantile
+from savings import lag1_autocorrelation
+from towt import _tow, fit_towt, temperature_basis
+
+DEFAULT_CACHE = 'normalized_models.cmvp'
+HOURS_PER_YEAR = 8760
+
+
+def weather_sums(chunks, step, knot_sets, weather_column='oat_f'):
+    """Stream weather chunks into per time-of-week sums.
+
+    Returns {'step', 'hours', 'counts' (n_bins,), 'basis': {knots: (n_bins, K)}},
+    the sufficient statistics of any TOWT prediction over the stream.
+    """
+    n_bins = MINUTES_PER_WEEK // step
+    knot_sets = {tuple(k) for k in knot_sets}
+    counts = np.zeros(n_bins)
+    basis = {k: np.zeros((n_bins, len(k) + 1)) for k in knot_sets}
+    rows = 0
+    for chunk in chunks:
+        oat = column(chunk, weather_column)
+        ok = ~np.isnan(oat)
+        tow = _tow(chunk['timestamps'][ok], step)
+        oat = oat[ok]
+        rows += int(ok.sum())
+        counts += np.bincount(tow, minlength=n_bins)
+        for k, total in basis.items():
+            B = temperature_basis(oat, k)
+            for j in range(B.shape[1]):
+                total[:, j] += np.bincount(tow, B[:, j], minlength=n_bins)
+    return {'step': step, 'hours': rows * step / 60, 'counts': counts, 'basis': basis}
+
+
+def design_sums(models, sums):
+    """Column sums of each model's TOWT design over the weather stream, one row per model.
+
+    Models are grouped by knot layout; each group's occupied and unoccupied
+    segment sums are a single (models x bins) @ (bins x K) product.
+    """
+    out = [None] * len(models)
+    groups = {}
+    for i, model in enumerate(models):
+        if model['step'] != sums['step']:
+            raise ValueError('model and weather interval lengths differ')
+        groups.setdefault(tuple(model['knots']), []).append(i)
+    for knots, members in groups.items():
+        B = sums['basis'][knots]
+        occ = np.array([np.asarray(models[i]['occupied'], dtype=float) for i in members])
+        s_occ, s_unocc = occ @ B, (1.0 - occ) @ B
+        for row, i in enumerate(members):
+            occupied = np.asarray(models[i]['occupied'], dtype=bool)
+            if occupied.all() or not occupied.any():
+                out[i] = np.concatenate([sums['counts'], B.sum(axis=0)])
+            else:
+                out[i] = np.concatenate([sums['counts'], s_occ[row], s_unocc[row]])
+    return out
+
+
+def _rho(model):
+    if 'rho' in model:
+        return model['rho']
+    return lag1_autocorrelation(model['fit']['residuals'])
+
+
+def normalized_totals(models, sums):
+    """Normalized annual energy and its standard error for each model.
+
+    Returns {'annual' (m,), 'se' (m,)} in load units x hours (kWh for kW).
+    """
+    scale = sums['step'] / 60 * HOURS_PER_YEAR / sums['hours']
+    S = design_sums(models, sums)
+    annual = np.empty(len(models))
+    se = np.empty(len(models))
+    by_p = {}
+    for i, s in enumerate(S):
+        by_p.setdefault(s.size, []).append(i)
+    for members in by_p.values():
+        s = np.array([S[i] for i in members])
+        beta = np.array([models[i]['fit']['beta'] for i in members])
+        cov = np.array([models[i]['fit']['cov'] for i in members])
+        rho = np.clip([_rho(models[i]) for i in members], 0.0, 0.99)
+        annual[members] = np.einsum('mp,mp->m', s, beta) * scale
+        var = np.einsum('mp,mpq,mq->m', s, cov, s) * (1 + rho) / (1 - rho)
+        se[members] = np.sqrt(var) * scale
+    return {'annual': annual, 'se': se}
+
+
+def normalized_savings(baseline_models, reporting_models, sums, confidence=0.90):
+    """Typical-year savings of paired baseline/reporting models sharing one weather stream."""
+    m = len(baseline_models)
+    both = normalized_totals(list(baseline_models) + list(reporting_models), sums)
+    base, rep = both['annual'][:m], both['annual'][m:]
+    se = np.hypot(both['se'][:m], both['se'][m:])
+    dof = np.minimum([b['fit']['df_resid'] for b in baseline_models],
+                     [r['fit']['df_resid'] for r in reporting_models])
+    t = np.array([t_quantile(confidence, d) for d in dof])
+    savings = base - rep
+    return {
+        'baseline': base,
+        'reporting': rep,
+        'savings': savings,
+        'savings_fraction': np.divide(savings, base, out=np.zeros(m), where=base != 0),
+        'se': se,
+        'uncertainty': t * se,
+        'confidence': confidence,
+        'hours': sums['hours'],
+    }
+
+
+def cached_models(path, datasets, refit=False):
+    """TOWT models for {id: (timestamps, load, oat)}, reused from `path` when fingerprints match.
+
+    Any stale or missing model triggers a refit of all of them and a rewrite of the store.
+    """
+    ids = list(datasets)
+    prints = {i: fingerprint(load, oat) for i, (_, load, oat) in datasets.items()}
+    if not refit and os.path.exists(path):
+        store = open_store(path)
+        models = []
+        for model_id in ids:
+            try:
+                model = get_model(store, find(store, model_id))
+            except KeyError:
+                break
+            if model['fingerprint'] != prints[model_id].ljust(16, b'\0'):
+                break
+            models.append(model)
+        else:
+            return dict(zip(ids, models)), True
+    models = []
+    for model_id in ids:
+        ts, load, oat = datasets[model_id]
+        model = fit_towt(ts, load, oat, step=interval_minutes(ts))
+        model['fingerprint'] = prints[model_id]
+        models.append(model)
+    save_models(path, models, ids)
+    return dict(zip(ids, models)), False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Weather-normalized savings')
+    parser.add_argument('--baseline', type=str, default=BASELINE_HOURLY, help='Baseline hourly CSV')
+    parser.add_argument('--reporting', type=str, default=REPORTING_HOURLY, help='Reporting hourly CSV')
+    parser.add_argument('--weather', type=str, action='append', default=None,
+                        help='Long-term or TMY hourly weather CSV (repeatable; default: the baseline'
+                             ' and reporting years)')
+    parser.add_argument('--weather-column', type=str, default='oat_f', help='Temperature column (default: oat_f)')
+    parser.add_argument('--y', type=str, default='total_kw,cooling_kw,fan_kw,lighting_kw,plug_kw',
+                        help='Comma-separated load columns, one site/meter each')
+    parser.add_argument('--cache', type=str, default=DEFAULT_CACHE, help=f'Model cache (default: {DEFAULT_CACHE})')
+    parser.add_argument('--refit', action='store_true', help='Ignore the cache and refit every model')
+    parser.add_argument('--confidence', type=int, default=90, help='Confidence level %% (default: 90)')
+    args = parser.parse_args()
+
+    meters = args.y.split(',')
+    datasets = {}
+    for period, path in (('baseline', args.baseline), ('reporting', args.reporting)):
+        data = read_interval_csv(path, columns=meters + ['oat_f'])
+        for meter in meters:
+            datasets[f'{period}/{meter}'] = (data['timestamps'], column(data, meter), column(data, 'oat_f'))
+    models, reused = cached_models(args.cache, datasets, args.refit)
+    base = [models[f'baseline/{m}'] for m in meters]
+    rep = [models[f'reporting/{m}'] for m in meters]
+
+    weather = args.weather or [args.baseline, args.reporting]
+    step = base[0]['step']
+    chunks = (chunk for path in weather for chunk in iter_interval_csv(path, columns=[args.weather_column]))
+    sums = weather_sums(chunks, step, [m['knots'] for m in base + rep], args.weather_column)
+    result = normalized_savings(base, rep, sums, args.confidence / 100)
+
+    print("=" * 78)
+    print("WEATHER-NORMALIZED SAVINGS")
+    print("=" * 78)
+    print(f"  Weather:  {', '.join(os.path.basename(w) for w in weather)}"
+          f"  ({sums['hours']:,.0f} h = {sums['hours'] / HOURS_PER_YEAR:.2f} normal years)")
+    print(f"  Models:   {len(models)} TOWT, {'reused from' if reused else 'fitted and cached in'} {args.cache}")
+    print()
+    print(f"  {'Meter':<14} {'Baseline kWh':>13} {'Reporting kWh':>14} {'Savings':>10} {'%':>6}"
+          f" {'+/- ' + str(args.confidence) + '%':>10}")
+    print("  " + "-" * 72)
+    for i, meter in enumerate(meters):
+        print(f"  {meter:<14} {result['baseline'][i]:>13,.0f} {result['reporting'][i]:>14,.0f}"
+              f" {result['savings'][i]:>10,.0f} {result['savings_fraction'][i] * 100:>6.1f}"
+              f" {result['uncertainty'][i]:>10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Non-Routine Adjustments (NRA)
+
+Quantifies a non-routine event from the affected end-use or sub-meter
+and feeds it into the avoided-energy savings:
+1. Regress the column's per-day rate on an intercept, optional drivers
+   (e.g. avg_oat_f) and a step regressor = share of each period after the
+   event onset (partial first month included)
+2. Step size, its standard error and the per-period adjustment
+   (step x affected days) come out of the same fit
+3. Adjustments are added to the adjusted baseline; their uncertainty is
+   combined in quadrature with the model's savings uncertainty
+
+Events are fitted as one batch — each event has its own small design,
+stacked into (m, p, p) normal equations and solved together — so many
+NRAs per site and many sites per run cost one vectorized pass and never
+touch the baseline model fit.
+
+Usage:
+    python nra.py
+    python nra.py --nra datacenter_kwh:8 --nra plug_kwh:8:15
+    python nra.py --drivers avg_oat_f --nra cooling_kwh:8
+"""
+import argparse
+
+import numpy as np
+
+from interval_data import BASELINE_MONTHLY, REPORTING_MONTHLY, REPORTING_NO_NRA_MONTHLY, read_monthly_csv
+from regression import t_quantile
+from savings import MONTHS, avoided_energy, fit_baseline_models
+
+
+def onset_position(period, day=1, days=None):
+    """Event onset in period units: period 8 (1-based), day 1 -> 7.0.
+
+    With `days` (length of each period) a mid-period start becomes a
+    fraction, e.g. Aug 16 of a 31-day August -> 7.48.
+    """
+    offset = 0.0
+    if day != 1:
+        if days is None:
+            raise ValueError('a mid-period onset needs the days of each period')
+        offset = (day - 1) / float(np.asarray(days)[period - 1])
+    return period - 1 + offset
+
+
+def affected_fraction(n, onset):
+    """(n, m) share of each period at or after each onset."""
+    onset = np.atleast_1d(np.asarray(onset, dtype=float))
+    return np.clip(np.arange(1, n + 1)[:, None] - onset[None, :], 0.0, 1.0)
+
+
+def quantify_nras(values, onset, exposure=None, drivers=None, confidence=0.90):
+    """Step-change estimates for one or many events.
+
+    values: (n,) or (n, m) affected-column totals per period, one column per
+    event (columns may repeat for several events on one meter).
+    onset: scalar or (m,) onset positions (see onset_position).
+    exposure: (n,) or (n, m) period lengths, e.g. billing days; the fit is on
+    values / exposure, weighted by exposure. Default 1 (values are rates).
+    drivers: optional (n, q) shared or (m, n, q) per-event regressors.
+
+    Returns step, se, t, dof, r_squared, adjustments (n, m) in the units of
+    `values`, total, total_se and uncertainty (at `confidence`) per event.
+    """
+    y = np.asarray(values, dtype=float)
+    single = y.ndim == 1
+    Y = y[:, None] if single else y
+    n, m = Y.shape
+    onset = np.broadcast_to(np.asarray(onset, dtype=float), (m,))
+    E = np.ones((n, m)) if exposure is None else np.asarray(exposure, dtype=float)
+    E = np.broadcast_to(E[:, None] if E.ndim == 1 else E, (n, m))
+    frac = affected_fraction(n, onset)                              # (n, m)
+    if np.any(frac.sum(axis=0) == 0) or np.any(frac.sum(axis=0) == n):
+        raise ValueError('every event needs periods both before and after its onset')
+
+    # Per-event design (m, n, p): intercept, drivers, step
+    parts = [np.ones((m, n, 1))]
+    if drivers is not None:
+        D = np.asarray(drivers, dtype=float)
+        D = D[:, None] if D.ndim == 1 else D
+        parts.append(np.broadcast_to(D, (m,) + D.shape[-2:]))
+    parts.append(frac.T[:, :, None])
+    X = np.concatenate(parts, axis=2)
+    p = X.shape[2]
+
+    rate = (Y / E).T                                               # (m, n)
+    w = (E / E.mean(axis=0)).T                                     # mean-1 weights, as billing_weights
+    G = np.einsum('mni,mn,mnj->mij', X, w, X, optimize=True)
+    G_inv = np.linalg.inv(G)
+    beta = np.einsum('mij,mnj,mn->mi', G_inv, X, w * rate, optimize=True)
+    resid = rate - np.einsum('mni,mi->mn', X, beta)
+    dof = n - p
+    mse = (w * resid ** 2).sum(axis=1) / dof
+    mean = (w * rate).sum(axis=1) / w.sum(axis=1)
+    ss_tot = (w * (rate - mean[:, None]) ** 2).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r_squared = np.where(ss_tot > 0, 1 - mse * dof / ss_tot, 0.0)
+
+    step = beta[:, -1]
+    se = np.sqrt(mse * G_inv[:, -1, -1])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(se > 0, step / se, np.inf)
+    exposure_after = (frac * E).sum(axis=0)
+    total_se = se * exposure_after
+    result = {
+        'step': step, 'se': se, 't': t, 'dof': dof, 'r_squared': r_squared,
+        'onset': onset, 'beta': beta,
+        'adjustments': step * frac * E,
+        'total': step * exposure_after,
+        'total_se': total_se,
+        'uncertainty': t_quantile(confidence, dof) * total_se,
+        'confidence': confidence,
+    }
+    if single:
+        result['adjustments'] = result['adjustments'][:, 0]
+        result['beta'] = result['beta'][0]
+        for key in ('step', 'se', 't', 'r_squared', 'onset', 'total', 'total_se', 'uncertainty'):
+            result[key] = float(np.asarray(result[key])[0])
+    return result
+
+
+def site_adjustments(result, sites, n_sites=None):
+    """Sum event adjustments per site; uncertainties combine in quadrature.
+
+    sites: (m,) site index of each event. Returns {'adjustments' (n, s),
+    'total' (s,), 'uncertainty' (s,)} ready for avoided_energy.
+    """
+    sites = np.asarray(sites, dtype=np.int64)
+    if n_sites is None:
+        n_sites = int(sites.max()) + 1
+    adj = np.atleast_2d(result['adjustments'].T).T
+    per_site = np.zeros((adj.shape[0], n_sites))
+    np.add.at(per_site.T, sites, adj.T)
+    var = np.bincount(sites, np.atleast_1d(result['uncertainty']) ** 2, minlength=n_sites)
+    return {
+        'adjustments': per_site,
+        'total': per_site.sum(axis=0),
+        'uncertainty': np.sqrt(var),
+    }
+
+
+def _parse_event(spec, days):
+    """'column:month[:day]' -> (column, onset position)."""
+    fields = spec.split(':')
+    if len(fields) not in (2, 3):
+        raise ValueError(f"NRA spec must be column:month[:day], got {spec!r}")
+    day = int(fields[2]) if len(fields) == 3 else 1
+    return fields[0], onset_position(int(fields[1]), day, days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Non-Routine Adjustment quantification')
+    parser.add_argument('--baseline', type=str, default=BASELINE_MONTHLY, help='Baseline monthly CSV')
+    parser.add_argument('--reporting', type=str, default=REPORTING_MONTHLY, help='Reporting monthly CSV')
+    parser.add_argument('--answer-key', type=str, default=REPORTING_NO_NRA_MONTHLY,
+                        help='Reporting CSV without the event, for comparison')
+    parser.add_argument('--nra', action='append', default=None,
+                        help='Event as column:month[:day], repeatable (default: datacenter_kwh:8)')
+    parser.add_argument('--drivers', type=str, default=None, help='Comma-separated driver columns')
+    parser.add_argument('--confidence', type=int, default=90, help='Confidence level %% (default: 90)')
+    args = parser.parse_args()
+
+    base = read_monthly_csv(args.baseline)
+    rep = read_monthly_csv(args.reporting)
+    days = rep['days']
+    events = [_parse_event(s, days) for s in (args.nra or ['datacenter_kwh:8'])]
+    conf = args.confidence / 100
+    drivers = None
+    if args.drivers:
+        drivers = np.column_stack([rep[c] for c in args.drivers.split(',')])
+
+    values = np.column_stack([rep[col] for col, _ in events])
+    nras = quantify_nras(values, [pos for _, pos in events], exposure=days, drivers=drivers,
+                         confidence=conf)
+    site = site_adjustments(nras, np.zeros(len(events), dtype=int))
+
+    elec, _ = fit_baseline_models(base)
+    plain = avoided_energy(elec, rep['avg_oat_f'], rep['total_kwh'], days, confidence=conf)
+    adjusted = avoided_energy(elec, rep['avg_oat_f'], rep['total_kwh'], days,
+                              adjustments=site['adjustments'][:, 0],
+                              adjustment_uncertainty=float(site['uncertainty'][0]), confidence=conf)
+
+    print("=" * 70)
+    print("NON-ROUTINE ADJUSTMENTS")
+    print("=" * 70)
+    print(f"  {'Column':<16} {'Onset':<8} {'Step/day':>10} {'SE':>8} {'Total':>10} {'+/-':>8}")
+    print("  " + "-" * 64)
+    for j, (col, pos) in enumerate(events):
+        onset = f"{MONTHS[int(pos)]} {int(round((pos % 1) * days[int(pos)])) + 1}"
+        print(f"  {col:<16} {onset:<8} {nras['step'][j]:>10,.1f} {nras['se'][j]:>8,.1f}"
+              f" {nras['total'][j]:>10,.0f} {nras['uncertainty'][j]:>8,.0f}")
+    print()
+    print(f"  {'Month':<6} {'Pred kWh':>10} {'NRA':>9} {'Adj. base':>10} {'Actual':>10} {'Savings':>9}")
+    print("  " + "-" * 58)
+    for i in range(len(days)):
+        print(f"  {MONTHS[int(rep['month'][i]) - 1]:<6} {plain['adjusted_baseline'][i]:>10,.0f}"
+              f" {site['adjustments'][i, 0]:>9,.0f} {adjusted['adjusted_baseline'][i]:>10,.0f}"
+              f" {adjusted['actual'][i]:>10,.0f} {adjusted['savings'][i]:>9,.0f}")
+    print()
+    print(f"  Savings without NRA: {plain['total_savings']:>10,.0f} kWh")
+    print(f"  Savings with NRA:    {adjusted['total_savings']:>10,.0f} kWh"
+          f"  +/- {adjusted['uncertainty']:,.0f} at {args.confidence}%")
+    if args.answer_key:
+        key = read_monthly_csv(args.answer_key)
+        truth = avoided_energy(elec, key['avg_oat_f'], key['total_kwh'], key['days'], confidence=conf)
+        print(f"  Answer key (no event): {truth['total_savings']:>8,.0f} kWh")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Portfolio Meter Matrix
+
+All meters of a portfolio on one shared time axis, as a memory-mapped
+(meters x intervals) matrix in a directory:
+
+    meta.json     time axis (start, step, length) and dtype
+    values.bin    one row per meter, appended in arrival order
+    valid.bin     validity bitmap, one packed bit per cell (np.packbits)
+    ids.bin       fixed-width meter ids (S32), in row order
+    index.bin     ids sorted, with their row numbers (binary-search lookup)
+
+- Opening maps the files; nothing is parsed beyond meta.json, so the cost
+  does not grow with the number of meters
+- A meter's row, or a date range across all meters, is a view into the
+  map (no copy); portfolio roll-ups are numpy reductions over blocks of
+  rows, so memory stays flat as the portfolio grows
+- Adding meters appends to values/valid/ids; only the small sorted index
+  is rewritten, never the matrix
+
+Usage:
+    python portfolio.py --create /tmp/pm --append ../public/data/greenfield_baseline_hourly.csv
+    python portfolio.py --create /tmp/pm --from-synthetic /tmp/portfolio
+    python portfolio.py --open /tmp/pm --meter b00042
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from interval_data import column, read_interval_csv
+
+ID_DTYPE = np.dtype('S32')
+INDEX_DTYPE = np.dtype([('id', 'S32'), ('row', '<i8')])
+FILES = ('values.bin', 'valid.bin', 'ids.bin', 'index.bin')
+ROW_BLOCK = 256
+
+
+def create_matrix(path, start, step, n_time, dtype='float32'):
+    """New empty matrix directory; start is the first interval-ending timestamp."""
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        raise ValueError(f'{path} already holds a meter matrix')
+    meta = {'start': str(np.datetime64(start, 'm')), 'step': int(step), 'n_time': int(n_time),
+            'dtype': np.dtype(dtype).str}
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    for name in FILES:
+        open(os.path.join(path, name), 'wb').close()
+    return open_matrix(path)
+
+
+def _map(path, dtype, shape):
+    if shape[0] == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+
+def _write_index(path, ids):
+    """Rewrite index.bin from ids in row order (sorted, replaced atomically)."""
+    index = np.empty(len(ids), dtype=INDEX_DTYPE)
+    index['id'] = ids
+    index['row'] = np.arange(len(ids))
+    index = index[np.argsort(index['id'], kind='stable')]
+    tmp = os.path.join(path, 'index.bin.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(index.tobytes())
+    os.replace(tmp, os.path.join(path, 'index.bin'))
+
+
+def open_matrix(path):
+    """Map a matrix directory: {'values' (m, T), 'valid' (m, T/8 packed), 'ids', 'index', ...}.
+
+    The meter count comes from the ids file size (ids are written last on
+    append, so a half-finished append is never visible). An index that
+    does not cover every id (a crash between the ids and the index write)
+    is rebuilt from ids.bin.
+    """
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    dtype = np.dtype(meta['dtype'])
+    n_time = meta['n_time']
+    n_bytes = (n_time + 7) // 8
+    m = os.path.getsize(os.path.join(path, 'ids.bin')) // ID_DTYPE.itemsize
+    n_index = os.path.getsize(os.path.join(path, 'index.bin')) // INDEX_DTYPE.itemsize
+    if n_index != m:
+        _write_index(path, _map(os.path.join(path, 'ids.bin'), ID_DTYPE, (m,)))
+    return {
+        'path': path,
+        'start': np.datetime64(meta['start'], 'm'),
+        'step': meta['step'],
+        'n_time': n_time,
+        'n_meters': m,
+        'values': _map(os.path.join(path, 'values.bin'), dtype, (m, n_time)),
+        'valid': _map(os.path.join(path, 'valid.bin'), np.uint8, (m, n_bytes)),
+        'ids': _map(os.path.join(path, 'ids.bin'), ID_DTYPE, (m,)),
+        'index': _map(os.path.join(path, 'index.bin'), INDEX_DTYPE, (m,)),
+    }
+
+
+def timestamps(matrix):
+    """Interval-ending timestamps of the shared time axis."""
+    return matrix['start'] + np.arange(matrix['n_time']) * np.timedelta64(matrix['step'], 'm')
+
+
+def time_slice(matrix, start=None, end=None):
+    """Column slice for [start, end); matrix['values'][:, s] is a view."""
+    def pos(t):
+        minutes = (np.datetime64(t, 'm') - matrix['start']).astype(np.int64)
+        return int(np.clip(-(-minutes // matrix['step']), 0, matrix['n_time']))
+    return slice(0 if start is None else pos(start), matrix['n_time'] if end is None else pos(end))
+
+
+def find_meter(matrix, meter_id):
+    """Row of a meter id (binary search over the sorted index)."""
+    key = str(meter_id).encode()
+    index = matrix['index']
+    i = int(np.searchsorted(index['id'], key))
+    if i == len(index) or index['id'][i] != key:
+        raise KeyError(meter_id)
+    return int(index['row'][i])
+
+
+def meter_row(matrix, meter_id, start=None, end=None):
+    """(values, valid) of one meter: values is a view, valid is unpacked for the slice."""
+    i = find_meter(matrix, meter_id)
+    s = time_slice(matrix, start, end)
+    return matrix['values'][i, s], valid_mask(matrix, [i], s)[0]
+
+
+def valid_mask(matrix, rows=None, cols=slice(None)):
+    """Unpacked boolean validity for the given rows and column slice."""
+    packed = matrix['valid'] if rows is None else matrix['valid'][np.asarray(rows)]
+    bits = np.unpackbits(packed, axis=1, count=matrix['n_time'], bitorder='little').astype(bool)
+    return bits[:, cols]
+
+
+def align(matrix, ts, values, out=None):
+    """Place readings on the matrix time axis: (k, T) values (NaN where missing).
+
+    out: an existing (k, T) array to fill in place, e.g. chunk by chunk.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[:, None] if values.ndim == 1 else values
+    if out is None:
+        out = np.full((values.shape[1], matrix['n_time']), np.nan)
+    offset = (ts - matrix['start']).astype('timedelta64[m]').astype(np.int64)
+    pos = offset // matrix['step']
+    ok = (offset % matrix['step'] == 0) & (pos >= 0) & (pos < matrix['n_time'])
+    out[:, pos[ok]] = values[ok].T
+    return out
+
+
+def append_meters(path, ids, values):
+    """Append meters (k, T) to the matrix; NaN cells are stored as invalid.
+
+    Data rows are appended to values/valid and the ids last; only the sorted
+    index is rewritten. Rows left past the last id by an interrupted append
+    are dropped first, and a stale index is rebuilt on open. Raises on
+    duplicate ids.
+    """
+    matrix = open_matrix(path)
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    if values.shape[1] != matrix['n_time']:
+        raise ValueError(f"rows must have {matrix['n_time']} intervals (see align)")
+    encoded = [str(i).encode() for i in ids]
+    if any(len(i) > ID_DTYPE.itemsize for i in encoded):
+        raise ValueError(f'meter ids are limited to {ID_DTYPE.itemsize} bytes')
+    new_ids = np.array(encoded, dtype=ID_DTYPE)
+    if len(new_ids) != len(values):
+        raise ValueError('need one id per row')
+    existing = np.asarray(matrix['index']['id'])
+    if np.isin(new_ids, existing).any() or len(np.unique(new_ids)) != len(new_ids):
+        raise ValueError('duplicate meter id')
+
+    dtype = matrix['values'].dtype
+    row_bytes = {'values.bin': matrix['n_time'] * dtype.itemsize, 'valid.bin': matrix['valid'].shape[1],
+                 'ids.bin': ID_DTYPE.itemsize}
+    for name, size in row_bytes.items():
+        file = os.path.join(path, name)
+        if os.path.getsize(file) > matrix['n_meters'] * size:
+            os.truncate(file, matrix['n_meters'] * size)
+    valid = ~np.isnan(values)
+    with open(os.path.join(path, 'values.bin'), 'ab') as f:
+        f.write(values.astype(dtype).tobytes())
+    with open(os.path.join(path, 'valid.bin'), 'ab') as f:
+        f.write(np.packbits(valid, axis=1, bitorder='little').tobytes())
+    with open(os.path.join(path, 'ids.bin'), 'ab') as f:
+        f.write(new_ids.tobytes())
+
+    _write_index(path, np.concatenate([np.asarray(matrix['ids']), new_ids]))
+    return open_matrix(path)
+
+
+def append_csv(path, csv_path, column_name='total_kw', meter_id=None):
+    """Append one column of an interval CSV (or store) as a meter (id: file stem)."""
+    matrix = open_matrix(path)
+    data = read_interval_csv(csv_path, columns=[column_name])
+    row = align(matrix, data['timestamps'], column(data, column_name))
+    meter_id = meter_id or os.path.splitext(os.path.basename(csv_path))[0]
+    return append_meters(path, [meter_id], row)
+
+
+def append_synthetic(path, prefix, column_name='total_kw', batch=256):
+    """Append every building of a synthetic.py portfolio (baseline + reporting years) as a meter."""
+    with open(f'{prefix}_meta.json') as f:
+        meta = json.load(f)
+    j = meta['columns'].index(column_name)
+    base = np.load(f'{prefix}_baseline.npy', mmap_mode='r')
+    rep = np.load(f'{prefix}_reporting.npy', mmap_mode='r')
+    matrix = open_matrix(path)
+    hours = meta['hours']
+    first = (np.datetime64(meta['baseline_start'], 'm') - matrix['start']).astype(np.int64) // matrix['step']
+    second = (np.datetime64(meta['reporting_start'], 'm') - matrix['start']).astype(np.int64) // matrix['step']
+    for b0 in range(0, meta['n_buildings'], batch):
+        b1 = min(b0 + batch, meta['n_buildings'])
+        rows = np.full((b1 - b0, matrix['n_time']), np.nan)
+        for pos, block in ((first, base), (second, rep)):
+            lo, hi = max(pos, 0), min(pos + hours, matrix['n_time'])
+            if hi > lo:
+                rows[:, lo:hi] = block[b0:b1, lo - pos:hi - pos, j]
+        append_meters(path, [f'b{b:05d}' for b in range(b0, b1)], rows)
+    return open_matrix(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Portfolio meter matrix')
+    parser.add_argument('--create', type=str, default=None, help='Create a matrix directory')
+    parser.add_argument('--open', type=str, default=None, help='Open an existing matrix directory')
+    parser.add_argument('--start', type=str, default='2024-01-01T01:00', help='First timestamp (--create)')
+    parser.add_argument('--hours', type=int, default=17544, help='Intervals on the time axis (--create; default: 2024-2025)')
+    parser.add_argument('--step', type=int, default=60, help='Interval minutes (--create)')
+    parser.add_argument('--append', type=str, action='append', default=None, help='Interval CSV to append')
+    parser.add_argument('--column', type=str, default='total_kw', help='Column appended (default: total_kw)')
+    parser.add_argument('--from-synthetic', type=str, default=None, help='synthetic.py output prefix to append')
+    parser.add_argument('--meter', type=str, default=None, help='Meter id to look up')
+    args = parser.parse_args()
+
+    if args.create:
+        path = args.create
+        create_matrix(path, args.start, args.step, args.hours)
+    elif args.open:
+        path = args.open
+    else:
+        parser.error('use --create or --open')
+    t0 = time.perf_counter()
+    for csv_path in args.append or []:
+        append_csv(path, csv_path, args.column)
+    if args.from_synthetic:
+        append_synthetic(path, args.from_synthetic, args.column)
+    t_append = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    matrix = open_matrix(path)
+    t_open = time.perf_counter() - t0
+    print("=" * 60)
+    print("PORTFOLIO METER MATRIX")
+    print("=" * 60)
+    print(f"  Directory: {path}")
+    print(f"  Meters:    {matrix['n_meters']:,} x {matrix['n_time']:,} intervals"
+          f" ({matrix['step']} min from {matrix['start']})")
+    print(f"  Open:      {t_open * 1000:.2f} ms" + (f", append {t_append:.2f} s" if t_append > 0.001 else ''))
+    if matrix['n_meters'] == 0:
+        return
+    ts = timestamps(matrix)
+    months = (ts - np.timedelta64(matrix['step'], 'm')).astype('datetime64[M]')
+    starts = np.concatenate([[0], np.flatnonzero(months[1:] != months[:-1]) + 1])
+    t0 = time.perf_counter()
+    monthly = np.zeros(len(starts))
+    for r0 in range(0, matrix['n_meters'], ROW_BLOCK):
+        values = np.nan_to_num(np.asarray(matrix['values'][r0:r0 + ROW_BLOCK], dtype=float))
+        monthly += np.add.reduceat(values, starts, axis=1).sum(axis=0)
+    monthly *= matrix['step'] / 60
+    t_roll = time.perf_counter() - t0
+    n_valid = sum(int(valid_mask(matrix, np.arange(r0, min(r0 + ROW_BLOCK, matrix['n_meters']))).sum())
+                  for r0 in range(0, matrix['n_meters'], ROW_BLOCK))
+    coverage = n_valid / (matrix['n_meters'] * matrix['n_time'])
+    print(f"  Valid:     {coverage * 100:.1f}% of cells")
+    print(f"  Roll-up:   portfolio monthly kWh in {t_roll * 1000:.1f} ms")
+    print()
+    for label, kwh in zip(months[starts], monthly):
+        if kwh:
+            print(f"    {str(label):<8} {kwh:>16,.0f} kWh")
+    if args.meter:
+        row, ok = meter_row(matrix, args.meter)
+        print()
+        print(f"  {args.meter}: row {find_meter(matrix, args.meter)}, {int(ok.sum()):,} valid intervals,"
+              f" {np.nansum(row) * matrix['step'] / 60:,.0f} kWh, view={row.base is not None}")
+
+
+if __name__ == '__main__':
+    main()
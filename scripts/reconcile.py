@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+End-Use Reconciliation
+
+Checks that the whole-building meter agrees with its sub-meters:
+
+    residual = total_kw - sum(sub-meters)      (the unmetered load)
+
+- The residual, its trailing rolling mean and standard deviation, and the
+  tolerance tests run over every timestamp as whole-array operations; the
+  sub-meter sum is a single (rows x meters) @ ones product, so hundreds
+  of sub-meters cost about as much as five
+- Interval flags (bit flags, as in interval_qc): missing readings,
+  sub-meters exceeding the total, unmetered share above tolerance, and
+  sudden residual shifts against the rolling statistics
+- Monthly summaries: metered and unmetered energy, flag counts, and the
+  sub-meter whose readings track the residual most closely (the usual
+  suspect when a meter drops out or drifts)
+
+Usage:
+    python reconcile.py
+    python reconcile.py --file ../public/data/greenfield_reporting_hourly.csv
+    python reconcile.py --rel-tol 0.05 --abs-tol 1 --window-hours 168
+"""
+import argparse
+
+import numpy as np
+
+from interval_data import BASELINE_HOURLY, read_interval_csv
+from interval_qc import interval_minutes, interval_months
+
+FLAG_MISSING = 1
+FLAG_OVER_TOTAL = 2
+FLAG_TOLERANCE = 4
+FLAG_SHIFT = 8
+FLAG_NAMES = {
+    FLAG_MISSING: 'missing',
+    FLAG_OVER_TOTAL: 'over_total',
+    FLAG_TOLERANCE: 'tolerance',
+    FLAG_SHIFT: 'shift',
+}
+
+
+def _group_sums(idx, n_groups, values):
+    """Per-group column sums of an (n, k) array with one bincount."""
+    n, k = values.shape
+    flat = (idx[:, None] * k + np.arange(k)).ravel()
+    return np.bincount(flat, values.ravel(), minlength=n_groups * k).reshape(n_groups, k)
+
+
+def trailing_stats(x, window):
+    """Mean and standard deviation of the previous `window` valid values (NaN until available)."""
+    ok = ~np.isnan(x)
+    xz = np.where(ok, x, 0.0)
+    stacked = np.column_stack([ok.astype(float), xz, xz * xz])
+    c = np.concatenate([np.zeros((1, 3)), np.cumsum(stacked, axis=0)])
+    rows = np.arange(len(x))
+    n, s, ss = (c[rows] - c[np.maximum(rows - window, 0)]).T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = s / n
+        sd = np.sqrt(np.maximum(ss - s * mean, 0.0) / (n - 1))
+    short = n < 2
+    return np.where(short, np.nan, mean), np.where(short, np.nan, sd)
+
+
+def reconcile(data, total='total_kw', submeters=None, rel_tol=0.10, abs_tol=2.0,
+              window_hours=24, shift_k=6.0):
+    """Residual, rolling statistics, interval flags and monthly summaries.
+
+    submeters: column names summed against `total` (default: every other
+    *_kw column). An interval passes tolerance when
+    |residual| <= abs_tol + rel_tol * total; it is over_total when the
+    sub-meters exceed the total by more than that. A shift is a residual
+    more than shift_k rolling standard deviations from the trailing mean.
+    """
+    ts = data['timestamps']
+    columns = data['columns']
+    if submeters is None:
+        submeters = [c for c in columns if c.endswith('_kw') and c != total]
+    step = interval_minutes(ts)
+    y = data['values'][:, columns.index(total)]
+    subs = data['values'][:, [columns.index(c) for c in submeters]]
+
+    missing_sub = np.isnan(subs)
+    metered = np.where(missing_sub, 0.0, subs) @ np.ones(len(submeters))
+    missing = np.isnan(y) | missing_sub.any(axis=1)
+    residual = np.where(missing, np.nan, y - metered)
+
+    window = max(2, int(round(window_hours * 60 / step)))
+    roll_mean, roll_sd = trailing_stats(residual, window)
+    tol = abs_tol + rel_tol * np.abs(np.nan_to_num(y))
+    flags = np.zeros(len(ts), dtype=np.uint8)
+    flags[missing] |= FLAG_MISSING
+    with np.errstate(invalid='ignore'):
+        flags[residual < -tol] |= FLAG_OVER_TOTAL
+        flags[np.abs(residual) > tol] |= FLAG_TOLERANCE
+        flags[np.abs(residual - roll_mean) > shift_k * np.maximum(roll_sd, 1e-6 * tol)] |= FLAG_SHIFT
+
+    # Monthly summaries: one bincount pass per quantity
+    months = interval_months(ts, step)
+    periods, idx = np.unique(months, return_inverse=True)
+    p = len(periods)
+    hours = step / 60
+    ok = ~missing
+    r = np.where(ok, residual, 0.0)
+    counts = np.bincount(idx[ok], minlength=p)
+    flag_counts = {name: np.bincount(idx[(flags & bit) > 0], minlength=p) for bit, name in FLAG_NAMES.items()}
+    abs_max = np.zeros(p)
+    np.maximum.at(abs_max, idx, np.abs(r))
+
+    # Correlation of each sub-meter with the residual, per month
+    S = np.where(ok[:, None], np.nan_to_num(subs), 0.0)
+    sx, sxx, sxr = (_group_sums(idx, p, a) for a in (S, S * S, S * r[:, None]))
+    sr = np.bincount(idx, r, minlength=p)[:, None]
+    srr = np.bincount(idx, r * r, minlength=p)[:, None]
+    c = counts[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxr - sx * sr / c
+        corr = cov / np.sqrt((sxx - sx ** 2 / c) * (srr - sr ** 2 / c))
+    corr = np.nan_to_num(corr)
+    suspect = np.abs(corr).argmax(axis=1)
+
+    return {
+        'timestamps': ts,
+        'submeters': list(submeters),
+        'residual': residual,
+        'rolling_mean': roll_mean,
+        'rolling_sd': roll_sd,
+        'flags': flags,
+        'periods': periods,
+        'period_total_kwh': np.bincount(idx, np.where(ok, y, 0.0), minlength=p) * hours,
+        'period_unmetered_kwh': sr[:, 0] * hours,
+        'period_max_abs': abs_max,
+        'period_counts': counts,
+        'period_flags': flag_counts,
+        'period_corr': corr,
+        'period_suspect': [submeters[j] for j in suspect],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-use reconciliation')
+    parser.add_argument('--file', type=str, default=BASELINE_HOURLY, help='Interval CSV')
+    parser.add_argument('--total', type=str, default='total_kw', help='Whole-building column (default: total_kw)')
+    parser.add_argument('--submeters', type=str, default=None, help='Comma-separated sub-meter columns')
+    parser.add_argument('--rel-tol', type=float, default=0.10, help='Relative tolerance (default: 0.10)')
+    parser.add_argument('--abs-tol', type=float, default=2.0, help='Absolute tolerance, kW (default: 2)')
+    parser.add_argument('--window-hours', type=float, default=24, help='Rolling window (default: 24 h)')
+    parser.add_argument('--shift-k', type=float, default=6.0, help='Shift threshold in rolling SDs (default: 6)')
+    args = parser.parse_args()
+
+    data = read_interval_csv(args.file)
+    subs = args.submeters.split(',') if args.submeters else None
+    res = reconcile(data, args.total, subs, args.rel_tol, args.abs_tol, args.window_hours, args.shift_k)
+
+    print("=" * 86)
+    print(f"END-USE RECONCILIATION — {args.total} vs {len(res['submeters'])} sub-meters")
+    print("=" * 86)
+    print(f"  Tolerance: {args.abs_tol:g} kW + {args.rel_tol * 100:g}% of total;"
+          f" shift > {args.shift_k:g} SD of the trailing {args.window_hours:g} h")
+    print()
+    print(f"  {'Month':<8} {'Total kWh':>10} {'Unmetered':>10} {'Share':>6} {'Max |r|':>8}"
+          + ''.join(f" {name:>10}" for name in FLAG_NAMES.values()) + "  Suspect")
+    print("  " + "-" * 96)
+    for i, label in enumerate(res['periods']):
+        total = res['period_total_kwh'][i]
+        unmetered = res['period_unmetered_kwh'][i]
+        share = unmetered / total * 100 if total else 0.0
+        flags = ''.join(f" {res['period_flags'][name][i]:>10}" for name in FLAG_NAMES.values())
+        print(f"  {str(label):<8} {total:>10,.0f} {unmetered:>10,.0f} {share:>5.1f}% {res['period_max_abs'][i]:>8.1f}"
+              f"{flags}  {res['period_suspect'][i]}")
+    n_flagged = int(np.count_nonzero(res['flags']))
+    print()
+    print(f"  Flagged intervals: {n_flagged:,} of {len(res['flags']):,}")
+
+
+if __name__ == '__main__':
+    main()
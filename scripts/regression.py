@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""
+Vectorized Regression Engine
+
+The numpy counterpart of least_squares_matrix.py for real interval data:
+- Any number of regressors, and many meters (columns of y) sharing one design
+- Normal equations solved through one Cholesky factor of X'X
+- Optional per-row mask (e.g. from interval_qc) applied as 0/1 weights,
+  so flagged rows are excluded without copying the design
+- Weighted least squares (e.g. unequal billing-period lengths) through
+  the same factorization -- weights cost one extra elementwise multiply
+- Classical, heteroskedasticity-robust (HC0-HC3) and Newey-West HAC
+  covariance, built from p x p "meat" sums -- the n x n hat matrix is
+  never formed, so robust errors cost about as much as the fit
+- Influence diagnostics (leverage, studentized residuals, Cook's D,
+  DFFITS) as row-wise quadratic forms of the Cholesky factor, O(n p^2)
+- Robust IRLS fits (Huber, Tukey bisquare) that shrug off bad interval
+  reads, batched across meters
+- predict(): confidence and prediction intervals for new rows from one
+  triangular solve and a row-wise norm, for every meter at once
+
+Result dicts use the same names as ols_matrix where they overlap
+(ss_res, ss_tot, mse, r_squared, xtx_inv, y_hat, residuals).
+g14_metrics() scores any fit against ASHRAE Guideline 14.
+
+Usage:
+    python regression.py
+    python regression.py --cov-type HAC --maxlags 24
+    python regression.py --influence 10
+    python regression.py --robust bisquare
+"""
+import argparse
+
+import numpy as np
+
+from interval_data import BASELINE_HOURLY, column, read_interval_csv
+
+COV_TYPES = ('classical', 'HC0', 'HC1', 'HC2', 'HC3', 'HAC')
+
+# ASHRAE Guideline 14 calibration limits (percent)
+G14_LIMITS = {
+    'monthly': {'nmbe': 5.0, 'cvrmse': 15.0},
+    'hourly': {'nmbe': 10.0, 'cvrmse': 30.0},
+}
+
+
+def design_matrix(*columns, intercept=True):
+    """Stack regressors into an (n, p) design, intercept column first."""
+    cols = [np.asarray(c, dtype=float) for c in columns]
+    if intercept:
+        cols.insert(0, np.ones(len(cols[0]) if cols else 0))
+    return np.column_stack(cols)
+
+
+def t_quantile(confidence, dof):
+    """Two-sided Student-t critical value, e.g. t_quantile(0.90, 10) = 1.812.
+
+    Exact for 1-2 degrees of freedom, Cornish-Fisher expansion otherwise
+    (within 0.1% for dof >= 3 at 80-95% confidence, 1% at 99%). Works on arrays.
+    """
+    from statistics import NormalDist
+    p = 0.5 + confidence / 2
+    z = NormalDist().inv_cdf(p)
+    v = np.asarray(dof, dtype=float)
+    t = (z + (z ** 3 + z) / (4 * v)
+         + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * v ** 2)
+         + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * v ** 3)
+         + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * v ** 4))
+    t = np.where(v == 1, np.tan(np.pi * (p - 0.5)), t)
+    t = np.where(v == 2, (2 * p - 1) / np.sqrt(2 * p * (1 - p)), t)
+    return float(t) if t.ndim == 0 else t
+
+
+def newey_west_lags(n):
+    """Newey-West (1994) default bandwidth: floor(4 * (n/100)^(2/9))."""
+    return int(np.floor(4 * (n / 100.0) ** (2.0 / 9.0)))
+
+
+def _tri_solve(L, B):
+    """Solve L Z = B for a (batched) p x p factor; p is small, so a general solve is fine."""
+    return np.linalg.solve(L, B)
+
+
+def _gram(X, w):
+    """X'WX: one (p, p) matrix for shared weights, (m, p, p) for per-meter weights."""
+    if w is None:
+        return X.T @ X
+    if w.ndim == 1:
+        return X.T @ (X * w[:, None])
+    return np.einsum('ni,nm,nj->mij', X, w, X, optimize=True)
+
+
+def leverage(X, chol, w=None):
+    """Diagonal of the hat matrix, h_i = w_i ||L^-1 x_i||^2, from the Cholesky factor.
+
+    One triangular solve gives the p x p inverse factor; each row then costs
+    a p-vector product and a squared norm, O(n p^2) in all. With per-meter
+    factors (m, p, p) the result is (n, m).
+    """
+    L_inv = _tri_solve(chol, np.broadcast_to(np.eye(chol.shape[-1]), chol.shape))
+    if chol.ndim == 2:
+        h = ((X @ L_inv.T) ** 2).sum(axis=1)
+        if w is not None:
+            h = h * w if w.ndim == 1 else h[:, None] * w
+        return h
+    h = np.stack([((X @ Li.T) ** 2).sum(axis=1) for Li in L_inv], axis=1)
+    return h if w is None else h * (w if w.ndim == 2 else w[:, None])
+
+
+def influence(fit, X):
+    """Per-point influence diagnostics for a fit_ols result.
+
+    Returns leverage, internally and externally studentized residuals,
+    Cook's distance and DFFITS, shaped like fit['residuals']. Rows excluded
+    by the mask (zero weight) get NaN. Nothing n x n is ever formed.
+    """
+    X = np.asarray(X, dtype=float)
+    resid = fit['residuals']
+    single = resid.ndim == 1
+    e = resid[:, None] if single else resid
+    n, m = e.shape
+    p = fit['p']
+    w = fit.get('weights')
+    wm = np.ones((n, 1)) if w is None else (w if w.ndim == 2 else w[:, None])
+    wm = np.broadcast_to(wm, (n, m))
+
+    h = leverage(X, fit['chol'], w)
+    h = np.broadcast_to(h if h.ndim == 2 else h[:, None], (n, m))
+    mse = np.atleast_1d(fit['mse'])
+    df = np.atleast_1d(fit['df_resid'])
+    used = wm > 0
+    one_minus_h = np.where(used, 1 - h, np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        we = np.sqrt(wm) * e
+        student = we / np.sqrt(mse * one_minus_h)
+        # Leave-one-out variance without refitting: s_(i)^2 = ((n-p)s^2 - e_i^2/(1-h_i)) / (n-p-1)
+        s2_loo = (df * mse - we ** 2 / one_minus_h) / (df - 1)
+        student_ext = we / np.sqrt(s2_loo * one_minus_h)
+        cooks = student ** 2 * h / (p * one_minus_h)
+        dffits = student_ext * np.sqrt(h / one_minus_h)
+
+    out = {
+        'leverage': np.where(used, h, np.nan),
+        'student_resid': student,
+        'student_resid_external': student_ext,
+        'cooks_d': cooks,
+        'dffits': dffits,
+    }
+    if single:
+        out = {k: v[:, 0] for k, v in out.items()}
+    return out
+
+
+def influence_flags(diag, p):
+    """Conventional cut-offs: h > 2p/n, |t| > 3, Cook's D > 4/n, |DFFITS| > 2 sqrt(p/n)."""
+    n = np.sum(~np.isnan(diag['leverage']), axis=0)
+    with np.errstate(invalid='ignore'):
+        return {
+            'high_leverage': diag['leverage'] > 2 * p / n,
+            'outlier': np.abs(diag['student_resid_external']) > 3,
+            'influential': (diag['cooks_d'] > 4 / n) | (np.abs(diag['dffits']) > 2 * np.sqrt(p / n)),
+        }
+
+
+def _box_sum(a, width):
+    """Sums of `width` consecutive rows along axis 0 (length shrinks by width - 1)."""
+    c = np.cumsum(a, axis=0)
+    out = c[width - 1:].copy()
+    out[1:] -= c[:-width]
+    return out
+
+
+def _bartlett_smooth(S, maxlags):
+    """K S for the Bartlett kernel K[t, s] = 1 - |t - s| / (L + 1), |t - s| <= L.
+
+    The triangle kernel is two box filters of width L + 1 convolved, so the
+    smoothing costs two running sums regardless of the bandwidth.
+    """
+    width = maxlags + 1
+    pad = np.zeros((maxlags,) + S.shape[1:])
+    padded = np.concatenate([pad, S, pad])
+    return _box_sum(_box_sum(padded, width), width) / width
+
+
+def _meat(X, scores, maxlags=0):
+    """Sum of score outer products, with Bartlett-weighted lags for HAC.
+
+    scores: (n, m) per-row residual scores; the p-vector score of row i is
+    X[i] * scores[i]. Returns (m, p, p) without forming any n x n matrix.
+    """
+    S = X[:, None, :] * scores[:, :, None]                     # (n, m, p)
+    KS = _bartlett_smooth(S, maxlags) if maxlags > 0 else S
+    return np.matmul(S.transpose(1, 2, 0), KS.transpose(1, 0, 2))
+
+
+def combine_weights(mask=None, weights=None):
+    """Effective row weights: weights (default 1) zeroed where mask is False."""
+    if mask is None and weights is None:
+        return None
+    if weights is None:
+        return np.asarray(mask, dtype=float)
+    w = np.asarray(weights, dtype=float)
+    if mask is not None:
+        w = w * np.asarray(mask, dtype=bool)
+    return w
+
+
+def billing_weights(days, variances=None, per_day=False):
+    """WLS weights for billing periods of unequal length, scaled to mean 1.
+
+    variances: user-supplied per-period variances (weights = 1/variance).
+    Otherwise weights follow the day count: a per-day average over more days
+    is more precise (w = days), while a period total over more days is
+    noisier (w = 1/days).
+    """
+    if variances is not None:
+        w = 1.0 / np.asarray(variances, dtype=float)
+    else:
+        days = np.asarray(days, dtype=float)
+        w = days if per_day else 1.0 / days
+    return w / w.mean()
+
+
+def fit_ols(X, y, mask=None, cov_type='classical', maxlags=None, weights=None,
+            diagnostics=False):
+    """Least-squares fit of one or many meters against a shared design.
+
+    X: (n, p) design (see design_matrix). y: (n,) or (n, m).
+    mask: optional (n,) or (n, m) boolean, False rows excluded from the fit.
+    weights: optional (n,) or (n, m) WLS weights (e.g. billing_weights).
+    cov_type: one of COV_TYPES; maxlags is the HAC bandwidth
+    (default newey_west_lags(n)).
+    diagnostics: also return result['influence'] (see influence()).
+    """
+    if cov_type not in COV_TYPES:
+        raise ValueError(f"cov_type must be one of {', '.join(COV_TYPES)}")
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    single = y.ndim == 1
+    Y = y[:, None] if single else y
+    n, p = X.shape
+    m = Y.shape[1]
+
+    w = combine_weights(mask, weights)
+    if w is not None and w.ndim == 2 and single:
+        w = w[:, 0]
+
+    # Zero-weight (e.g. QC-masked) rows may hold NaN: keep them out of every sum
+    wm = np.ones((n, 1)) if w is None else (w if w.ndim == 2 else w[:, None])
+    used = np.broadcast_to(wm > 0, (n, m))
+    Xf = X if w is None else np.where(used.any(axis=1)[:, None], X, 0.0)
+    Yf = Y if w is None else np.where(used, Y, 0.0)
+
+    # Factor X'WX once (or once per meter when masks differ by meter)
+    G = _gram(Xf, w)
+    L = np.linalg.cholesky(G)
+    eye = np.broadcast_to(np.eye(p), G.shape)
+    L_inv = _tri_solve(L, eye)
+    xtx_inv = np.swapaxes(L_inv, -1, -2) @ L_inv
+
+    Wy = Yf if w is None else Yf * wm
+    if G.ndim == 2:
+        beta = xtx_inv @ (Xf.T @ Wy)                       # (p, m)
+    else:
+        beta = np.einsum('mij,nj,nm->im', xtx_inv, Xf, Wy, optimize=True)
+
+    y_hat = X @ beta
+    residuals = Y - y_hat
+    r_used = np.where(used, residuals, 0.0)
+    n_used = np.count_nonzero(used, axis=0).astype(float)
+    df_resid = n_used - p
+    y_mean = (wm * Yf).sum(axis=0) / np.broadcast_to(wm, (n, m)).sum(axis=0)
+    ss_res = (wm * r_used ** 2).sum(axis=0)
+    ss_tot = (wm * np.where(used, Yf - y_mean, 0.0) ** 2).sum(axis=0)
+    mse = ss_res / df_resid
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r_squared = np.where(ss_tot > 0, 1 - ss_res / ss_tot, 0.0)
+
+    inv_b = xtx_inv if xtx_inv.ndim == 3 else np.broadcast_to(xtx_inv, (m, p, p))
+    if cov_type == 'classical':
+        cov = inv_b * mse[:, None, None]
+    else:
+        scores = wm * r_used
+        if cov_type in ('HC2', 'HC3'):
+            h = leverage(Xf, L, w)
+            h = h if h.ndim == 2 else h[:, None]
+            scores = scores / np.sqrt(1 - np.minimum(h, 1 - 1e-12)) ** (1 if cov_type == 'HC2' else 2)
+        lags = 0
+        if cov_type == 'HAC':
+            lags = newey_west_lags(int(n_used.max())) if maxlags is None else int(maxlags)
+        meat = _meat(Xf, scores, lags)
+        cov = inv_b @ meat @ inv_b
+        if cov_type == 'HC1':
+            cov = cov * (n_used / df_resid)[:, None, None]
+
+    se = np.sqrt(np.diagonal(cov, axis1=1, axis2=2)).T          # (p, m)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(se > 0, beta / se, np.inf)
+
+    result = {
+        'beta': beta, 'se': se, 't': t, 'cov': cov, 'cov_type': cov_type,
+        'r_squared': r_squared,
+        'ss_reg': ss_tot - ss_res, 'ss_res': ss_res, 'ss_tot': ss_tot,
+        'mse': mse, 'n': n_used, 'p': p, 'df_resid': df_resid,
+        'y_hat': y_hat, 'residuals': residuals,
+        'xtx': G, 'xtx_inv': xtx_inv, 'chol': L,
+    }
+    if cov_type == 'HAC':
+        result['maxlags'] = lags
+    if w is not None:
+        result['weights'] = w
+    if single:
+        for key in ('beta', 'se', 't', 'y_hat', 'residuals'):
+            result[key] = result[key][..., 0]
+        for key in ('r_squared', 'ss_reg', 'ss_res', 'ss_tot', 'mse', 'n', 'df_resid'):
+            result[key] = float(result[key][0])
+        result['cov'] = cov[0]
+    if diagnostics:
+        result['influence'] = influence(result, X)
+    return result
+
+
+ROBUST_LOSSES = {'huber': 1.345, 'bisquare': 4.685}   # tuning constants (95% efficiency)
+
+
+def _robust_weights(u, loss, out):
+    """IRLS weights psi(u)/u for standardized residuals u, written into `out`."""
+    np.abs(u, out=out)
+    if loss == 'huber':
+        np.maximum(out, 1.0, out=out)
+        np.reciprocal(out, out=out)
+    else:
+        np.minimum(out, 1.0, out=out)
+        np.square(out, out=out)
+        np.subtract(1.0, out, out=out)
+        np.square(out, out=out)
+    return out
+
+
+def fit_robust(X, y, loss='huber', c=None, mask=None, weights=None, beta0=None,
+               maxiter=50, tol=1e-6, cov_type='classical'):
+    """Iteratively reweighted least squares with Huber or Tukey bisquare loss.
+
+    y may be (n,) or (n, m); every meter gets its own robust weights and
+    scale (MAD of residuals), and converged meters drop out of later passes.
+    Each pass warm-starts from the previous coefficients (or from `beta0`,
+    e.g. last period's model) and updates the weight array in place.
+    The final weights go through fit_ols, so the result carries the usual
+    fields plus 'robust_weights', 'scale', 'iterations' and 'converged'.
+    """
+    if loss not in ROBUST_LOSSES:
+        raise ValueError(f"loss must be one of {', '.join(ROBUST_LOSSES)}")
+    c = ROBUST_LOSSES[loss] if c is None else c
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    single = y.ndim == 1
+    Y = y[:, None] if single else y
+    n, p = X.shape
+    m = Y.shape[1]
+
+    base = combine_weights(mask, weights)
+    if base is None:
+        base = np.ones((n, m))
+    else:
+        base = np.broadcast_to(base if base.ndim == 2 else base[:, None], (n, m))
+    used = base > 0
+    # Zero-weight rows may hold NaN; the loop works on zeroed copies
+    Xf = np.where(used.any(axis=1)[:, None], X, 0.0)
+    Yf = np.where(used, Y, 0.0)
+
+    if beta0 is None:
+        start = fit_ols(X, Y, weights=base)
+        beta = start['beta'].copy()
+    else:
+        beta = np.array(beta0, dtype=float).reshape(p, -1) * np.ones((1, m))
+
+    rw = np.ones((n, m))            # robust weights, updated in place
+    u = np.empty((n, m))
+    scale = np.zeros(m)
+    iterations = np.zeros(m, dtype=int)
+    active = np.ones(m, dtype=bool)
+
+    for it in range(1, maxiter + 1):
+        cols = np.flatnonzero(active)
+        if cols.size == 0:
+            break
+        resid = Yf[:, cols] - Xf @ beta[:, cols]
+        r_used = np.where(used[:, cols], resid, np.nan)
+        mad = np.nanmedian(np.abs(r_used - np.nanmedian(r_used, axis=0)), axis=0)
+        s = mad / 0.6745
+        s = np.where(s > 0, s, np.nanstd(r_used, axis=0) + 1e-12)
+        scale[cols] = s
+        if cols.size == m:
+            np.divide(resid, c * s, out=u)
+            _robust_weights(u, loss, out=rw)
+        else:
+            rw[:, cols] = _robust_weights(resid / (c * s), loss, np.empty_like(resid))
+        w_eff = base[:, cols] * rw[:, cols]
+
+        G = np.einsum('ni,nm,nj->mij', Xf, w_eff, Xf, optimize=True)
+        rhs = np.einsum('ni,nm->mi', Xf, w_eff * Yf[:, cols], optimize=True)
+        new_beta = np.linalg.solve(G, rhs[..., None])[..., 0].T        # (p, active)
+        step = np.abs(new_beta - beta[:, cols]).max(axis=0)
+        size = np.abs(new_beta).max(axis=0) + 1e-12
+        beta[:, cols] = new_beta
+        iterations[cols] = it
+        active[cols[step / size < tol]] = False
+
+    final_w = base * rw
+    if single:
+        result = fit_ols(X, Y[:, 0], weights=final_w[:, 0], cov_type=cov_type)
+        result.update({'robust_weights': rw[:, 0], 'scale': float(scale[0]),
+                       'iterations': int(iterations[0]), 'converged': bool(not active[0])})
+    else:
+        result = fit_ols(X, Y, weights=final_w, cov_type=cov_type)
+        result.update({'robust_weights': rw, 'scale': scale,
+                       'iterations': iterations, 'converged': ~active})
+    result.update({'loss': loss, 'c': c})
+    return result
+
+
+def _quadratic_rows(X, A, block=1 << 24):
+    """x_i' A x_i for every row of X and every (p, p) matrix of A (m, p, p) -> (n, m)."""
+    n, p = X.shape
+    m = A.shape[0]
+    out = np.empty((n, m))
+    rows = max(1, block // (m * p))
+    for start in range(0, n, rows):
+        Xb = X[start:start + rows]
+        out[start:start + rows] = np.einsum('ni,mij,nj->nm', Xb, A, Xb, optimize=True)
+    return out
+
+
+def predict(fit, X_new, confidence=0.90, weights=None):
+    """Point predictions with confidence and prediction intervals.
+
+    X_new: (n, p) design for the new rows (same columns as the fit).
+    weights: optional (n,) WLS weights of the new rows on the fit's scale
+    (e.g. billing_weights); the prediction variance is mse / weight.
+
+    Var(x0'b) = mse ||L^-1 x0||^2 for classical fits: one triangular solve
+    of the p x p factor and a row-wise squared norm, shared by every meter
+    that used the same factor, so a full 8760 x 1000 band is one
+    (n, p) product plus an outer product with mse. Robust covariances use
+    x0' Cov x0 per meter, evaluated in row blocks.
+
+    Returns y_hat, se_mean, se_pred, ci_low/ci_high (mean response) and
+    pi_low/pi_high (new observation), shaped like the fit's y_hat.
+    """
+    X_new = np.asarray(X_new, dtype=float)
+    beta = fit['beta']
+    single = beta.ndim == 1
+    B = beta[:, None] if single else beta
+    m = B.shape[1]
+    y_hat = X_new @ B
+    mse = np.atleast_1d(fit['mse'])
+
+    L = fit.get('chol')            # absent for models reloaded from model_store: use 'cov'
+    if fit['cov_type'] == 'classical' and L is not None and L.ndim == 2:
+        L_inv = _tri_solve(L, np.eye(L.shape[0]))
+        q = ((X_new @ L_inv.T) ** 2).sum(axis=1)
+        var_mean = q[:, None] * mse[None, :]
+    elif fit['cov_type'] == 'classical' and L is not None:
+        L_inv = _tri_solve(L, np.broadcast_to(np.eye(L.shape[-1]), L.shape))
+        var_mean = _quadratic_rows(X_new, np.swapaxes(L_inv, 1, 2) @ L_inv) * mse[None, :]
+    else:
+        cov = fit['cov'][None] if fit['cov'].ndim == 2 else fit['cov']
+        var_mean = _quadratic_rows(X_new, np.broadcast_to(cov, (m,) + cov.shape[-2:]))
+
+    noise = np.broadcast_to(mse[None, :], var_mean.shape)
+    if weights is not None:
+        noise = noise / np.asarray(weights, dtype=float)[:, None]
+    se_mean = np.sqrt(var_mean)
+    se_pred = np.sqrt(var_mean + noise)
+    t = t_quantile(confidence, np.atleast_1d(fit['df_resid']))
+    result = {
+        'y_hat': y_hat, 'se_mean': se_mean, 'se_pred': se_pred,
+        'ci_low': y_hat - t * se_mean, 'ci_high': y_hat + t * se_mean,
+        'pi_low': y_hat - t * se_pred, 'pi_high': y_hat + t * se_pred,
+    }
+    if single:
+        result = {key: value[:, 0] for key, value in result.items()}
+    result['confidence'] = confidence
+    result['t'] = float(t[0]) if single else t
+    return result
+
+
+def g14_metrics(actual, predicted, n_params, weights=None, resolution='monthly'):
+    """ASHRAE Guideline 14 goodness-of-fit: NMBE, CV(RMSE), R^2 (percent, per meter).
+
+    NMBE = sum(y - y_hat) / ((n - p) * y_bar)
+    CV(RMSE) = sqrt(sum((y - y_hat)^2) / (n - p)) / y_bar
+    With weights, sums are weighted and the weights are rescaled to mean 1
+    over the rows used, so equal weights reproduce the unweighted values.
+    """
+    y = np.asarray(actual, dtype=float)
+    y_hat = np.asarray(predicted, dtype=float)
+    if weights is None:
+        w = np.ones_like(y)
+    else:
+        w = np.broadcast_to(np.asarray(weights, dtype=float).reshape(
+            np.shape(weights) + (1,) * (y.ndim - np.ndim(weights))), y.shape)
+    used = w > 0
+    n = used.sum(axis=0)
+    w = w * n / w.sum(axis=0)
+    y = np.where(used, y, 0.0)                 # zero-weight rows may hold NaN
+    y_bar = (w * y).sum(axis=0) / n
+    err = np.where(used, y - y_hat, 0.0)
+    dof = n - n_params
+    nmbe = 100 * (w * err).sum(axis=0) / (dof * y_bar)
+    cvrmse = 100 * np.sqrt((w * err ** 2).sum(axis=0) / dof) / y_bar
+    ss_tot = (w * np.where(used, y - y_bar, 0.0) ** 2).sum(axis=0)
+    r2 = 1 - (w * err ** 2).sum(axis=0) / ss_tot
+    limits = G14_LIMITS[resolution]
+    passes = (np.abs(nmbe) <= limits['nmbe']) & (cvrmse <= limits['cvrmse'])
+    out = {'nmbe': nmbe, 'cvrmse': cvrmse, 'r_squared': r2, 'n': n, 'passes': passes}
+    if y.ndim == 1:
+        out = {k: (bool(v) if k == 'passes' else float(v)) for k, v in out.items()}
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vectorized OLS with robust standard errors')
+    parser.add_argument('--file', type=str, default=BASELINE_HOURLY, help='Hourly interval CSV')
+    parser.add_argument('--y', type=str, default='total_kw', help='Dependent column (default: total_kw)')
+    parser.add_argument('--x', nargs='+', default=['oat_f'], help='Regressor columns (default: oat_f)')
+    parser.add_argument('--cov-type', choices=COV_TYPES, default=None,
+                        help='Show only this covariance type (default: compare all)')
+    parser.add_argument('--maxlags', type=int, default=None, help='HAC bandwidth (default: Newey-West rule)')
+    parser.add_argument('--influence', type=int, default=0, metavar='N',
+                        help="List the N most influential points by Cook's distance")
+    parser.add_argument('--robust', choices=list(ROBUST_LOSSES), default=None,
+                        help='Also fit by IRLS with this loss and compare coefficients')
+    args = parser.parse_args()
+
+    data = read_interval_csv(args.file, [args.y] + args.x)
+    X = design_matrix(*(column(data, c) for c in args.x))
+    y = column(data, args.y)
+    names = ['intercept'] + args.x
+
+    print("=" * 60)
+    print("VECTORIZED OLS — ROBUST STANDARD ERRORS")
+    print("=" * 60)
+    base = fit_ols(X, y)
+    print(f"  Model: {args.y} ~ {' + '.join(args.x)}   (n={base['n']:.0f}, R^2={base['r_squared']:.4f})")
+    print()
+    print(f"  {'Coefficient':<14} {'Estimate':>12}")
+    print("  " + "-" * 27)
+    for name, b in zip(names, base['beta']):
+        print(f"  {name:<14} {b:>12.4f}")
+    print()
+
+    cov_types = [args.cov_type] if args.cov_type else list(COV_TYPES)
+    print(f"  {'Cov type':<10} " + " ".join(f"{'SE(' + nm + ')':>16}" for nm in names))
+    print("  " + "-" * (11 + 17 * len(names)))
+    for ct in cov_types:
+        res = fit_ols(X, y, cov_type=ct, maxlags=args.maxlags)
+        label = ct if ct != 'HAC' else f"HAC({res['maxlags']})"
+        print(f"  {label:<10} " + " ".join(f"{se:>16.4f}" for se in res['se']))
+
+    if args.robust:
+        rob = fit_robust(X, y, args.robust)
+        down = int(np.count_nonzero(rob['robust_weights'] < 0.5))
+        print()
+        print(f"  ROBUST FIT ({args.robust}, {rob['iterations']} iterations,"
+              f" {'converged' if rob['converged'] else 'NOT converged'})")
+        print(f"  {'Coefficient':<14} {'OLS':>12} {'Robust':>12} {'SE':>10}")
+        print("  " + "-" * 51)
+        for name, b_ols, b_rob, se in zip(names, base['beta'], rob['beta'], rob['se']):
+            print(f"  {name:<14} {b_ols:>12.4f} {b_rob:>12.4f} {se:>10.4f}")
+        print(f"  Residual scale (MAD): {rob['scale']:.3f}   Points weighted below 0.5: {down}")
+
+    if args.influence:
+        diag = influence(base, X)
+        flags = influence_flags(diag, base['p'])
+        print()
+        print(f"  INFLUENTIAL POINTS (top {args.influence} by Cook's distance)")
+        print(f"  {'Timestamp':<18} {args.y:>10} {'Leverage':>9} {'Stud. t':>8} {'Cook D':>9} {'DFFITS':>8}")
+        print("  " + "-" * 66)
+        for i in np.argsort(-np.nan_to_num(diag['cooks_d']))[:args.influence]:
+            print(f"  {str(data['timestamps'][i]):<18} {y[i]:>10.1f} {diag['leverage'][i]:>9.5f}"
+                  f" {diag['student_resid_external'][i]:>8.2f} {diag['cooks_d'][i]:>9.5f}"
+                  f" {diag['dffits'][i]:>8.3f}")
+        print()
+        print(f"  High leverage: {int(flags['high_leverage'].sum())}   Outliers |t|>3: "
+              f"{int(flags['outlier'].sum())}   Influential: {int(flags['influential'].sum())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Interval Resampling and Gap Filling
+
+Turns irregular meter exports (DST gaps and repeats, mixed 5/15-minute
+logging, outages) into a regular interval grid the fitters can use:
+1. Align every reading to an interval-ending grid (readings averaged per slot)
+2. Interpolate short gaps linearly between the neighbouring readings
+3. Fill long gaps from the same-time-of-week mean profile
+4. Record a provenance code for every value
+
+Large files are processed chunk by chunk: a first pass accumulates the
+time-of-week profile, a second pass aligns and fills, carrying only the
+rows whose gap is still open across each chunk boundary.
+
+Usage:
+    python resample.py
+    python resample.py --file meter_export.csv --step 15 --max-gap 120
+    python resample.py --file meter_export.csv --output meter_15min.csv
+"""
+import argparse
+import os
+
+import numpy as np
+
+from calendar_features import EPOCH, MINUTES_PER_WEEK, grid_slots, tow_index
+from interval_data import BASELINE_HOURLY, iter_interval_csv
+
+# Provenance codes stored per value in result['provenance']
+PROV_MEASURED = 0      # exactly one reading in the slot
+PROV_AVERAGED = 1      # several readings averaged into the slot
+PROV_INTERPOLATED = 2  # short gap, linear interpolation
+PROV_PROFILE = 3       # long gap, same-time-of-week profile
+PROV_MISSING = 4       # no reading and no profile value available
+PROV_NAMES = {
+    PROV_MEASURED: 'measured',
+    PROV_AVERAGED: 'averaged',
+    PROV_INTERPOLATED: 'interpolated',
+    PROV_PROFILE: 'profile',
+    PROV_MISSING: 'missing',
+}
+
+def tow_profile(timestamps, values, step, sums=None, counts=None):
+    """Accumulate time-of-week sums and counts; call once per chunk, then `profile_means`."""
+    n_bins = MINUTES_PER_WEEK // step
+    k = values.shape[1]
+    if sums is None:
+        sums = np.zeros((n_bins, k))
+        counts = np.zeros((n_bins, k), dtype=np.int64)
+    tow = tow_index(grid_slots(timestamps, step), step)
+    valid = ~np.isnan(values)
+    np.add.at(sums, tow, np.where(valid, values, 0.0))
+    np.add.at(counts, tow, valid)
+    return sums, counts
+
+
+def profile_means(sums, counts):
+    """Mean value per time-of-week bin; NaN where a bin was never observed."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def align_to_grid(timestamps, values, step, first_slot=None, how='mean'):
+    """Average (or sum) readings into regular interval-ending slots.
+
+    Slots with no reading come back as NaN with PROV_MISSING. Readings that
+    fall before `first_slot` are dropped.
+    """
+    slots = grid_slots(timestamps, step)
+    if first_slot is not None:
+        keep = slots >= first_slot
+        slots, values = slots[keep], values[keep]
+    k = values.shape[1]
+    if slots.size == 0:
+        return {'slots': np.array([], dtype=np.int64), 'values': np.empty((0, k)),
+                'provenance': np.empty((0, k), dtype=np.uint8)}
+
+    lo = slots.min() if first_slot is None else first_slot
+    n_grid = int(slots.max() - lo + 1)
+    order = np.argsort(slots, kind='stable')
+    s = slots[order] - lo
+    v = values[order]
+    valid = ~np.isnan(v)
+    starts = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+    sums = np.add.reduceat(np.where(valid, v, 0.0), starts, axis=0)
+    counts = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+
+    out = np.full((n_grid, k), np.nan)
+    prov = np.full((n_grid, k), PROV_MISSING, dtype=np.uint8)
+    rows = s[starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        agg = sums if how == 'sum' else sums / counts
+    out[rows] = np.where(counts > 0, agg, np.nan)
+    prov[rows] = np.where(counts == 1, PROV_MEASURED,
+                          np.where(counts > 1, PROV_AVERAGED, PROV_MISSING))
+    return {'slots': np.arange(lo, lo + n_grid), 'values': out, 'provenance': prov}
+
+
+def _fill_block(values, prov, tow, profile, max_gap, anchor=None):
+    """Return the block with NaNs filled, updating `prov` in place.
+
+    `anchor` is the already-emitted row just before the block; NaN entries
+    mean the gap reaching into this block is already a long one.
+    """
+    n, k = values.shape
+    if anchor is not None:
+        values = np.vstack([anchor[None, :], values])
+    m = values.shape[0]
+    valid = ~np.isnan(values)
+    idx = np.arange(m)[:, None]
+    prev_idx = np.maximum.accumulate(np.where(valid, idx, -1), axis=0)
+    next_idx = np.minimum.accumulate(np.where(valid, idx, m)[::-1], axis=0)[::-1]
+    gap_len = next_idx - prev_idx - 1
+    short = ~valid & (prev_idx >= 0) & (next_idx < m) & (gap_len <= max_gap)
+
+    cols = np.broadcast_to(np.arange(k), (m, k))
+    lo = values[np.clip(prev_idx, 0, m - 1), cols]
+    hi = values[np.clip(next_idx, 0, m - 1), cols]
+    frac = (idx - prev_idx) / np.maximum(next_idx - prev_idx, 1)
+    filled = np.where(short, lo + frac * (hi - lo), values)
+
+    offset = 0 if anchor is None else 1
+    body = filled[offset:]
+    short = short[offset:]
+    long_gap = np.isnan(body)
+    body = np.where(long_gap, profile[tow], body)
+    prov[short] = PROV_INTERPOLATED
+    prov[long_gap & ~np.isnan(body)] = PROV_PROFILE
+    prov[long_gap & np.isnan(body)] = PROV_MISSING
+    return body
+
+
+def fill_gaps(data, step, max_gap_minutes=120, profile=None):
+    """Gap-fill an aligned in-memory series: {'timestamps', 'values', 'provenance'}."""
+    slots = grid_slots(data['timestamps'], step)
+    if profile is None:
+        profile = profile_means(*tow_profile(data['timestamps'], data['values'], step))
+    max_gap = max_gap_minutes // step
+    data['values'] = _fill_block(data['values'], data['provenance'], tow_index(slots, step),
+                                 profile, max_gap)
+    return data
+
+
+def _safe_cut(values, max_gap, anchor=None):
+    """Rows that can be filled now: no column may end them inside a gap that could still be short.
+
+    A NaN run ending at the cut is moved past when it already exceeds
+    max_gap or has no reading before it (both are profile-filled whatever
+    follows); otherwise the cut moves back to where the run starts. This
+    repeats until the cut stops moving.
+    """
+    n = len(values)
+    valid = ~np.isnan(values)
+    left_known = np.zeros(values.shape[1], dtype=bool) if anchor is None else ~np.isnan(anchor)
+    cut = n
+    while cut > 0:
+        v = valid[:cut]
+        last_valid = np.where(v.any(axis=0), cut - 1 - np.argmax(v[::-1], axis=0), -1)
+        run = cut - 1 - last_valid
+        open_gap = (run > 0) & (run <= max_gap) & ((last_valid >= 0) | left_known)
+        new_cut = int(np.min(np.where(open_gap, last_valid + 1, cut)))
+        if new_cut == cut:
+            break
+        cut = new_cut
+    return cut
+
+
+def resample_chunks(chunks, step, profile, max_gap_minutes=120, how='mean'):
+    """Align and gap-fill a stream of raw chunks, yielding regular-grid chunks.
+
+    Each yielded dict has 'timestamps', 'columns', 'values' and 'provenance'.
+    Rows whose gap could still turn out short are held back until the next
+    chunk arrives, so results match a single in-memory pass.
+    """
+    max_gap = max_gap_minutes // step
+    columns = None
+    next_slot = None
+    raw_tail = None      # raw readings in the last (possibly incomplete) slot
+    held = None          # aligned rows whose gap is still open
+    anchor = None        # last emitted row (filled), NaN where inside a long gap
+
+    def emit(block, final):
+        nonlocal held, anchor
+        slots, values, prov = block['slots'], block['values'], block['provenance']
+        if held is not None:
+            slots = np.r_[held['slots'], slots]
+            values = np.vstack([held['values'], values])
+            prov = np.vstack([held['provenance'], prov])
+        n = len(slots)
+        if n == 0:
+            return None
+        cut = n if final else _safe_cut(values, max_gap, anchor)
+        held = {'slots': slots[cut:], 'values': values[cut:], 'provenance': prov[cut:]}
+        if cut == 0:
+            return None
+        out_prov = prov[:cut].copy()
+        filled = _fill_block(values[:cut].copy(), out_prov, tow_index(slots[:cut], step),
+                             profile, max_gap, anchor)
+        anchor = np.where(out_prov[-1] <= PROV_INTERPOLATED, filled[-1], np.nan)
+        return {
+            'timestamps': EPOCH + (slots[:cut] * step).astype('timedelta64[m]'),
+            'columns': columns,
+            'values': filled,
+            'provenance': out_prov,
+        }
+
+    for chunk in chunks:
+        columns = chunk['columns']
+        ts, vals = chunk['timestamps'], chunk['values']
+        if raw_tail is not None:
+            ts = np.r_[raw_tail[0], ts]
+            vals = np.vstack([raw_tail[1], vals])
+        slots = grid_slots(ts, step)
+        if slots.size == 0:
+            continue
+        last = slots.max()
+        tail = slots == last
+        raw_tail = (ts[tail], vals[tail])
+        block = align_to_grid(ts[~tail], vals[~tail], step, first_slot=next_slot, how=how)
+        if block['slots'].size:
+            next_slot = int(block['slots'][-1]) + 1
+        out = emit(block, final=False)
+        if out is not None:
+            yield out
+
+    if raw_tail is not None:
+        block = align_to_grid(raw_tail[0], raw_tail[1], step, first_slot=next_slot, how=how)
+        out = emit(block, final=True)
+        if out is not None:
+            yield out
+
+
+def resample_csv(path, step=60, max_gap_minutes=120, chunk_rows=100_000, columns=None, how='mean'):
+    """Two passes over a CSV: profile, then align + fill. Yields regular-grid chunks."""
+    sums = counts = None
+    for chunk in iter_interval_csv(path, chunk_rows, columns):
+        sums, counts = tow_profile(chunk['timestamps'], chunk['values'], step, sums, counts)
+    if sums is None:
+        return
+    profile = profile_means(sums, counts)
+    yield from resample_chunks(iter_interval_csv(path, chunk_rows, columns), step, profile,
+                               max_gap_minutes, how)
+
+
+def concat_chunks(chunks):
+    """Join resampled chunks into one {'timestamps', 'columns', 'values', 'provenance'} dict."""
+    chunks = list(chunks)
+    if not chunks:
+        return None
+    return {
+        'timestamps': np.concatenate([c['timestamps'] for c in chunks]),
+        'columns': chunks[0]['columns'],
+        'values': np.vstack([c['values'] for c in chunks]),
+        'provenance': np.vstack([c['provenance'] for c in chunks]),
+    }
+
+
+def write_csv(path, data, float_fmt='%.3f'):
+    """Write a resampled series (with per-column provenance codes) back to CSV."""
+    ts = np.datetime_as_string(data['timestamps'], unit='m')
+    ts = np.char.replace(ts, 'T', ' ')
+    header = ['datetime'] + data['columns'] + [f"{c}_prov" for c in data['columns']]
+    with open(path, 'w') as f:
+        f.write(','.join(header) + '\n')
+        for row in zip(ts, data['values'], data['provenance']):
+            f.write(row[0] + ',' + ','.join(float_fmt % v for v in row[1]) + ','
+                    + ','.join(str(p) for p in row[2]) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Interval Resampling and Gap Filling')
+    parser.add_argument('--file', type=str, default=BASELINE_HOURLY, help='Raw interval CSV')
+    parser.add_argument('--step', type=int, default=60, help='Grid interval in minutes (default: 60)')
+    parser.add_argument('--max-gap', type=int, default=120,
+                        help='Longest gap (minutes) filled by interpolation (default: 120)')
+    parser.add_argument('--chunk-rows', type=int, default=100_000, help='Rows read per chunk')
+    parser.add_argument('--output', type=str, help='Write the regular-grid series to CSV')
+    args = parser.parse_args()
+
+    data = concat_chunks(resample_csv(args.file, args.step, args.max_gap, args.chunk_rows))
+    if data is None:
+        print("  No readings found.")
+        return
+
+    print("=" * 60)
+    print("INTERVAL RESAMPLING & GAP FILL")
+    print("=" * 60)
+    print(f"  File:       {os.path.basename(args.file)}")
+    print(f"  Grid:       {args.step} min, {len(data['timestamps']):,} intervals")
+    print(f"  Span:       {data['timestamps'][0]} – {data['timestamps'][-1]}")
+    print(f"  Max interp: {args.max_gap} min")
+    print()
+    print(f"  {'Column':<16} " + " ".join(f"{name:>12}" for name in PROV_NAMES.values()))
+    print("  " + "-" * (17 + 13 * len(PROV_NAMES)))
+    for j, name in enumerate(data['columns']):
+        counts = np.bincount(data['provenance'][:, j], minlength=len(PROV_NAMES))
+        print(f"  {name:<16} " + " ".join(f"{c:>12,}" for c in counts))
+
+    if args.output:
+        write_csv(args.output, data)
+        print(f"\n  Resampled series saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+M&V Results Database
+
+Fits, validation statistics, period savings and non-routine adjustments
+kept in one SQLite file instead of stdout and per-run JSON:
+
+    sites        one row per site (name unique)
+    models       site, meter, model type, resolution, baseline period,
+                 named parameters (JSON) and a training-data fingerprint
+    validations  G14 statistics per model (n, NMBE, CV(RMSE), R^2, pass, rho)
+    savings      per-period adjusted baseline, actual, savings, uncertainty
+    nras         non-routine adjustments per site, meter and period
+
+- Indexes on site, meter, model type, period and CV(RMSE), so portfolio
+  queries ("every meter with CV(RMSE) above 15%") are index range scans
+- WAL journal with synchronous=NORMAL; writers batch many sites per
+  transaction with executemany, so a 10,000-site run is a few hundred
+  commits rather than one per row
+- Model ids are assigned in the writer so the child rows of a whole
+  batch can be inserted with one executemany per table
+- A model is unique per (site, meter, model type, resolution, baseline
+  period): writing it again replaces it with its validation, savings and
+  NRA rows, so re-running a site does not duplicate its results
+
+Usage:
+    python results_db.py
+    python results_db.py --from-synthetic /tmp/portfolio --meters total_kw,cooling_kw
+    python results_db.py --db results.sqlite --max-cvrmse 15
+"""
+import argparse
+import json
+import sqlite3
+import time
+
+import numpy as np
+
+from changepoint import fit_changepoint
+from interval_data import BASELINE_MONTHLY, REPORTING_MONTHLY, REPORTING_NO_NRA_MONTHLY, read_monthly_csv
+from model_store import fingerprint
+from savings import avoided_energy, fit_baseline_models
+
+DEFAULT_DB = 'results.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sites (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    meta TEXT
+);
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY,
+    site_id INTEGER NOT NULL REFERENCES sites(id),
+    meter TEXT NOT NULL,
+    model_type TEXT NOT NULL,
+    resolution TEXT NOT NULL,
+    period_start TEXT,
+    period_end TEXT,
+    n_params INTEGER,
+    params TEXT,
+    fingerprint TEXT,
+    created TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS validations (
+    model_id INTEGER PRIMARY KEY REFERENCES models(id),
+    n INTEGER,
+    nmbe REAL,
+    cvrmse REAL,
+    r_squared REAL,
+    passes INTEGER,
+    rho REAL
+);
+CREATE TABLE IF NOT EXISTS savings (
+    id INTEGER PRIMARY KEY,
+    model_id INTEGER NOT NULL REFERENCES models(id),
+    period TEXT NOT NULL,
+    baseline REAL,
+    actual REAL,
+    savings REAL,
+    uncertainty REAL,
+    confidence REAL
+);
+CREATE TABLE IF NOT EXISTS nras (
+    id INTEGER PRIMARY KEY,
+    site_id INTEGER NOT NULL REFERENCES sites(id),
+    meter TEXT NOT NULL,
+    period TEXT NOT NULL,
+    adjustment REAL,
+    uncertainty REAL,
+    description TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS models_key ON models(site_id, meter, model_type, resolution, period_start,
+                                                      period_end);
+CREATE INDEX IF NOT EXISTS models_meter ON models(meter);
+CREATE INDEX IF NOT EXISTS models_type ON models(model_type);
+CREATE INDEX IF NOT EXISTS validations_cvrmse ON validations(cvrmse);
+CREATE INDEX IF NOT EXISTS savings_model_period ON savings(model_id, period);
+CREATE INDEX IF NOT EXISTS savings_period ON savings(period);
+CREATE INDEX IF NOT EXISTS nras_site_period ON nras(site_id, period);
+"""
+
+
+def connect(path=DEFAULT_DB):
+    """Open (creating if needed) a results database in WAL mode.
+
+    The connection is in autocommit mode; write_results manages its own
+    transactions.
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def model_record(site, meter, model, resolution='monthly', period=(None, None), training=None):
+    """Result record for one change-point (or similar) model dict.
+
+    period: (start, end) labels of the baseline period. training: arrays
+    the model was fitted on, fingerprinted so refits can be detected.
+    Add 'savings' and 'nras' lists before writing (see savings_rows).
+    """
+    g14 = model['g14']
+    return {
+        'site': site,
+        'meter': meter,
+        'model_type': model['model_type'],
+        'resolution': resolution,
+        'period_start': period[0],
+        'period_end': period[1],
+        'n_params': len(model['fit']['beta']) + len(model.get('change_points', ())),
+        'params': model.get('params'),
+        'fingerprint': fingerprint(*training).hex() if training is not None else None,
+        'g14': {k: g14[k] for k in ('n', 'nmbe', 'cvrmse', 'r_squared', 'passes')},
+        'rho': model.get('rho'),
+        'savings': [],
+        'nras': [],
+    }
+
+
+def savings_rows(periods, result, total_label=None):
+    """Savings rows from an avoided_energy result: one per period plus an optional total row.
+
+    Only the total carries an uncertainty (per-period values are not
+    independent estimates).
+    """
+    rows = [{'period': str(p), 'baseline': float(b), 'actual': float(a), 'savings': float(s)}
+            for p, b, a, s in zip(periods, result['adjusted_baseline'], result['actual'], result['savings'])]
+    if total_label is not None:
+        rows.append({'period': total_label, 'baseline': result['total_baseline'],
+                     'actual': result['total_actual'], 'savings': result['total_savings'],
+                     'uncertainty': result['uncertainty'], 'confidence': result['confidence']})
+    return rows
+
+
+def _site_ids(conn, names):
+    """Ids for site names, inserting the missing ones (inside the caller's transaction)."""
+    names = sorted(set(names))
+    conn.executemany('INSERT OR IGNORE INTO sites(name) VALUES (?)', [(n,) for n in names])
+    ids = {}
+    for i in range(0, len(names), 500):
+        part = names[i:i + 500]
+        marks = ','.join('?' * len(part))
+        ids.update({name: sid for sid, name in conn.execute(
+            f'SELECT id, name FROM sites WHERE name IN ({marks})', part)})
+    return ids
+
+
+_MODEL_KEY = ('SELECT id FROM models WHERE site_id = ? AND meter = ? AND model_type = ? AND resolution = ?'
+              ' AND period_start IS ? AND period_end IS ?')
+
+
+def write_results(conn, records, batch=500):
+    """Bulk-insert result records (see model_record), `batch` records per transaction.
+
+    A record whose model key (site, meter, model type, resolution,
+    baseline period) is already stored replaces that model, its child
+    rows and the site's NRAs for the record's periods. Returns the number
+    of models written.
+    """
+    records = iter(records)
+    written = 0
+    while True:
+        chunk = [r for _, r in zip(range(batch), records)]
+        if not chunk:
+            return written
+        # A key repeated within the batch keeps its last record
+        chunk = list({(r['site'], r['meter'], r['model_type'], r['resolution'], r['period_start'],
+                       r['period_end']): r for r in chunk}.values())
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            site_ids = _site_ids(conn, (r['site'] for r in chunk))
+            first = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM models').fetchone()[0]
+            models, validations, savings, nras, keys, periods = [], [], [], [], [], set()
+            for model_id, r in enumerate(chunk, first):
+                sid = site_ids[r['site']]
+                keys.append((sid, r['meter'], r['model_type'], r['resolution'], r['period_start'], r['period_end']))
+                periods.update((sid, r['meter'], p['period']) for p in r['savings'] + r['nras'])
+                models.append((model_id, sid, r['meter'], r['model_type'], r['resolution'],
+                               r['period_start'], r['period_end'], r['n_params'],
+                               json.dumps(r['params']), r['fingerprint']))
+                g = r['g14']
+                validations.append((model_id, int(g['n']), g['nmbe'], g['cvrmse'], g['r_squared'],
+                                    int(g['passes']), r['rho']))
+                savings.extend((model_id, s['period'], s.get('baseline'), s.get('actual'), s['savings'],
+                                s.get('uncertainty'), s.get('confidence')) for s in r['savings'])
+                nras.extend((sid, r['meter'], a['period'], a['adjustment'], a.get('uncertainty'),
+                             a.get('description')) for a in r['nras'])
+            for table in ('validations', 'savings'):
+                conn.executemany(f'DELETE FROM {table} WHERE model_id IN ({_MODEL_KEY})', keys)
+            conn.executemany(f'DELETE FROM models WHERE id IN ({_MODEL_KEY})', keys)
+            conn.executemany('DELETE FROM nras WHERE site_id = ? AND meter = ? AND period = ?', sorted(periods))
+            conn.executemany('INSERT INTO models(id, site_id, meter, model_type, resolution, period_start,'
+                             ' period_end, n_params, params, fingerprint) VALUES (?,?,?,?,?,?,?,?,?,?)', models)
+            conn.executemany('INSERT INTO validations VALUES (?,?,?,?,?,?,?)', validations)
+            conn.executemany('INSERT INTO savings(model_id, period, baseline, actual, savings, uncertainty,'
+                             ' confidence) VALUES (?,?,?,?,?,?,?)', savings)
+            conn.executemany('INSERT INTO nras(site_id, meter, period, adjustment, uncertainty, description)'
+                             ' VALUES (?,?,?,?,?,?)', nras)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        written += len(chunk)
+
+
+def failing_models(conn, max_cvrmse=15.0, max_abs_nmbe=None, meter=None, model_type=None):
+    """Models whose CV(RMSE) exceeds max_cvrmse (or |NMBE| exceeds max_abs_nmbe), worst first."""
+    where = ['(v.cvrmse > ?' + (' OR abs(v.nmbe) > ?)' if max_abs_nmbe is not None else ')')]
+    args = [max_cvrmse] + ([max_abs_nmbe] if max_abs_nmbe is not None else [])
+    if meter is not None:
+        where.append('m.meter = ?')
+        args.append(meter)
+    if model_type is not None:
+        where.append('m.model_type = ?')
+        args.append(model_type)
+    sql = ('SELECT s.name, m.meter, m.model_type, v.cvrmse, v.nmbe, v.r_squared, m.id'
+           ' FROM validations v JOIN models m ON m.id = v.model_id JOIN sites s ON s.id = m.site_id'
+           f" WHERE {' AND '.join(where)} ORDER BY v.cvrmse DESC")
+    return conn.execute(sql, args).fetchall()
+
+
+def portfolio_savings(conn, period, meter=None):
+    """Total savings for one period label across sites; uncertainties combine in quadrature.
+
+    Returns (n_models, baseline, actual, savings, uncertainty).
+    """
+    sql = ('SELECT COUNT(*), SUM(x.baseline), SUM(x.actual), SUM(x.savings),'
+           ' SUM(x.uncertainty * x.uncertainty) FROM savings x')
+    args = [period]
+    if meter is not None:
+        sql += ' JOIN models m ON m.id = x.model_id WHERE x.period = ? AND m.meter = ?'
+        args.append(meter)
+    else:
+        sql += ' WHERE x.period = ?'
+    n, base, actual, saved, var = conn.execute(sql, args).fetchone()
+    return n, base, actual, saved, (var ** 0.5 if var is not None else None)
+
+
+def greenfield_records(confidence=0.90):
+    """Records for the Greenfield monthly electric and gas models (savings.py defaults).
+
+    The electric NRA rows are the known data-center addition: reporting
+    minus the no-NRA reporting file, per month.
+    """
+    base = read_monthly_csv(BASELINE_MONTHLY)
+    rep = read_monthly_csv(REPORTING_MONTHLY)
+    no_nra = read_monthly_csv(REPORTING_NO_NRA_MONTHLY)
+    base_months = [f'2024-{int(m):02d}' for m in base['month']]
+    rep_months = [f'2025-{int(m):02d}' for m in rep['month']]
+    elec, gas = fit_baseline_models(base)
+    records = []
+    for meter, model, col in (('electric', elec, 'total_kwh'), ('gas', gas, 'total_therms')):
+        result = avoided_energy(model, rep['avg_oat_f'], rep[col], rep['days'], confidence=confidence)
+        r = model_record('greenfield', meter, model, 'monthly', (base_months[0], base_months[-1]),
+                         (base['avg_oat_f'], base[col]))
+        r['savings'] = savings_rows(rep_months, result, 'reporting')
+        r['nras'] = [{'period': p, 'adjustment': float(a), 'description': 'data-center load added'}
+                     for p, a in zip(rep_months, rep[col] - no_nra[col]) if a]
+        records.append(r)
+    return records
+
+
+def _monthly(block, ts, step):
+    """Monthly energy (kWh) and mean of the last column for (N, hours, k) blocks."""
+    months = (ts - np.timedelta64(step, 'm')).astype('datetime64[M]')
+    starts = np.concatenate([[0], np.flatnonzero(months[1:] != months[:-1]) + 1])
+    sums = np.add.reduceat(np.asarray(block, dtype=float), starts, axis=1)
+    counts = np.diff(np.append(starts, len(ts)))
+    return months[starts], sums[..., :-1] * step / 60, sums[..., -1] / counts
+
+
+def synthetic_records(prefix, meters=('total_kw',), model_type='5P', confidence=0.90, batch=64):
+    """Monthly change-point fits and reporting-year savings for a synthetic.py portfolio."""
+    with open(f'{prefix}_meta.json') as f:
+        meta = json.load(f)
+    columns = meta['columns']
+    cols = [columns.index(m) for m in meters] + [columns.index('oat_f')]
+    step = meta['step_minutes']
+    hours = np.arange(meta['hours']) * np.timedelta64(step, 'm')
+    base_ts = np.datetime64(meta['baseline_start'], 'm') + hours
+    rep_ts = np.datetime64(meta['reporting_start'], 'm') + hours
+    base = np.load(f'{prefix}_baseline.npy', mmap_mode='r')
+    rep = np.load(f'{prefix}_reporting.npy', mmap_mode='r')
+    for b0 in range(0, meta['n_buildings'], batch):
+        b1 = min(b0 + batch, meta['n_buildings'])
+        base_months, base_kwh, base_oat = _monthly(base[b0:b1][..., cols], base_ts, step)
+        rep_months, rep_kwh, rep_oat = _monthly(rep[b0:b1][..., cols], rep_ts, step)
+        for i in range(b1 - b0):
+            for j, meter in enumerate(meters):
+                model = fit_changepoint(base_oat[i], base_kwh[i, :, j], model_type)
+                result = avoided_energy(model, rep_oat[i], rep_kwh[i, :, j], confidence=confidence)
+                r = model_record(f'b{b0 + i:05d}', meter, model, 'monthly',
+                                 (str(base_months[0]), str(base_months[-1])), (base_oat[i], base_kwh[i, :, j]))
+                r['savings'] = savings_rows(rep_months, result, 'reporting')
+                yield r
+
+
+def main():
+    parser = argparse.ArgumentParser(description='M&V results database')
+    parser.add_argument('--db', type=str, default=DEFAULT_DB, help=f'SQLite file (default: {DEFAULT_DB})')
+    parser.add_argument('--from-synthetic', type=str, default=None, help='synthetic.py output prefix to fit and store')
+    parser.add_argument('--meters', type=str, default='total_kw', help='Synthetic meters to fit (default: total_kw)')
+    parser.add_argument('--model', type=str, default='5P', help='Synthetic change-point model (default: 5P)')
+    parser.add_argument('--no-write', action='store_true', help='Only query the existing database')
+    parser.add_argument('--max-cvrmse', type=float, default=15.0, help='CV(RMSE) limit %% (default: 15)')
+    parser.add_argument('--batch', type=int, default=500, help='Records per transaction (default: 500)')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    print("=" * 72)
+    print(f"M&V RESULTS DATABASE — {args.db}")
+    print("=" * 72)
+    if not args.no_write:
+        if args.from_synthetic:
+            records = synthetic_records(args.from_synthetic, args.meters.split(','), args.model)
+        else:
+            records = greenfield_records()
+        t0 = time.perf_counter()
+        n = write_results(conn, records, args.batch)
+        elapsed = time.perf_counter() - t0
+        print(f"  Wrote {n:,} models in {elapsed:.2f} s (fits included)")
+
+    counts = {t: conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0]
+              for t in ('sites', 'models', 'validations', 'savings', 'nras')}
+    print("  Rows: " + ", ".join(f"{t} {c:,}" for t, c in counts.items()))
+    t0 = time.perf_counter()
+    failing = failing_models(conn, args.max_cvrmse)
+    t_query = time.perf_counter() - t0
+    print()
+    print(f"  Models with CV(RMSE) > {args.max_cvrmse:g}%: {len(failing):,} ({t_query * 1000:.1f} ms)")
+    for site, meter, model_type, cvrmse, nmbe, r2, _ in failing[:10]:
+        print(f"    {site:<14} {meter:<12} {model_type:<4} CV(RMSE) {cvrmse:>6.2f}%  NMBE {nmbe:>6.2f}%  R^2 {r2:.3f}")
+    if len(failing) > 10:
+        print(f"    ... {len(failing) - 10:,} more")
+
+    print()
+    meters = [m for (m,) in conn.execute('SELECT DISTINCT meter FROM models ORDER BY meter')]
+    for meter in meters:
+        t0 = time.perf_counter()
+        n, base, actual, saved, unc = portfolio_savings(conn, 'reporting', meter)
+        t_query = time.perf_counter() - t0
+        if n:
+            unc_text = f" +/- {unc:,.0f}" if unc is not None else ''
+            print(f"  {meter:<12} {n:>6,} models  savings {saved:>14,.0f}{unc_text}"
+                  f" ({saved / base * 100:.1f}% of {base:,.0f}; {t_query * 1000:.1f} ms)")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
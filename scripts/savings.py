@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Avoided-Energy Savings Calculation
+
+Python counterpart of the Savings Calculator tab:
+1. Fit baseline change-point models (5P or 3PH electric, 3PH gas)
+2. Project them onto reporting-period weather (adjusted baseline)
+3. Savings = adjusted baseline - actual, valued in $ and CO2
+4. Fractional savings uncertainty per ASHRAE Guideline 14, Annex B
+
+Billing periods of unequal length can be handled with WLS weights
+(--weights days) and/or per-day normalization (--per-day); both flow
+through the fit, the G14 statistics and the savings uncertainty.
+
+Usage:
+    python savings.py
+    python savings.py --weights days --per-day
+    python savings.py --elec-model 3PH --confidence 95
+"""
+import argparse
+
+import numpy as np
+
+from changepoint import fit_changepoint, predict_changepoint
+from interval_data import BASELINE_MONTHLY, REPORTING_MONTHLY, read_monthly_csv
+from regression import billing_weights, t_quantile
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Rates (same as the Savings Calculator tab)
+ELEC_RATE = 0.105      # $/kWh
+GAS_RATE = 1.15        # $/therm
+CO2_ELEC = 0.000417    # metric tons CO2/kWh (mid-Atlantic grid)
+CO2_GAS = 0.005302     # metric tons CO2/therm
+
+
+def lag1_autocorrelation(residuals):
+    """Lag-1 autocorrelation of model residuals."""
+    r = np.asarray(residuals, dtype=float)
+    r = r - r.mean()
+    denom = (r ** 2).sum()
+    return float((r[1:] * r[:-1]).sum() / denom) if denom > 0 else 0.0
+
+
+def fractional_savings_uncertainty(cvrmse_pct, savings_fraction, n, m, n_params=2,
+                                   confidence=0.90, rho=0.0):
+    """ASHRAE Guideline 14 (Annex B) fractional savings uncertainty.
+
+    FSU = t * 1.26 * CV * sqrt((n/n') * (1 + 2/n') / m) / F,
+    with n' = n (1 - rho) / (1 + rho) for autocorrelated residuals.
+    """
+    if savings_fraction == 0:
+        return float('inf')
+    n_eff = n * (1 - rho) / (1 + rho)
+    t = t_quantile(confidence, n - n_params)
+    cv = cvrmse_pct / 100.0
+    return t * 1.26 * cv * np.sqrt((n / n_eff) * (1 + 2 / n_eff) / m) / savings_fraction
+
+
+def avoided_energy(model, oat, actual, days=None, adjustments=None, confidence=0.90,
+                   adjustment_uncertainty=0.0):
+    """Savings of reporting-period `actual` against the model's adjusted baseline.
+
+    adjustments: optional per-period non-routine adjustments added to the
+    adjusted baseline (positive = load the baseline would also have seen).
+    adjustment_uncertainty: their total uncertainty at the same confidence
+    (see nra.quantify_nras), combined in quadrature with the model's.
+    """
+    actual = np.asarray(actual, dtype=float)
+    baseline = predict_changepoint(model, oat, days)
+    if adjustments is not None:
+        baseline = baseline + np.asarray(adjustments, dtype=float)
+    savings = baseline - actual
+    total_baseline = float(baseline.sum())
+    total_savings = float(savings.sum())
+    fraction = total_savings / total_baseline if total_baseline else 0.0
+
+    fit = model['fit']
+    n_params = len(fit['beta']) + len(model['change_points'])
+    rho = model['rho'] if 'rho' in model else lag1_autocorrelation(fit['residuals'])
+    fsu = fractional_savings_uncertainty(model['g14']['cvrmse'], fraction, fit['n'], len(actual),
+                                         n_params, confidence, rho)
+    return {
+        'adjusted_baseline': baseline,
+        'actual': actual,
+        'savings': savings,
+        'total_baseline': total_baseline,
+        'total_actual': float(actual.sum()),
+        'total_savings': total_savings,
+        'savings_fraction': fraction,
+        'fsu': fsu,
+        'model_uncertainty': abs(fsu * total_savings),
+        'uncertainty': float(np.hypot(fsu * total_savings, adjustment_uncertainty)),
+        'confidence': confidence,
+    }
+
+
+def fit_baseline_models(baseline, elec_model='5P', weights='none', per_day=False):
+    """Electric and gas baseline models from a monthly billing table."""
+    days = baseline['days']
+    w = billing_weights(days, per_day=per_day) if weights == 'days' else None
+    elec = fit_changepoint(baseline['avg_oat_f'], baseline['total_kwh'], elec_model,
+                           weights=w, days=days, per_day=per_day)
+    gas = fit_changepoint(baseline['avg_oat_f'], baseline['total_therms'], '3PH',
+                          weights=w, days=days, per_day=per_day)
+    return elec, gas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Avoided-Energy Savings Calculation')
+    parser.add_argument('--baseline', type=str, default=BASELINE_MONTHLY, help='Baseline monthly CSV')
+    parser.add_argument('--reporting', type=str, default=REPORTING_MONTHLY, help='Reporting monthly CSV')
+    parser.add_argument('--elec-model', choices=['5P', '3PH'], default='5P', help='Electric model (default: 5P)')
+    parser.add_argument('--weights', choices=['none', 'days'], default='none',
+                        help='WLS weights from billing-period day counts (default: none)')
+    parser.add_argument('--per-day', action='store_true', help='Model energy per day')
+    parser.add_argument('--confidence', type=int, default=90, help='Confidence level %% (default: 90)')
+    args = parser.parse_args()
+
+    base = read_monthly_csv(args.baseline)
+    rep = read_monthly_csv(args.reporting)
+    elec, gas = fit_baseline_models(base, args.elec_model, args.weights, args.per_day)
+    conf = args.confidence / 100
+    e = avoided_energy(elec, rep['avg_oat_f'], rep['total_kwh'], rep['days'], confidence=conf)
+    g = avoided_energy(gas, rep['avg_oat_f'], rep['total_therms'], rep['days'], confidence=conf)
+
+    print("=" * 70)
+    print("AVOIDED-ENERGY SAVINGS")
+    print("=" * 70)
+    print(f"  Weights: {args.weights}   Per-day: {'yes' if args.per_day else 'no'}")
+    print()
+    print(f"  {'Model':<22} {'NMBE %':>8} {'CV(RMSE) %':>11} {'R^2':>8}  G14")
+    print("  " + "-" * 56)
+    for label, model in [(f"Electric ({args.elec_model})", elec), ("Gas (3PH)", gas)]:
+        m = model['g14']
+        print(f"  {label:<22} {m['nmbe']:>8.2f} {m['cvrmse']:>11.2f} {m['r_squared']:>8.4f}  "
+              f"{'PASS' if m['passes'] else 'FAIL'}")
+    print()
+
+    print(f"  {'Month':<6} {'OAT':>6} {'Pred kWh':>10} {'Actual':>10} {'Savings':>9} {'$':>8}"
+          f" {'Pred th':>8} {'Actual':>7} {'Savings':>8}")
+    print("  " + "-" * 78)
+    for i in range(len(rep['month'])):
+        print(f"  {MONTHS[int(rep['month'][i]) - 1]:<6} {rep['avg_oat_f'][i]:>6.1f}"
+              f" {e['adjusted_baseline'][i]:>10,.0f} {e['actual'][i]:>10,.0f} {e['savings'][i]:>9,.0f}"
+              f" {e['savings'][i] * ELEC_RATE:>8,.0f}"
+              f" {g['adjusted_baseline'][i]:>8,.0f} {g['actual'][i]:>7,.0f} {g['savings'][i]:>8,.0f}")
+    print("  " + "-" * 78)
+    print(f"  {'TOTAL':<6} {'':>6} {e['total_baseline']:>10,.0f} {e['total_actual']:>10,.0f}"
+          f" {e['total_savings']:>9,.0f} {e['total_savings'] * ELEC_RATE:>8,.0f}"
+          f" {g['total_baseline']:>8,.0f} {g['total_actual']:>7,.0f} {g['total_savings']:>8,.0f}")
+    print()
+
+    cost = e['total_savings'] * ELEC_RATE + g['total_savings'] * GAS_RATE
+    co2 = e['total_savings'] * CO2_ELEC + g['total_savings'] * CO2_GAS
+    print(f"  Electric savings: {e['total_savings']:,.0f} kWh ({e['savings_fraction'] * 100:.1f}%)"
+          f"  +/- {e['uncertainty']:,.0f} kWh at {args.confidence}% (FSU {e['fsu'] * 100:.1f}%)")
+    print(f"  Gas savings:      {g['total_savings']:,.0f} therms ({g['savings_fraction'] * 100:.1f}%)"
+          f"  +/- {g['uncertainty']:,.0f} therms at {args.confidence}%")
+    print(f"  Cost savings:     ${cost:,.0f}")
+    print(f"  CO2 avoided:      {co2:,.1f} metric tons")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Local M&V Fitting Service
+
+A small HTTP/JSON server for the dashboard, so on-demand fits and
+predictions no longer shell out to a script that reloads and refits:
+
+    POST /fit       {"kind": "towt", "file": "...hourly.csv", "y": "total_kw"}
+                    {"kind": "changepoint", "file": "...monthly.csv", "y": "total_kwh", "model": "5P"}
+    POST /predict   the fit request plus {"reporting": "...csv"}: adjusted
+                    baseline, actual and savings over the reporting file
+    GET  /stats     latency percentiles per endpoint, cache and pool counters
+    GET  /health
+
+- asyncio front end (stdlib only); CPU-bound fits run in a process pool,
+  predictions in the default thread pool (numpy releases the GIL)
+- Datasets are identified by a blake2b hash of the file contents
+  (re-hashed only when size or mtime changes), and a fit by the hash of
+  its request with the dataset hashes substituted: an edited file is a
+  new key, a renamed copy is not
+- LRU caches of fitted models and prediction results in the server;
+  each process also keeps its recently loaded datasets
+- Concurrent requests for the same fit or prediction share one job
+
+Usage:
+    python service.py --port 8765
+    python service.py --port 8765 --workers 4 --cache-size 256
+    python service.py --bench 200
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from changepoint import MODEL_TYPES, fit_changepoint, predict_changepoint
+from interval_data import BASELINE_HOURLY, REPORTING_HOURLY, column, read_interval_csv, read_monthly_csv
+from towt import fit_towt, predict_towt
+
+KINDS = ('towt', 'changepoint')
+LATENCY_WINDOW = 10_000
+STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}
+
+
+# --- Data and fits (run in worker processes) ---------------------------------
+
+@functools.lru_cache(maxsize=8)
+def _load(kind, path, digest, y):
+    """Training or reporting arrays for one dataset; digest keys the per-process cache."""
+    if kind == 'towt':
+        data = read_interval_csv(path, columns=[y, 'oat_f'])
+        return {'timestamps': data['timestamps'], 'y': column(data, y), 'oat': column(data, 'oat_f')}
+    data = read_monthly_csv(path)
+    return {'y': data[y], 'oat': data['avg_oat_f'], 'days': data['days']}
+
+
+def _fit(spec, digest):
+    """Fit the model described by a validated request."""
+    data = _load(spec['kind'], spec['file'], digest, spec['y'])
+    if spec['kind'] == 'towt':
+        return fit_towt(data['timestamps'], data['y'], data['oat'])
+    return fit_changepoint(data['oat'], data['y'], spec['model'], days=data['days'],
+                           per_day=spec.get('per_day', False))
+
+
+def _predict(spec, model, digest):
+    data = _load(spec['kind'], spec['reporting'], digest, spec['y'])
+    if spec['kind'] == 'towt':
+        predicted = predict_towt(model, data['timestamps'], data['oat'])
+    else:
+        predicted = predict_changepoint(model, data['oat'], data['days'])
+    ok = ~(np.isnan(predicted) | np.isnan(data['y']))
+    baseline = float(predicted[ok].sum())
+    actual = float(data['y'][ok].sum())
+    return {'adjusted_baseline': baseline, 'actual': actual, 'savings': baseline - actual,
+            'savings_fraction': (baseline - actual) / baseline if baseline else 0.0, 'n': int(ok.sum())}
+
+
+def _summary(model):
+    """JSON-able view of a fitted model."""
+    out = {'model_type': model['model_type'], 'n_params': len(model['fit']['beta']), 'g14': model['g14']}
+    if 'params' in model:
+        out['params'] = model['params']
+    if 'knots' in model:
+        out['knots'] = model['knots']
+    return out
+
+
+# --- Caches and request keys ---------------------------------------------------
+
+def lru_get(cache, key):
+    """Cached value (refreshed as most recent) or None; counts hits and misses."""
+    if key in cache['items']:
+        cache['items'].move_to_end(key)
+        cache['hits'] += 1
+        return cache['items'][key]
+    cache['misses'] += 1
+    return None
+
+
+def lru_put(cache, key, value):
+    cache['items'][key] = value
+    cache['items'].move_to_end(key)
+    while len(cache['items']) > cache['size']:
+        cache['items'].popitem(last=False)
+
+
+def new_lru(size):
+    return {'items': OrderedDict(), 'size': size, 'hits': 0, 'misses': 0}
+
+
+def file_digest(state, path):
+    """Content hash of a file, recomputed only when its size or mtime changes."""
+    st = os.stat(path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    known = state['digests'].get(path)
+    if known is not None and known[0] == stamp:
+        return known[1]
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    state['digests'][path] = (stamp, h.hexdigest())
+    return h.hexdigest()
+
+
+def validate(spec):
+    """Normalized fit request; raises ValueError on bad input."""
+    kind = spec.get('kind', 'towt')
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+    if 'file' not in spec:
+        raise ValueError('missing "file"')
+    out = {'kind': kind, 'file': os.path.abspath(spec['file']),
+           'y': spec.get('y', 'total_kw' if kind == 'towt' else 'total_kwh')}
+    if kind == 'changepoint':
+        out['model'] = spec.get('model', '5P')
+        out['per_day'] = bool(spec.get('per_day', False))
+        if out['model'] not in MODEL_TYPES:
+            raise ValueError(f"model must be one of {', '.join(MODEL_TYPES)}")
+    if 'reporting' in spec:
+        out['reporting'] = os.path.abspath(spec['reporting'])
+    return out
+
+
+def fit_key(spec, digest):
+    """Hash of the fit request with the training file replaced by its content hash."""
+    keyed = {k: v for k, v in spec.items() if k not in ('file', 'reporting')}
+    keyed['data'] = digest
+    return hashlib.blake2b(json.dumps(keyed, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+# --- Request handling ------------------------------------------------------------
+
+async def cached(state, cache, key, submit):
+    """Value for key: the LRU cache, an in-flight job for the same key, or a new job.
+
+    submit() starts the job and returns an awaitable. Returns (value,
+    source) with source 'cache', 'coalesced' or 'computed'.
+    """
+    value = lru_get(state[cache], key)
+    if value is not None:
+        return value, 'cache'
+    pending = state['inflight'].get(key)
+    if pending is not None:
+        state['coalesced'] += 1
+        return await asyncio.shield(pending), 'coalesced'
+    future = asyncio.ensure_future(submit())
+    state['inflight'][key] = future
+    try:
+        value = await asyncio.shield(future)
+    finally:
+        del state['inflight'][key]
+    lru_put(state[cache], key, value)
+    return value, 'computed'
+
+
+async def get_model(state, spec):
+    """(key, model, source) for a fit request; fits run in the process pool."""
+    digest = file_digest(state, spec['file'])
+    key = fit_key(spec, digest)
+
+    def submit():
+        state['fits'] += 1
+        return asyncio.get_running_loop().run_in_executor(state['pool'], _fit, spec, digest)
+    try:
+        model, source = await cached(state, 'models', key, submit)
+    except BrokenProcessPool:
+        # a worker died (e.g. out of memory): fail this request, replace the pool for the next
+        state['pool'].shutdown(wait=False, cancel_futures=True)
+        state['pool'] = new_pool(state['workers'])
+        raise
+    return key, model, source
+
+
+async def handle_fit(state, body):
+    spec = validate(body)
+    key, model, source = await get_model(state, spec)
+    return {'key': key, 'source': source, **_summary(model)}
+
+
+async def handle_predict(state, body):
+    spec = validate(body)
+    if 'reporting' not in spec:
+        raise ValueError('missing "reporting"')
+    key, model, source = await get_model(state, spec)
+    digest = file_digest(state, spec['reporting'])
+    result, _ = await cached(state, 'predictions', f'{key}:{digest}', lambda: asyncio.get_running_loop(
+        ).run_in_executor(None, _predict, spec, model, digest))
+    return {'key': key, 'source': source, **result}
+
+
+def latency_stats(state):
+    out = {}
+    for path, samples in state['latency'].items():
+        ms = np.fromiter(samples, dtype=float)
+        p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+        out[path] = {'count': state['requests'][path], 'p50_ms': p50, 'p90_ms': p90, 'p99_ms': p99,
+                     'max_ms': float(ms.max())}
+    return out
+
+
+def handle_stats(state, body=None):
+    caches = {name: {k: state[name][k] for k in ('hits', 'misses', 'size')} | {'entries': len(state[name]['items'])}
+              for name in ('models', 'predictions')}
+    return {'latency': latency_stats(state), 'caches': caches, 'fits': state['fits'],
+            'coalesced': state['coalesced'], 'in_flight': len(state['inflight']),
+            'uptime_s': time.monotonic() - state['started']}
+
+
+ROUTES = {
+    ('POST', '/fit'): handle_fit,
+    ('POST', '/predict'): handle_predict,
+    ('GET', '/stats'): handle_stats,
+    ('GET', '/health'): lambda state, body=None: {'status': 'ok'},
+}
+
+
+async def dispatch(state, method, path, body):
+    """(status, payload) for one request."""
+    handler = ROUTES.get((method, path))
+    if handler is None:
+        return 404, {'error': f'no route for {method} {path}'}
+    try:
+        result = handler(state, body)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return 200, result
+    except (ValueError, KeyError, OSError) as e:
+        return 400, {'error': str(e)}
+    except Exception as e:  # a failed fit must not take the server down
+        return 500, {'error': f'{type(e).__name__}: {e}'}
+
+
+async def handle_connection(state, reader, writer):
+    """HTTP/1.1 with keep-alive: request line, headers, Content-Length JSON body."""
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            t0 = time.perf_counter()
+            method, target, version = line.decode('latin-1').split()
+            headers = {}
+            while (h := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = h.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            raw = await reader.readexactly(int(headers.get('content-length', 0)))
+            path = target.split('?', 1)[0]
+            try:
+                body = json.loads(raw) if raw else {}
+            except json.JSONDecodeError as e:
+                status, payload = 400, {'error': f'invalid JSON: {e}'}
+            else:
+                status, payload = await dispatch(state, method, path, body)
+            data = json.dumps(payload, default=float).encode()
+            close = headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+            writer.write(f'HTTP/1.1 {status} {STATUS[status]}\r\nContent-Type: application/json\r\n'
+                         f'Content-Length: {len(data)}\r\n{"Connection: close" + chr(13) + chr(10) if close else ""}'
+                         '\r\n'.encode() + data)
+            await writer.drain()
+            if (method, path) in ROUTES:
+                state['latency'].setdefault(path, deque(maxlen=LATENCY_WINDOW)).append(
+                    (time.perf_counter() - t0) * 1000)
+                state['requests'][path] = state['requests'].get(path, 0) + 1
+            if close:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+def new_pool(workers=None):
+    # spawn, not fork: forked workers would inherit open client sockets
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def new_state(workers=None, cache_size=128):
+    return {
+        'pool': new_pool(workers),
+        'workers': workers,
+        'models': new_lru(cache_size),
+        'predictions': new_lru(cache_size * 4),
+        'digests': {},
+        'inflight': {},
+        'latency': {},
+        'requests': {},
+        'fits': 0,
+        'coalesced': 0,
+        'started': time.monotonic(),
+    }
+
+
+async def serve(host, port, workers=None, cache_size=128, ready=None):
+    state = new_state(workers, cache_size)
+    server = await asyncio.start_server(functools.partial(handle_connection, state), host, port)
+    try:
+        if ready is not None:
+            ready.set_result(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+    finally:
+        state['pool'].shutdown(cancel_futures=True)
+
+
+# --- Benchmark client --------------------------------------------------------------
+
+async def request(host, port, method, path, body=None):
+    """One JSON request on a fresh connection; returns (status, payload)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    data = json.dumps(body).encode() if body is not None else b''
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (h := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = h.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    payload = json.loads(await reader.readexactly(length))
+    writer.close()
+    return status, payload
+
+
+async def bench(n, workers, cache_size):
+    """Start a server and send n mixed /predict requests in two concurrent waves."""
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    server = asyncio.create_task(serve('127.0.0.1', 0, workers, cache_size, ready))
+    port = await ready
+    towt = {'kind': 'towt', 'file': BASELINE_HOURLY, 'y': 'total_kw', 'reporting': REPORTING_HOURLY}
+    specs = [towt, {**towt, 'y': 'cooling_kw'}, {**towt, 'y': 'fan_kw'}]
+    t0 = time.perf_counter()
+    results = []
+    for wave in (n // 2, n - n // 2):   # the second wave is served from the caches
+        results += await asyncio.gather(*(request('127.0.0.1', port, 'POST', '/predict', specs[i % len(specs)])
+                                          for i in range(wave)))
+    elapsed = time.perf_counter() - t0
+    _, stats = await request('127.0.0.1', port, 'GET', '/stats')
+    server.cancel()
+    try:
+        await server
+    except asyncio.CancelledError:
+        pass
+    return elapsed, results, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local M&V fitting service')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port (default: 8765)')
+    parser.add_argument('--workers', type=int, default=None, help='Fit processes (default: CPU count)')
+    parser.add_argument('--cache-size', type=int, default=128, help='Fitted models kept (default: 128)')
+    parser.add_argument('--bench', type=int, default=None, help='Run N concurrent requests against a local server')
+    args = parser.parse_args()
+
+    if args.bench is None:
+        print(f"Serving M&V fits on http://{args.host}:{args.port} (POST /fit, /predict; GET /stats, /health)")
+        try:
+            asyncio.run(serve(args.host, args.port, args.workers, args.cache_size))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    elapsed, results, stats = asyncio.run(bench(args.bench, args.workers, args.cache_size))
+    print("=" * 66)
+    print(f"M&V SERVICE BENCHMARK — {args.bench} /predict requests in two concurrent waves")
+    print("=" * 66)
+    print(f"  Wall time: {elapsed:.2f} s;  fits run: {stats['fits']};  coalesced: {stats['coalesced']};"
+          f"  errors: {sum(status != 200 for status, _ in results)}")
+    seen = {}
+    for status, payload in results:
+        if status == 200:
+            seen.setdefault(payload['key'], payload)
+    for payload in seen.values():
+        print(f"  {payload['key'][:12]}  savings {payload['savings']:>12,.0f} of {payload['adjusted_baseline']:>12,.0f}"
+              f" kWh ({payload['savings_fraction'] * 100:.1f}%)")
+    print()
+    for path, s in stats['latency'].items():
+        print(f"  {path:<10} n={s['count']:<6} p50 {s['p50_ms']:>8.1f} ms  p90 {s['p90_ms']:>8.1f} ms"
+              f"  p99 {s['p99_ms']:>8.1f} ms")
+    for name, c in stats['caches'].items():
+        print(f"  {name} cache: {c['entries']} entries, {c['hits']} hits, {c['misses']} misses")
+
+
+if __name__ == '__main__':
+    main()
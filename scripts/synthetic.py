@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Synthetic Building Portfolio
+
+Generates N buildings from the Greenfield hourly end-use shapes, each
+with a baseline year and a reporting year and a known answer:
+- Size: every end use scaled by a lognormal factor; the data-center
+  share is drawn separately
+- Schedule: lighting, plug and fan profiles shifted by up to +/-2 hours
+- Weather: a per-building, per-year temperature offset; cooling and the
+  unmetered (heating) residual respond through hinge slopes estimated
+  from the template
+- ECMs: lighting, cooling and fan savings fractions applied in the
+  reporting year (some buildings get none)
+- Non-routine events: a step in plug load at a random reporting-year hour
+- Hourly multiplicative noise
+
+Ground truth per building: the reporting-year counterfactual (no ECMs, no
+event), the true ECM savings and the true non-routine energy.
+
+Buildings are generated in batches as (buildings x hours) arrays, with
+no per-building Python loop, and streamed into float32 .npy files opened
+with np.lib.format.open_memmap:
+
+    <prefix>_baseline.npy, <prefix>_reporting.npy   (N, hours, columns)
+    <prefix>_truth.csv                               parameters + ground truth
+    <prefix>_meta.json                               columns, first timestamp, step
+
+Usage:
+    python synthetic.py --buildings 100 --output /tmp/portfolio
+    python synthetic.py --buildings 10000 --output /tmp/portfolio --batch 128
+    python synthetic.py --buildings 5 --output /tmp/portfolio --csv-dir /tmp/portfolio_csv
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from interval_data import BASELINE_HOURLY, REPORTING_HOURLY, column, read_interval_csv
+from interval_qc import interval_minutes
+
+END_USES = ('lighting_kw', 'cooling_kw', 'fan_kw', 'plug_kw', 'datacenter_kw')
+COLUMNS = ('total_kw',) + END_USES + ('oat_f',)
+SHIFTED = ('lighting_kw', 'fan_kw', 'plug_kw')
+ECM_RANGES = {'lighting_kw': (0.20, 0.45), 'cooling_kw': (0.0, 0.20), 'fan_kw': (0.15, 0.40)}
+COOL_BALANCE = 60.0
+HEAT_BALANCE = 55.0
+
+TRUTH_DTYPE = np.dtype([
+    ('building', 'i4'), ('size', 'f4'), ('datacenter_share', 'f4'), ('shift_h', 'i2'),
+    ('offset_base_f', 'f4'), ('offset_rep_f', 'f4'), ('noise', 'f4'),
+    ('ecm_lighting', 'f4'), ('ecm_cooling', 'f4'), ('ecm_fan', 'f4'),
+    ('nre_kw', 'f4'), ('nre_onset_h', 'i4'),
+    ('baseline_kwh', 'f8'), ('counterfactual_kwh', 'f8'), ('reporting_kwh', 'f8'),
+    ('savings_kwh', 'f8'), ('nre_kwh', 'f8'),
+])
+
+
+def _hinge_slope(load, hinge):
+    """Least-squares slope of load on a hinge term (with intercept)."""
+    h = hinge - hinge.mean()
+    return float((h * (load - load.mean())).sum() / (h * h).sum())
+
+
+def load_template(path=BASELINE_HOURLY, reporting_path=REPORTING_HOURLY):
+    """End-use shapes, weather and temperature slopes of the template building.
+
+    Reporting-year timestamps are taken from `reporting_path`.
+    """
+    data = read_interval_csv(path, columns=('total_kw',) + END_USES + ('oat_f',))
+    rep_ts = read_interval_csv(reporting_path, columns=['oat_f'])['timestamps']
+    if len(rep_ts) != len(data['timestamps']):
+        raise ValueError('template baseline and reporting years differ in length')
+    loads = data['values'][:, 1:1 + len(END_USES)]
+    oat = column(data, 'oat_f')
+    unmetered = np.maximum(column(data, 'total_kw') - loads.sum(axis=1), 0.0)
+    cooling = loads[:, END_USES.index('cooling_kw')]
+    return {
+        'timestamps': data['timestamps'],
+        'reporting_timestamps': rep_ts,
+        'step': interval_minutes(data['timestamps']),
+        'oat': oat,
+        'loads': loads,
+        'unmetered': unmetered,
+        'cool_slope': max(_hinge_slope(cooling, np.maximum(oat - COOL_BALANCE, 0)), 0.0),
+        'heat_slope': max(_hinge_slope(unmetered, np.maximum(HEAT_BALANCE - oat, 0)), 0.0),
+    }
+
+
+def draw_buildings(n, rng, start=0, hours=8760):
+    """Random building parameters (a TRUTH_DTYPE array; truth columns still zero)."""
+    p = np.zeros(n, dtype=TRUTH_DTYPE)
+    p['building'] = start + np.arange(n)
+    p['size'] = rng.lognormal(0.0, 0.5, n)
+    p['datacenter_share'] = rng.uniform(0.0, 1.0, n) * (rng.random(n) < 0.5)
+    p['shift_h'] = rng.integers(-2, 3, n)
+    p['offset_base_f'] = rng.normal(0.0, 3.0, n)
+    p['offset_rep_f'] = rng.normal(0.0, 3.0, n)
+    p['noise'] = rng.uniform(0.02, 0.08, n)
+    has_ecm = rng.random(n) < 0.85
+    for name, field in (('lighting_kw', 'ecm_lighting'), ('cooling_kw', 'ecm_cooling'), ('fan_kw', 'ecm_fan')):
+        lo, hi = ECM_RANGES[name]
+        p[field] = rng.uniform(lo, hi, n) * has_ecm
+    has_nre = rng.random(n) < 0.3
+    p['nre_kw'] = p['size'] * rng.uniform(5.0, 30.0, n) * has_nre
+    p['nre_onset_h'] = np.where(has_nre, rng.integers(hours // 6, hours - hours // 6, n), hours)
+    return p
+
+
+def _year(template, p, offset, rng):
+    """(B, hours, end uses) loads for one year, before ECMs and events; plus oat and unmetered."""
+    n = len(template['oat'])
+    B = len(p)
+    loads = np.broadcast_to(template['loads'], (B,) + template['loads'].shape).copy()
+    # Schedule shift: gather each building's rolled hours in one fancy index
+    rolled = (np.arange(n)[None, :] - p['shift_h'][:, None].astype(np.int64)) % n
+    for name in SHIFTED:
+        j = END_USES.index(name)
+        loads[:, :, j] = template['loads'][rolled, j]
+    oat = template['oat'][None, :] + offset[:, None]
+    t0 = template['oat'][None, :]
+    j = END_USES.index('cooling_kw')
+    loads[:, :, j] += template['cool_slope'] * (np.maximum(oat - COOL_BALANCE, 0) - np.maximum(t0 - COOL_BALANCE, 0))
+    unmetered = template['unmetered'][None, :] + template['heat_slope'] * (
+        np.maximum(HEAT_BALANCE - oat, 0) - np.maximum(HEAT_BALANCE - t0, 0))
+    loads[:, :, END_USES.index('datacenter_kw')] *= p['datacenter_share'][:, None]
+    scale = p['size'][:, None, None]
+    noise = np.exp(p['noise'][:, None, None] * rng.standard_normal((B, n, 1)))
+    loads = np.maximum(loads, 0.0) * scale * noise
+    unmetered = np.maximum(unmetered, 0.0) * scale[:, :, 0] * noise[:, :, 0]
+    return loads, oat, unmetered
+
+
+def _assemble(loads, oat, unmetered):
+    """(B, hours, len(COLUMNS)) float32 block: total, end uses, oat."""
+    out = np.empty(loads.shape[:2] + (len(COLUMNS),), dtype=np.float32)
+    out[:, :, 0] = loads.sum(axis=2) + unmetered
+    out[:, :, 1:1 + len(END_USES)] = loads
+    out[:, :, -1] = oat
+    return out
+
+
+def generate_batch(template, p, rng):
+    """Baseline and reporting blocks for a batch of buildings; fills the truth fields of `p`."""
+    hours = template['step'] / 60
+    n = len(template['oat'])
+    base_loads, base_oat, base_unmetered = _year(template, p, p['offset_base_f'], rng)
+    base = _assemble(base_loads, base_oat, base_unmetered)
+
+    cf_loads, rep_oat, rep_unmetered = _year(template, p, p['offset_rep_f'], rng)
+    counterfactual = cf_loads.sum(axis=2) + rep_unmetered
+    saved = np.zeros_like(counterfactual)
+    rep_loads = cf_loads                  # edited in place; the counterfactual total is already taken
+    for name, field in (('lighting_kw', 'ecm_lighting'), ('cooling_kw', 'ecm_cooling'), ('fan_kw', 'ecm_fan')):
+        j = END_USES.index(name)
+        cut = cf_loads[:, :, j] * p[field][:, None]
+        saved += cut
+        rep_loads[:, :, j] -= cut
+    event = (np.arange(n)[None, :] >= p['nre_onset_h'][:, None]) * p['nre_kw'][:, None]
+    rep_loads[:, :, END_USES.index('plug_kw')] += event
+    rep = _assemble(rep_loads, rep_oat, rep_unmetered)
+
+    p['baseline_kwh'] = base[:, :, 0].sum(axis=1, dtype=np.float64) * hours
+    p['counterfactual_kwh'] = counterfactual.sum(axis=1) * hours
+    p['reporting_kwh'] = rep[:, :, 0].sum(axis=1, dtype=np.float64) * hours
+    p['savings_kwh'] = saved.sum(axis=1) * hours
+    p['nre_kwh'] = event.sum(axis=1) * hours
+    return base, rep
+
+
+def write_interval_csv(path, timestamps, columns, values, float_fmt='%.2f'):
+    """Write one building-year in the interval CSV layout read by interval_data."""
+    ts = np.char.replace(np.datetime_as_string(timestamps, unit='m'), 'T', ' ')
+    body = np.char.mod(float_fmt, values)
+    with open(path, 'w') as f:
+        f.write(','.join(('datetime',) + tuple(columns)) + '\n')
+        f.write('\n'.join(t + ',' + ','.join(row) for t, row in zip(ts, body)) + '\n')
+
+
+def generate_portfolio(prefix, n_buildings, seed=0, batch=64, template=None, csv_dir=None, csv_limit=10):
+    """Stream a synthetic portfolio to disk; returns the truth table.
+
+    csv_dir: also write the first `csv_limit` buildings as interval CSVs
+    (b<id>_baseline.csv / b<id>_reporting.csv) for the single-site scripts.
+    """
+    template = template or load_template()
+    rng = np.random.default_rng(seed)
+    n = len(template['oat'])
+    shape = (n_buildings, n, len(COLUMNS))
+    base_out = np.lib.format.open_memmap(f'{prefix}_baseline.npy', mode='w+', dtype=np.float32, shape=shape)
+    rep_out = np.lib.format.open_memmap(f'{prefix}_reporting.npy', mode='w+', dtype=np.float32, shape=shape)
+    truth = np.zeros(n_buildings, dtype=TRUTH_DTYPE)
+    if csv_dir:
+        os.makedirs(csv_dir, exist_ok=True)
+    for start in range(0, n_buildings, batch):
+        p = draw_buildings(min(batch, n_buildings - start), rng, start, n)
+        base, rep = generate_batch(template, p, rng)
+        base_out[start:start + len(p)] = base
+        rep_out[start:start + len(p)] = rep
+        truth[start:start + len(p)] = p
+        if csv_dir:
+            for i in range(max(0, min(len(p), csv_limit - start))):
+                b = int(p['building'][i])
+                write_interval_csv(os.path.join(csv_dir, f'b{b:05d}_baseline.csv'),
+                                   template['timestamps'], COLUMNS, base[i])
+                write_interval_csv(os.path.join(csv_dir, f'b{b:05d}_reporting.csv'),
+                                   template['reporting_timestamps'], COLUMNS, rep[i])
+    base_out.flush()
+    rep_out.flush()
+    del base_out, rep_out
+
+    with open(f'{prefix}_truth.csv', 'w') as f:
+        f.write(','.join(TRUTH_DTYPE.names) + '\n')
+        for row in truth.tolist():
+            f.write(','.join(f'{v:.6g}' if isinstance(v, float) else str(v) for v in row) + '\n')
+    with open(f'{prefix}_meta.json', 'w') as f:
+        json.dump({'columns': list(COLUMNS), 'n_buildings': n_buildings, 'hours': n,
+                   'step_minutes': int(template['step']), 'seed': seed,
+                   'baseline_start': str(template['timestamps'][0]),
+                   'reporting_start': str(template['reporting_timestamps'][0])}, f, indent=2)
+    return truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic building portfolio generator')
+    parser.add_argument('--buildings', type=int, default=100, help='Number of buildings (default: 100)')
+    parser.add_argument('--output', type=str, required=True, help='Output prefix (e.g. /tmp/portfolio)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--batch', type=int, default=64, help='Buildings per batch (default: 64)')
+    parser.add_argument('--csv-dir', type=str, default=None, help='Also write the first buildings as CSVs')
+    parser.add_argument('--csv-limit', type=int, default=10, help='Buildings written with --csv-dir (default: 10)')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    truth = generate_portfolio(args.output, args.buildings, args.seed, args.batch,
+                               csv_dir=args.csv_dir, csv_limit=args.csv_limit)
+    elapsed = time.perf_counter() - t0
+
+    size = sum(os.path.getsize(f'{args.output}_{part}.npy') for part in ('baseline', 'reporting'))
+    print("=" * 60)
+    print("SYNTHETIC PORTFOLIO")
+    print("=" * 60)
+    print(f"  Buildings:          {args.buildings:,} ({2 * args.buildings:,} building-years)")
+    print(f"  Written:            {size / 1e9:.2f} GB in {elapsed:.1f} s"
+          f" ({2 * args.buildings / elapsed:,.0f} building-years/s)")
+    print(f"  Files:              {args.output}_{{baseline,reporting}}.npy, _truth.csv, _meta.json")
+    print()
+    frac = truth['savings_kwh'] / truth['counterfactual_kwh']
+    print(f"  Baseline energy:    median {np.median(truth['baseline_kwh']):,.0f} kWh/yr")
+    print(f"  True ECM savings:   median {np.median(frac) * 100:.1f}%"
+          f" (range {frac.min() * 100:.1f}-{frac.max() * 100:.1f}%)")
+    print(f"  Non-routine events: {int((truth['nre_kwh'] > 0).sum())} buildings,"
+          f" median {np.median(truth['nre_kwh'][truth['nre_kwh'] > 0]) if (truth['nre_kwh'] > 0).any() else 0:,.0f} kWh")
+
+
+if __name__ == '__main__':
+    main()
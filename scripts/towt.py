@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Time-of-Week-and-Temperature (TOWT) Hourly Baseline
+
+The LBNL hourly baseline model used for the interval-data path:
+- One coefficient per time-of-week bin (168 for hourly data)
+- Piecewise-linear temperature response between fixed knots
+- Separate temperature slopes for occupied and unoccupied bins; a bin is
+  occupied when the load sits above a temperature-only fit in at least
+  65% of its hours
+
+The whole design is built once and solved with regression.fit_ols, so
+every prediction carries the same Cholesky factor the other models use.
+
+Usage:
+    python towt.py
+    python towt.py --y plug_kw --knots 45,60,75
+"""
+import argparse
+
+import numpy as np
+
+from calendar_features import MINUTES_PER_WEEK, calendar_features
+from interval_data import BASELINE_HOURLY, REPORTING_HOURLY, column, read_interval_csv
+from interval_qc import interval_minutes, interval_months
+from regression import fit_ols, g14_metrics, predict
+
+DEFAULT_KNOTS = (40.0, 55.0, 65.0, 80.0, 90.0)
+OCCUPIED_SHARE = 0.65
+
+
+def temperature_basis(oat, knots):
+    """Piecewise-linear segments: the columns sum to T, one slope per segment."""
+    t = np.asarray(oat, dtype=float)[:, None]
+    knots = np.asarray(knots, dtype=float)
+    if knots.size == 0:
+        return t.copy()
+    width = np.append(np.diff(knots), np.inf)
+    return np.hstack([np.minimum(t, knots[0]), np.clip(t - knots, 0.0, width)])
+
+
+def usable_knots(oat, knots=DEFAULT_KNOTS, min_points=10):
+    """Drop knots whose neighbouring segments would have too few training points."""
+    t = np.sort(np.asarray(oat, dtype=float))
+    kept = []
+    for k in knots:
+        below = np.searchsorted(t, k) - (np.searchsorted(t, kept[-1]) if kept else 0)
+        above = t.size - np.searchsorted(t, k)
+        if below >= min_points and above >= min_points:
+            kept.append(float(k))
+    return tuple(kept)
+
+
+def _tow(timestamps, step):
+    return calendar_features(timestamps, step)['tow']
+
+
+def occupancy(tow, load, oat, knots, n_bins):
+    """Occupied flag per time-of-week bin from a temperature-only fit."""
+    basis = temperature_basis(oat, knots)
+    X = np.column_stack([np.ones(len(load)), basis])
+    above = fit_ols(X, load)['residuals'] > 0
+    share = np.bincount(tow, above, minlength=n_bins) / np.maximum(np.bincount(tow, minlength=n_bins), 1)
+    return share >= OCCUPIED_SHARE
+
+
+def towt_design(tow, oat, occupied, knots, n_bins):
+    """Design matrix: time-of-week indicators, occupied and unoccupied temperature segments."""
+    n = len(tow)
+    X_tow = np.zeros((n, n_bins))
+    X_tow[np.arange(n), tow] = 1.0
+    basis = temperature_basis(oat, knots)
+    occ = occupied[tow][:, None]
+    if occupied.all() or not occupied.any():
+        return np.hstack([X_tow, basis])
+    return np.hstack([X_tow, basis * occ, basis * ~occ])
+
+
+def fit_towt(timestamps, load, oat, knots=DEFAULT_KNOTS, mask=None, step=None):
+    """Fit a TOWT model; returns a model dict for predict_towt.
+
+    mask: optional QC row mask (see interval_qc.row_mask). Every
+    time-of-week bin must appear in the (unmasked) training data.
+    """
+    if step is None:
+        step = interval_minutes(timestamps)
+    n_bins = MINUTES_PER_WEEK // step
+    load = np.asarray(load, dtype=float)
+    oat = np.asarray(oat, dtype=float)
+    use = ~(np.isnan(load) | np.isnan(oat))
+    if mask is not None:
+        use &= np.asarray(mask, dtype=bool)
+    tow = _tow(timestamps, step)
+    if np.bincount(tow[use], minlength=n_bins).min() == 0:
+        raise ValueError('training data must cover every time-of-week bin')
+
+    knots = usable_knots(oat[use], knots)
+    occupied = occupancy(tow[use], load[use], oat[use], knots, n_bins)
+    X = towt_design(tow[use], oat[use], occupied, knots, n_bins)
+    fit = fit_ols(X, load[use])
+    model = {
+        'model_type': 'TOWT',
+        'step': int(step),
+        'knots': list(knots),
+        'occupied': occupied,
+        'fit': fit,
+    }
+    model['g14'] = g14_metrics(load[use], fit['y_hat'], X.shape[1], resolution='hourly')
+    return model
+
+
+def predict_towt(model, timestamps, oat):
+    """Model prediction for new timestamps and temperatures."""
+    step = model['step']
+    n_bins = MINUTES_PER_WEEK // step
+    X = towt_design(_tow(timestamps, step), oat, np.asarray(model['occupied'], dtype=bool),
+                    model['knots'], n_bins)
+    return X @ model['fit']['beta']
+
+
+def predict_band(model, timestamps, oat, confidence=0.90):
+    """Hourly predictions with confidence and prediction intervals (see regression.predict)."""
+    step = model['step']
+    X = towt_design(_tow(timestamps, step), oat, np.asarray(model['occupied'], dtype=bool),
+                    model['knots'], MINUTES_PER_WEEK // step)
+    return predict(model['fit'], X, confidence)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time-of-week-and-temperature hourly baseline')
+    parser.add_argument('--baseline', type=str, default=BASELINE_HOURLY, help='Baseline hourly CSV')
+    parser.add_argument('--reporting', type=str, default=REPORTING_HOURLY, help='Reporting hourly CSV')
+    parser.add_argument('--y', type=str, default='total_kw', help='Load column (default: total_kw)')
+    parser.add_argument('--knots', type=str, default=None, help='Comma-separated temperature knots (F)')
+    args = parser.parse_args()
+
+    knots = tuple(float(k) for k in args.knots.split(',')) if args.knots else DEFAULT_KNOTS
+    base = read_interval_csv(args.baseline, columns=[args.y, 'oat_f'])
+    model = fit_towt(base['timestamps'], column(base, args.y), column(base, 'oat_f'), knots)
+    rep = read_interval_csv(args.reporting, columns=[args.y, 'oat_f'])
+    pred = predict_towt(model, rep['timestamps'], column(rep, 'oat_f'))
+    actual = column(rep, args.y)
+
+    g = model['g14']
+    print("=" * 60)
+    print(f"TOWT MODEL — {args.y}")
+    print("=" * 60)
+    print(f"  Knots (F):       {', '.join(f'{k:g}' for k in model['knots'])}")
+    print(f"  Occupied bins:   {int(model['occupied'].sum())} of {len(model['occupied'])}")
+    print(f"  Parameters:      {model['fit']['p']}")
+    print()
+    print("  ASHRAE Guideline 14 (hourly):")
+    print(f"    NMBE      = {g['nmbe']:7.2f}%   (limit +/-10%)")
+    print(f"    CV(RMSE)  = {g['cvrmse']:7.2f}%   (limit 30%)")
+    print(f"    R^2       = {g['r_squared']:7.4f}")
+    print(f"    Result:     {'PASS' if g['passes'] else 'FAIL'}")
+    print()
+
+    step = model['step']
+    months = interval_months(rep['timestamps'], step)
+    labels, idx = np.unique(months, return_inverse=True)
+    hours = step / 60
+    pred_kwh = np.bincount(idx, pred) * hours
+    actual_kwh = np.bincount(idx, actual) * hours
+    print(f"  {'Month':<8} {'Pred kWh':>10} {'Actual':>10} {'Savings':>9}")
+    print("  " + "-" * 40)
+    for label, p_, a_ in zip(labels, pred_kwh, actual_kwh):
+        print(f"  {str(label):<8} {p_:>10,.0f} {a_:>10,.0f} {p_ - a_:>9,.0f}")
+    print("  " + "-" * 40)
+    print(f"  {'TOTAL':<8} {pred_kwh.sum():>10,.0f} {actual_kwh.sum():>10,.0f}"
+          f" {pred_kwh.sum() - actual_kwh.sum():>9,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Cumulative Savings Tracker (CUSUM / EWMA)
+
+Monthly client reporting without recomputing from the raw files:
+1. --init fits the hourly TOWT baseline and stores it with the tracker
+   state (running sums, control-chart statistics, limits) in one .npz file
+2. Each run ingests only the rows newer than the last one seen, rolls
+   them up to days (an incomplete last day is carried in the state) and
+   updates the charts in O(new rows)
+3. Alerts fire when a chart crosses its limit or cumulative savings leave
+   the contracted band (target +/- band, as a fraction of the baseline)
+
+Rows with a missing reading or temperature are skipped (and counted), so
+a gap never enters the charts. Daily savings are compared with the
+contracted target and standardized by the baseline's daily residual
+sigma. The tabular CUSUM uses the Lindley form
+C_t = S_t - min(0, min S_j), so a whole batch of days is two cumulative
+sums, not a Python loop.
+
+Usage:
+    python tracker.py --init --target 0.10 --band 0.05
+    python tracker.py --until 2025-04-01
+    python tracker.py
+"""
+import argparse
+import os
+
+import numpy as np
+
+from calendar_features import EPOCH
+from interval_data import BASELINE_HOURLY, REPORTING_HOURLY, column, iter_interval_csv, read_interval_csv
+from interval_qc import interval_minutes
+from towt import fit_towt, predict_towt
+
+DEFAULT_STATE = 'tracker_state.npz'
+CHARTS = ('cusum_low', 'cusum_high', 'ewma_low', 'ewma_high', 'band_low', 'band_high')
+
+
+def _days(timestamps, step):
+    """Interval-ending timestamps -> day number since the epoch (24:00 belongs to the day before)."""
+    return ((timestamps - np.timedelta64(step, 'm')).astype('datetime64[D]')
+            - np.datetime64('1970-01-01', 'D')).astype(np.int64)
+
+
+def daily_sigma(model, timestamps, load, oat):
+    """Standard deviation of the baseline's daily residual totals (kWh)."""
+    step = model['step']
+    resid = (load - predict_towt(model, timestamps, oat)) * step / 60
+    day = _days(timestamps, step)
+    _, idx, counts = np.unique(day, return_inverse=True, return_counts=True)
+    totals = np.bincount(idx, resid)
+    full = counts == counts.max()
+    return float(totals[full].std(ddof=1))
+
+
+def init_state(model, sigma, target=0.10, band=0.05, k=0.5, h=5.0, lam=0.2, L=3.0):
+    """Fresh tracker state around a fitted TOWT model."""
+    return {
+        'model': model,
+        'sigma': sigma, 'target': target, 'band': band,
+        'k': k, 'h': h, 'lam': lam, 'L': L,
+        'last_minute': np.iinfo(np.int64).min,
+        'rows': 0, 'skipped': 0, 'days': 0,
+        'closed_pred': 0.0, 'closed_actual': 0.0,    # kWh over closed days
+        'open_day': -1, 'open_pred': 0.0, 'open_actual': 0.0,
+        'cusum_low': 0.0, 'cusum_high': 0.0, 'ewma': 0.0,
+        'alarm': np.zeros(len(CHARTS), dtype=bool),
+    }
+
+
+def _lindley(x, c0):
+    """W_t = max(0, W_{t-1} + x_t) for every t at once."""
+    s = c0 + np.cumsum(x)
+    return s - np.minimum(np.minimum.accumulate(s), 0.0)
+
+
+def _ewma(x, lam, z0, block=64):
+    """z_t = lam x_t + (1 - lam) z_{t-1}, vectorized in blocks small enough to stay stable."""
+    out = np.empty_like(x)
+    decay = 1 - lam
+    for start in range(0, len(x), block):
+        seg = x[start:start + block]
+        powers = decay ** np.arange(1, len(seg) + 1)
+        out[start:start + len(seg)] = powers * (z0 + lam * np.cumsum(seg / powers))
+        z0 = out[start + len(seg) - 1]
+    return out
+
+
+def update(state, timestamps, actual, oat):
+    """Ingest interval rows; rows at or before the last one seen are ignored.
+
+    Rows whose reading or temperature is missing are skipped and counted
+    in state['skipped'], so one NaN cannot poison the running charts.
+    Returns the list of new alerts ({'date', 'chart', 'value'}); `state`
+    is updated in place.
+    """
+    step = state['model']['step']
+    minutes = (timestamps - EPOCH).astype(np.int64)
+    new = minutes > state['last_minute']
+    if not new.any():
+        return []
+    timestamps, actual, oat = timestamps[new], np.asarray(actual)[new], np.asarray(oat)[new]
+    hours = step / 60
+    pred = predict_towt(state['model'], timestamps, oat) * hours
+    actual = actual * hours
+    state['last_minute'] = int(minutes[new][-1])
+    ok = np.isfinite(pred) & np.isfinite(actual)
+    state['rows'] += int(ok.sum())
+    state['skipped'] += int(ok.size - ok.sum())
+    if not ok.all():
+        timestamps, pred, actual = timestamps[ok], pred[ok], actual[ok]
+        if not ok.any():
+            return []
+
+    # Roll up to days, merging the carried-over open day
+    day = _days(timestamps, step)
+    starts = np.concatenate([[0], np.flatnonzero(day[1:] != day[:-1]) + 1])
+    day_pred = np.add.reduceat(pred, starts)
+    day_actual = np.add.reduceat(actual, starts)
+    day_id = day[starts]
+    if day_id[0] == state['open_day']:
+        day_pred[0] += state['open_pred']
+        day_actual[0] += state['open_actual']
+    elif state['open_day'] >= 0:
+        day_id = np.concatenate([[state['open_day']], day_id])
+        day_pred = np.concatenate([[state['open_pred']], day_pred])
+        day_actual = np.concatenate([[state['open_actual']], day_actual])
+    state['open_day'], state['open_pred'], state['open_actual'] = (
+        int(day_id[-1]), float(day_pred[-1]), float(day_actual[-1]))
+    day_id, day_pred, day_actual = day_id[:-1], day_pred[:-1], day_actual[:-1]
+    if day_id.size == 0:
+        return []
+
+    # Standardized deviation of each closed day's savings from the contracted target
+    d = ((day_pred - day_actual) - state['target'] * day_pred) / state['sigma']
+    k, h, lam = state['k'], state['h'], state['lam']
+    low = _lindley(-d - k, state['cusum_low'])
+    high = _lindley(d - k, state['cusum_high'])
+    z = _ewma(d, lam, state['ewma'])
+    z_limit = state['L'] * np.sqrt(lam / (2 - lam))
+
+    # Cumulative savings fraction at the end of each closed day
+    closed_pred = state['closed_pred'] + np.cumsum(day_pred)
+    closed_actual = state['closed_actual'] + np.cumsum(day_actual)
+    fraction = (closed_pred - closed_actual) / closed_pred
+
+    values = np.stack([low, high, z, z, fraction, fraction])
+    over = np.stack([low > h, high > h, z < -z_limit, z > z_limit,
+                     fraction < state['target'] - state['band'],
+                     fraction > state['target'] + state['band']])
+    previous = np.concatenate([state['alarm'][:, None], over[:, :-1]], axis=1)
+    alerts = []
+    for c, t in zip(*np.nonzero(over & ~previous)):
+        alerts.append({'date': np.datetime64(int(day_id[t]), 'D'), 'chart': CHARTS[c],
+                       'value': float(values[c, t])})
+    alerts.sort(key=lambda a: (a['date'], a['chart']))
+
+    state['alarm'] = over[:, -1]
+    state['cusum_low'], state['cusum_high'], state['ewma'] = float(low[-1]), float(high[-1]), float(z[-1])
+    state['closed_pred'], state['closed_actual'] = float(closed_pred[-1]), float(closed_actual[-1])
+    state['days'] += int(day_id.size)
+    return alerts
+
+
+def save_state(path, state):
+    """Write the tracker state (model included) to a single .npz file."""
+    model = state['model']
+    scalars = {key: np.asarray(value) for key, value in state.items() if key not in ('model', 'alarm')}
+    np.savez(path, alarm=state['alarm'], model_beta=model['fit']['beta'],
+             model_knots=np.asarray(model['knots'], dtype=float), model_occupied=model['occupied'],
+             model_step=np.asarray(model['step']), **scalars)
+
+
+def load_state(path):
+    """Read a state written by save_state."""
+    with np.load(path) as f:
+        state = {key: f[key].item() for key in f.files
+                 if not key.startswith('model_') and key != 'alarm'}
+        state['alarm'] = f['alarm'].copy()
+        state.setdefault('skipped', 0)                  # state files from before missing rows were counted
+        state['model'] = {
+            'model_type': 'TOWT',
+            'step': int(f['model_step']),
+            'knots': list(f['model_knots']),
+            'occupied': f['model_occupied'].copy(),
+            'fit': {'beta': f['model_beta'].copy()},
+        }
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cumulative savings tracker (CUSUM / EWMA)')
+    parser.add_argument('--state', type=str, default=DEFAULT_STATE, help=f'State file (default: {DEFAULT_STATE})')
+    parser.add_argument('--init', action='store_true', help='Fit the baseline and start a new state file')
+    parser.add_argument('--baseline', type=str, default=BASELINE_HOURLY, help='Baseline hourly CSV (--init)')
+    parser.add_argument('--file', type=str, default=REPORTING_HOURLY, help='Reporting hourly CSV to ingest')
+    parser.add_argument('--y', type=str, default='total_kw', help='Load column (default: total_kw)')
+    parser.add_argument('--target', type=float, default=0.10, help='Contracted savings fraction (default: 0.10)')
+    parser.add_argument('--band', type=float, default=0.05, help='Allowed +/- deviation (default: 0.05)')
+    parser.add_argument('--until', type=str, default=None, help='Ignore rows at or after this date')
+    args = parser.parse_args()
+
+    if args.init:
+        base = read_interval_csv(args.baseline, columns=[args.y, 'oat_f'])
+        ts, load, oat = base['timestamps'], column(base, args.y), column(base, 'oat_f')
+        model = fit_towt(ts, load, oat, step=interval_minutes(ts))
+        state = init_state(model, daily_sigma(model, ts, load, oat), args.target, args.band)
+        save_state(args.state, state)
+        print(f"  New tracker state: {args.state}")
+        print(f"  Baseline CV(RMSE) {model['g14']['cvrmse']:.2f}%, daily sigma {state['sigma']:,.0f} kWh")
+        return
+
+    if not os.path.exists(args.state):
+        parser.error(f"{args.state} not found; run with --init first")
+    state = load_state(args.state)
+    rows_before = state['rows']
+    until = np.datetime64(args.until, 'm') if args.until else None
+    seen = state['last_minute'] > np.iinfo(np.int64).min
+    last = EPOCH + np.timedelta64(state['last_minute'], 'm') if seen else None
+    alerts = []
+    for chunk in iter_interval_csv(args.file, columns=[args.y, 'oat_f']):
+        ts = chunk['timestamps']
+        if last is not None and ts[-1] <= last:
+            continue
+        keep = ts < until if until is not None else slice(None)
+        alerts += update(state, ts[keep], column(chunk, args.y)[keep], column(chunk, 'oat_f')[keep])
+    save_state(args.state, state)
+
+    total_pred = state['closed_pred'] + state['open_pred']
+    savings = total_pred - state['closed_actual'] - state['open_actual']
+    print("=" * 60)
+    print("SAVINGS TRACKER")
+    print("=" * 60)
+    print(f"  New rows:            {state['rows'] - rows_before:,}  (total {state['rows']:,})")
+    if state['skipped']:
+        print(f"  Skipped (missing):   {state['skipped']:,}")
+    print(f"  Closed days:         {state['days']}")
+    print(f"  Last reading:        {EPOCH + np.timedelta64(state['last_minute'], 'm')}")
+    print(f"  Cumulative savings:  {savings:,.0f} kWh ({savings / total_pred * 100:.1f}%"
+          f" vs target {state['target'] * 100:.0f} +/- {state['band'] * 100:.0f}%)")
+    print(f"  CUSUM low / high:    {state['cusum_low']:.2f} / {state['cusum_high']:.2f}  (h = {state['h']:g})")
+    print(f"  EWMA:                {state['ewma']:+.2f}")
+    print()
+    if not alerts:
+        print("  No new alerts.")
+    for a in alerts:
+        print(f"  ALERT {str(a['date'])}  {a['chart']:<11} {a['value']:+.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Variable-Base Degree-Day (VBDD) Regression
+
+Monthly models on degree days instead of avg_oat_f, with the balance
+points chosen by the regression:
+- HDD(b) = sum over the period's hours of max(b - T, 0) / 24, CDD likewise
+- Hourly temperatures are sorted once per billing period and prefix-summed,
+  so the degree days of every candidate balance point and every period
+  are a single searchsorted lookup: 100 balance points cost about one
+  pass over the hourly data
+- Every (heating, cooling) balance-point pair is scored from the same
+  table in one batched solve of the 3x3 normal equations; the winner is
+  refit with regression.fit_ols for standard errors and G14 statistics
+
+Usage:
+    python vbdd.py
+    python vbdd.py --y total_therms --model HDD
+    python vbdd.py --weights days --bp-min 40 --bp-max 75
+"""
+import argparse
+
+import numpy as np
+
+from interval_data import (BASELINE_HOURLY, BASELINE_MONTHLY, REPORTING_HOURLY, REPORTING_MONTHLY,
+                           column, read_interval_csv, read_monthly_csv)
+from interval_qc import interval_minutes, interval_months
+from regression import billing_weights, combine_weights, fit_ols, g14_metrics
+
+VBDD_MODELS = ('HDD', 'CDD', 'HDD+CDD')
+
+
+def _sorted_by_period(oat, period):
+    """Temperatures sorted within each period, plus period boundaries and prefix sums."""
+    t = np.asarray(oat, dtype=float)
+    period = np.asarray(period)
+    labels, idx = np.unique(period, return_inverse=True)
+    order = np.lexsort((t, idx))
+    ts = t[order]
+    counts = np.bincount(idx, minlength=labels.size)
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    prefix = np.concatenate([[0.0], np.cumsum(ts)])
+    return labels, ts, idx[order], bounds, prefix
+
+
+def degree_day_table(oat, period, balance_points, step=60):
+    """HDD and CDD of every period for every balance point.
+
+    oat: interval temperatures (F); period: label of each interval (e.g.
+    interval_qc.interval_months). Returns {'periods', 'balance_points',
+    'hdd', 'cdd'} with (n_periods, n_balance_points) tables in degree-days.
+    """
+    bp = np.asarray(balance_points, dtype=float)
+    labels, ts, pidx, bounds, prefix = _sorted_by_period(oat, period)
+    # One global searchsorted: offset each period's temperatures so periods never interleave
+    span = max(ts.max(), bp.max()) - min(ts.min(), bp.min()) + 1.0
+    base = min(ts.min(), bp.min())
+    keys = (ts - base) + pidx * span
+    queries = (bp[None, :] - base) + np.arange(labels.size)[:, None] * span
+    lo = np.searchsorted(keys, queries, side='left')           # first temp >= b
+    hi = np.searchsorted(keys, queries, side='right')          # first temp > b
+    start, end = bounds[:-1, None], bounds[1:, None]
+    per_day = 24 * 60 / step
+    hdd = ((lo - start) * bp[None, :] - (prefix[lo] - prefix[start])) / per_day
+    cdd = ((prefix[end] - prefix[hi]) - (end - hi) * bp[None, :]) / per_day
+    return {'periods': labels, 'balance_points': bp, 'hdd': hdd, 'cdd': cdd}
+
+
+def degree_days(oat, period, balance_point, kind, step=60):
+    """HDD or CDD per period at a single balance point."""
+    table = degree_day_table(oat, period, [balance_point], step)
+    return table['hdd' if kind == 'HDD' else 'cdd'][:, 0]
+
+
+def _design(model_type, hdd, cdd):
+    cols = [np.ones(len(hdd if hdd is not None else cdd))]
+    if model_type in ('HDD', 'HDD+CDD'):
+        cols.append(hdd)
+    if model_type in ('CDD', 'HDD+CDD'):
+        cols.append(cdd)
+    return np.column_stack(cols)
+
+
+def _grid_search(model_type, y, H, C, w, bp):
+    """Best balance point(s) by weighted SSE; slopes must be non-negative."""
+    sw, sy = w.sum(), (w * y).sum()
+    if model_type in ('HDD', 'CDD'):
+        D = H if model_type == 'HDD' else C
+        sx, sxx, sxy = w @ D, w @ D ** 2, (w * y) @ D
+        det = sw * sxx - sx ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = (sw * sxy - sx * sy) / det
+            icpt = (sy - slope * sx) / sw
+            sse = (w * y ** 2).sum() - icpt * sy - slope * sxy
+        ok = (det > 1e-10 * sw * np.maximum(sxx, 1e-300)) & (slope >= 0)
+        if not ok.any():
+            raise ValueError('no balance point with a positive slope')
+        j = int(np.argmin(np.where(ok, sse, np.inf)))
+        return (float(bp[j]),)
+
+    # All (heating i, cooling j) pairs with b_i <= b_j from one set of cross sums
+    sh, sc = w @ H, w @ C
+    shh, scc = w @ H ** 2, w @ C ** 2
+    shc = (H * w[:, None]).T @ C                                  # (n_bp, n_bp)
+    shy, scy = (w * y) @ H, (w * y) @ C
+    i, j = np.nonzero(bp[:, None] <= bp[None, :])
+    G = np.empty((i.size, 3, 3))
+    G[:, 0, 0] = sw
+    G[:, 0, 1] = G[:, 1, 0] = sh[i]
+    G[:, 0, 2] = G[:, 2, 0] = sc[j]
+    G[:, 1, 1] = shh[i]
+    G[:, 2, 2] = scc[j]
+    G[:, 1, 2] = G[:, 2, 1] = shc[i, j]
+    rhs = np.stack([np.full(i.size, sy), shy[i], scy[j]], axis=1)
+    ok = np.abs(np.linalg.det(G)) > 1e-9
+    beta = np.zeros((i.size, 3))
+    beta[ok] = np.linalg.solve(G[ok], rhs[ok][..., None])[..., 0]
+    sse = (w * y ** 2).sum() - np.einsum('ck,ck->c', beta, rhs)
+    ok &= (beta[:, 1:] >= 0).all(axis=1)
+    if not ok.any():
+        raise ValueError('no balance-point pair with non-negative slopes')
+    c = int(np.argmin(np.where(ok, sse, np.inf)))
+    return float(bp[i[c]]), float(bp[j[c]])
+
+
+def fit_vbdd(energy, table, model_type='HDD+CDD', days=None, per_day=True, weights=None,
+             mask=None, cov_type='classical'):
+    """Fit a VBDD model, choosing balance points from a degree_day_table.
+
+    per_day: model energy/day on degree-days/day (needs `days`), the usual
+    VBDD form for billing periods of unequal length.
+    """
+    if model_type not in VBDD_MODELS:
+        raise ValueError(f"model_type must be one of {', '.join(VBDD_MODELS)}")
+    energy = np.asarray(energy, dtype=float)
+    H, C = table['hdd'], table['cdd']
+    if per_day:
+        if days is None:
+            raise ValueError('per_day normalization needs the days of each period')
+        d = np.asarray(days, dtype=float)
+        y, H, C = energy / d, H / d[:, None], C / d[:, None]
+    else:
+        y = energy
+    w = combine_weights(mask, weights)
+    w_search = np.ones_like(y) if w is None else w
+    bps = _grid_search(model_type, y, H, C, w_search, table['balance_points'])
+
+    k = {b: int(np.searchsorted(table['balance_points'], b)) for b in bps}
+    hdd = H[:, k[bps[0]]] if model_type in ('HDD', 'HDD+CDD') else None
+    cdd = C[:, k[bps[-1]]] if model_type in ('CDD', 'HDD+CDD') else None
+    X = _design(model_type, hdd, cdd)
+    fit = fit_ols(X, y, weights=w, cov_type=cov_type)
+    model = {
+        'model_type': model_type,
+        'balance_points': list(bps),
+        'per_day': per_day,
+        'fit': fit,
+        'params': _named_params(model_type, fit['beta'], bps),
+    }
+    predicted = predict_vbdd(model, table['hdd'][:, k[bps[0]]], table['cdd'][:, k[bps[-1]]], days)
+    model['g14'] = g14_metrics(energy, predicted, X.shape[1] + len(bps), weights=w)
+    return model
+
+
+def _named_params(model_type, beta, bps):
+    beta = [float(b) for b in beta]
+    if model_type == 'HDD':
+        return {'B': beta[0], 'betaH': beta[1], 'bpH': bps[0]}
+    if model_type == 'CDD':
+        return {'B': beta[0], 'betaC': beta[1], 'bpC': bps[0]}
+    return {'B': beta[0], 'betaH': beta[1], 'bpH': bps[0], 'betaC': beta[2], 'bpC': bps[1]}
+
+
+def predict_vbdd(model, hdd, cdd, days=None):
+    """Period energy from degree days at the model's balance points (period totals)."""
+    hdd = None if hdd is None else np.asarray(hdd, dtype=float)
+    cdd = None if cdd is None else np.asarray(cdd, dtype=float)
+    if model['per_day']:
+        if days is None:
+            raise ValueError('per-day model needs the days of each period to predict totals')
+        d = np.asarray(days, dtype=float)
+        X = _design(model['model_type'], None if hdd is None else hdd / d, None if cdd is None else cdd / d)
+        return (X @ model['fit']['beta']) * d
+    return _design(model['model_type'], hdd, cdd) @ model['fit']['beta']
+
+
+def model_degree_days(model, oat, period, step=60):
+    """HDD and CDD per period at the fitted balance points, for predict_vbdd."""
+    bps = model['balance_points']
+    table = degree_day_table(oat, period, [bps[0], bps[-1]], step)
+    return table['hdd'][:, 0], table['cdd'][:, -1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Variable-base degree-day regression')
+    parser.add_argument('--y', type=str, default='total_kwh', help='Monthly energy column (default: total_kwh)')
+    parser.add_argument('--model', choices=VBDD_MODELS, default='HDD+CDD', help='Model form (default: HDD+CDD)')
+    parser.add_argument('--bp-min', type=float, default=40.0, help='Lowest balance point (default: 40 F)')
+    parser.add_argument('--bp-max', type=float, default=80.0, help='Highest balance point (default: 80 F)')
+    parser.add_argument('--bp-step', type=float, default=0.5, help='Balance-point step (default: 0.5 F)')
+    parser.add_argument('--weights', choices=['none', 'days'], default='none',
+                        help='WLS weights from billing-period day counts (default: none)')
+    args = parser.parse_args()
+
+    base = read_monthly_csv(BASELINE_MONTHLY)
+    rep = read_monthly_csv(REPORTING_MONTHLY)
+    hourly = read_interval_csv(BASELINE_HOURLY, columns=['oat_f'])
+    ts = hourly['timestamps']
+    step = interval_minutes(ts)
+    bps = np.arange(args.bp_min, args.bp_max + 1e-9, args.bp_step)
+    table = degree_day_table(column(hourly, 'oat_f'), interval_months(ts, step), bps, step)
+    w = billing_weights(base['days'], per_day=True) if args.weights == 'days' else None
+    model = fit_vbdd(base[args.y], table, args.model, days=base['days'], weights=w)
+
+    rep_hourly = read_interval_csv(REPORTING_HOURLY, columns=['oat_f'])
+    rts = rep_hourly['timestamps']
+    hdd, cdd = model_degree_days(model, column(rep_hourly, 'oat_f'), interval_months(rts, step), step)
+    pred = predict_vbdd(model, hdd, cdd, rep['days'])
+    actual = rep[args.y]
+
+    g = model['g14']
+    print("=" * 60)
+    print(f"VBDD MODEL — {args.model} ({args.y})")
+    print("=" * 60)
+    print(f"  Balance points searched: {bps.size} ({args.bp_min:g}-{args.bp_max:g} F)")
+    for name, value in model['params'].items():
+        print(f"  {name:<8} = {value:12.3f}")
+    print()
+    print("  ASHRAE Guideline 14 (monthly):")
+    print(f"    NMBE      = {g['nmbe']:7.2f}%   (limit +/-5%)")
+    print(f"    CV(RMSE)  = {g['cvrmse']:7.2f}%   (limit 15%)")
+    print(f"    R^2       = {g['r_squared']:7.4f}")
+    print(f"    Result:     {'PASS' if g['passes'] else 'FAIL'}")
+    print()
+    print(f"  Reporting period: predicted {pred.sum():,.0f}, actual {actual.sum():,.0f},"
+          f" savings {pred.sum() - actual.sum():,.0f}")
+
+
+if __name__ == '__main__':
+    main()